@@ -0,0 +1,102 @@
+"""
+Pyramid layout benchmark -- per-level cost of the CPU fusion kernels for
+interleaved (H, W, C) and planar (C, H, W) Laplacian pyramid levels.
+
+Usage: python benchmark_pyramid_layout.py [image1 image2]
+Without arguments two synthetic 24 MP frames are used.
+"""
+import os
+import sys
+import time
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import src.algorithms.stacking_algorithms.cpu as CPU
+import src.algorithms.stacking_algorithms.gpu as GPU
+
+KERNEL_SIZE = 6
+FEATHER_RADIUS = 2
+NUM_LEVELS = 6
+REPEATS = 3
+
+
+def fmt_ms(seconds):
+    return f"{seconds * 1000:.1f} ms"
+
+
+def timed(fn):
+    fn()  # warm-up (JIT compile / caches)
+    t0 = time.perf_counter()
+    for _ in range(REPEATS):
+        fn()
+    return (time.perf_counter() - t0) / REPEATS
+
+
+def load_frames():
+    if len(sys.argv) >= 3:
+        return [cv2.imread(p).astype(np.float32) for p in sys.argv[1:3]]
+    rng = np.random.default_rng(0)
+    base = cv2.GaussianBlur(
+        (rng.random((4000, 6000, 3)) * 255).astype(np.float32), (0, 0), 3,
+    )
+    return [base, cv2.GaussianBlur(base, (0, 0), 2)]
+
+
+def level_costs(fused_level, new_level, planar):
+    """Time gray conversion, focusmap, hard fuse and feathered fuse of one level."""
+    if planar:
+        gray = lambda level: CPU.planar_to_gray(level)
+        fuse = CPU.fuse_planar_levels_into
+    else:
+        gray = lambda level: cv2.cvtColor(level, cv2.COLOR_BGR2GRAY)
+        fuse = CPU.fuse_pyramid_levels_into
+    g1, g2 = gray(fused_level), gray(new_level)
+    focusmap = GPU.compute_focusmap_fast(g1, g2, KERNEL_SIZE)
+    work = fused_level.copy()
+    return {
+        "gray": timed(lambda: (gray(fused_level), gray(new_level))),
+        "focusmap": timed(lambda: GPU.compute_focusmap_fast(g1, g2, KERNEL_SIZE)),
+        "fuse": timed(lambda: fuse(work, new_level, focusmap)),
+        "feather": timed(lambda: CPU.feather_fuse_into(
+            work, new_level, focusmap, FEATHER_RADIUS, planar=planar)),
+    }
+
+
+def benchmark():
+    frames = load_frames()
+    h, w = frames[0].shape[:2]
+    print("=== Pyramid Layout Benchmark ===")
+    print(f"Resolution: {w}x{h} ({h * w / 1e6:.1f} MP), {NUM_LEVELS} levels, "
+          f"kernel={KERNEL_SIZE}, feather={FEATHER_RADIUS}")
+    print()
+
+    layouts = {
+        "interleaved": [CPU.generate_laplacian_pyramid(f, NUM_LEVELS) for f in frames],
+        "planar": [CPU.generate_laplacian_pyramid_planar(f, NUM_LEVELS) for f in frames],
+    }
+    totals = {}
+    for name, (pyr1, pyr2) in layouts.items():
+        print(f"--- {name} ---")
+        print(f"  {'level':>12}  {'gray':>9}  {'focusmap':>9}  {'fuse':>9}  {'feather':>9}")
+        total = 0.0
+        for level in range(len(pyr1) - 1, 0, -1):
+            costs = level_costs(pyr1[level], pyr2[level], name == "planar")
+            lh, lw = (pyr1[level].shape[1:] if name == "planar" else pyr1[level].shape[:2])
+            print(f"  {f'{lw}x{lh}':>12}  " + "  ".join(
+                f"{fmt_ms(costs[k]):>9}" for k in ("gray", "focusmap", "fuse", "feather")))
+            total += sum(costs.values())
+        totals[name] = total
+        print(f"  total: {fmt_ms(total)}")
+        print()
+
+    print("--- Reconstruct ---")
+    print(f"  interleaved: {fmt_ms(timed(lambda: CPU.reconstruct_pyramid(layouts['interleaved'][0])))}")
+    print(f"  planar:      {fmt_ms(timed(lambda: CPU.reconstruct_pyramid_planar(layouts['planar'][0])))}")
+    print()
+    print(f"Planar / interleaved fusion time: {totals['planar'] / totals['interleaved']:.2f}x")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -4,44 +4,585 @@
     Else use rawpy to load RAW image.
 """
 import os
+import struct
+import ctypes
 import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing.shared_memory import SharedMemory
+from dataclasses import dataclass
+from datetime import datetime
 from io import BytesIO
+from typing import Optional
 import rawpy
 import cv2
 import imageio.v2 as imageio
 import numpy as np
 
 from src.config import SUPPORTED_IMAGE_READ_FORMATS, SUPPORTED_RAW_FORMATS
+from src.frame_sources import frame_source, parse_frame_ref
+
+try:
+    import tifffile
+    HAS_TIFFFILE = True
+except ImportError:
+    HAS_TIFFFILE = False
 
 logger = logging.getLogger(__name__)
 
-# EXIF orientation tag values → rotation operations
-# See: https://sirv.com/help/articles/rotate-photos-to-be-upright/
-_EXIF_ORIENTATION_OPS = {
-    1: None,                          # Normal
-    2: (1, None),                     # Flipped horizontally
-    3: (None, cv2.ROTATE_180),        # Rotated 180
-    4: (0, None),                     # Flipped vertically
-    5: (1, cv2.ROTATE_90_CLOCKWISE),  # Transposed
-    6: (None, cv2.ROTATE_90_CLOCKWISE),       # Rotated 90 CW
-    7: (1, cv2.ROTATE_90_COUNTERCLOCKWISE),   # Transverse
-    8: (None, cv2.ROTATE_90_COUNTERCLOCKWISE), # Rotated 90 CCW
+# Decode-time reductions OpenCV offers (JPEG: DCT scaling, others: resize)
+_REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
 }
 
+# Full-quality RAW development (16-bit, camera white balance, linear exposure)
+RAW_POSTPROCESS = dict(use_camera_wb=True, output_bps=16, no_auto_bright=True)
+
+
+def read_file_bytes(path, buffer=None):
+    """
+    Whole file as a uint8 array: one open, one fstat, sequential reads.
+    buffer (uint8, large enough) is read into instead of a new array.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        return _read_open_file(f, size, buffer)
+
+
+def _read_open_file(f, size, buffer=None):
+    if buffer is None or buffer.size < size:
+        buffer = np.empty(size, dtype=np.uint8)
+    buf = buffer[:size]
+    view = memoryview(buf)
+    pos = 0
+    while pos < size:
+        n = f.readinto(view[pos:])
+        if not n:
+            return buf[:pos]  # File shrank while reading
+        pos += n
+    return buf
+
+
+class PrefetchReader:
+    """
+    Reads files ahead of their decode on a dedicated I/O thread.
+    Paths are read in schedule order into pooled buffers while at most
+    read_ahead_bytes of unclaimed data is held (one file is always
+    admitted, however large). Decoding stays with whichever thread calls
+    take(): storage latency overlaps decode instead of adding to it.
+    Use as a context manager; see ImageLoadingHandler.prefetch.
+    """
+
+    _MAX_FREE_BUFFERS = 4
+
+    def __init__(self, paths, read_ahead_bytes):
+        self.read_ahead_bytes = read_ahead_bytes
+        self.buffered_bytes = 0
+        self.peak_bytes = 0
+        self._schedule = list(paths)
+        self._ready = {}  # path -> bytes read, not yet taken
+        self._skipped = set()  # Paths read directly by their consumer instead
+        self._next = 0  # Schedule position of the I/O thread
+        self._waiting_size = None  # Size of the file the I/O thread is about to read
+        self._closed = False
+        self._free = []
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="PrefetchReader", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._ready.clear()
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._next < len(self._schedule) and self._schedule[self._next] in self._skipped:
+                    self._skipped.discard(self._schedule[self._next])
+                    self._next += 1
+                if self._closed or self._next >= len(self._schedule):
+                    self._cond.notify_all()
+                    return
+                path = self._schedule[self._next]
+                buffer = self._free.pop() if self._free else None
+            try:
+                buf = self._read(path, buffer)
+            except OSError as e:
+                logger.debug("Prefetch of %s failed: %s", path, e)
+                buf = None  # The consumer's own read reports the error
+            with self._cond:
+                self._next += 1
+                if buf is not None and not self._closed and path not in self._skipped:
+                    self._ready[path] = buf
+                    self.buffered_bytes += buf.size
+                    self.peak_bytes = max(self.peak_bytes, self.buffered_bytes)
+                self._skipped.discard(path)
+                self._cond.notify_all()
+
+    def _read(self, path, buffer):
+        with open(path, "rb") as f:
+            fd = f.fileno()
+            size = os.fstat(fd).st_size
+            with self._cond:
+                # Wait for room in the read-ahead window
+                self._waiting_size = size
+                while not self._closed and self._blocked():
+                    self._cond.notify_all()
+                    self._cond.wait()
+                self._waiting_size = None
+                if self._closed or path in self._skipped:
+                    return None  # Its consumer gave up waiting and read it
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            return _read_open_file(f, size, buffer)
+
+    def _blocked(self):
+        """The I/O thread's next file does not fit the read-ahead window."""
+        return (self._waiting_size is not None and self.buffered_bytes > 0
+                and self.buffered_bytes + self._waiting_size > self.read_ahead_bytes)
+
+    def take(self, path):
+        """
+        Bytes of path, waiting for the I/O thread if it is on its way
+        there. None if path is not scheduled, was already taken, or cannot
+        be reached because the read-ahead window is full of other frames.
+        """
+        with self._cond:
+            while True:
+                if path in self._ready:
+                    buf = self._ready.pop(path)
+                    self.buffered_bytes -= buf.size
+                    self._cond.notify_all()
+                    return buf
+                pending = path in self._schedule[self._next:]
+                if self._closed or not pending or self._blocked():
+                    if pending:
+                        self._skipped.add(path)
+                    return None
+                self._cond.wait()
+
+    def release(self, buf):
+        """Return a taken buffer for reuse once it has been decoded."""
+        base = buf.base if isinstance(buf.base, np.ndarray) else buf
+        with self._cond:
+            if len(self._free) < self._MAX_FREE_BUFFERS:
+                self._free.append(base)
+
+
+def _limit_openmp_threads(n):
+    """
+    Cap OpenMP (LibRaw's demosaic threads) at n in this process: through
+    the environment for runtimes not loaded yet, and omp_set_num_threads
+    on the ones already mapped (Linux; rawpy bundles its own libgomp).
+    """
+    os.environ["OMP_NUM_THREADS"] = str(n)
+    try:
+        with open("/proc/self/maps") as f:
+            libs = {line.split()[-1] for line in f if "omp" in line.rsplit("/", 1)[-1]}
+    except OSError:
+        return
+    for lib in libs:
+        try:
+            ctypes.CDLL(lib).omp_set_num_threads(n)
+        except (OSError, AttributeError):
+            pass
+
+
+def _init_raw_worker(libraw_threads):
+    _limit_openmp_threads(libraw_threads)
+    cv2.setNumThreads(1)
+
+
+def _decode_raw_shared(path):
+    """
+    Worker process: develop path like _load_raw_native and leave the BGR
+    result in a new shared memory block. Returns (name, shape, dtype);
+    the parent copies the frame out and unlinks the block.
+    """
+    with rawpy.imread(path) as raw:
+        rgb = raw.postprocess(**RAW_POSTPROCESS)
+    shm = SharedMemory(create=True, size=rgb.nbytes)
+    try:
+        out = np.ndarray(rgb.shape, rgb.dtype, buffer=shm.buf)
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=out)
+        del out
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return shm.name, rgb.shape, rgb.dtype.str
+
+
+def _collect_shared(result):
+    name, shape, dtype = result
+    shm = SharedMemory(name=name)
+    try:
+        view = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+        frame = view.copy()
+        del view
+    finally:
+        shm.close()
+        shm.unlink()
+    return frame
+
+
+class RawDecodePool:
+    """
+    Develops RAW files ahead of their use in worker processes. rawpy
+    holds the GIL for much of postprocess() and LibRaw's own OpenMP
+    threads only cover parts of it, so threads decoding side by side
+    contend; processes do not. Each worker caps LibRaw at libraw_threads
+    so workers x threads matches the cores. Frames come back through
+    shared memory instead of being pickled through a pipe. Paths are
+    decoded in schedule order with at most max_in_flight frames decoded
+    or decoding and not yet taken. Use as a context manager; see
+    ImageLoadingHandler.raw_decode_pool.
+    """
+
+    def __init__(self, paths, workers, max_in_flight, libraw_threads=1):
+        self.max_in_flight = max(1, max_in_flight)
+        self._schedule = list(dict.fromkeys(paths))
+        self._scheduled = set(self._schedule)
+        self._futures = {}  # path -> future, submitted and not yet taken
+        self._taken = set()
+        self._next = 0
+        self._broken = False
+        self._lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_raw_worker, initargs=(libraw_threads,),
+        )
+
+    def __enter__(self):
+        self._fill()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __contains__(self, path):
+        return path in self._scheduled
+
+    def close(self):
+        with self._lock:
+            self._broken = True  # Nothing new is submitted
+            futures = list(self._futures.values())
+            self._futures.clear()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        for future in futures:
+            # Unclaimed frames still own a shared memory block
+            if future.done() and not future.cancelled() and future.exception() is None:
+                _collect_shared(future.result())
+
+    def _fill(self):
+        with self._lock:
+            while (not self._broken and len(self._futures) < self.max_in_flight
+                   and self._next < len(self._schedule)):
+                path = self._schedule[self._next]
+                self._next += 1
+                if path not in self._taken:
+                    self._futures[path] = self._executor.submit(_decode_raw_shared, path)
+
+    def take(self, path):
+        """
+        Developed uint16 BGR frame of path, waiting for its worker. None
+        if path is not scheduled, was already taken, or its decode failed
+        (the caller then decodes in-process and reports the error).
+        """
+        with self._lock:
+            if path not in self._scheduled or path in self._taken:
+                return None
+            self._taken.add(path)
+            future = self._futures.pop(path, None)
+        self._fill()  # Keep the workers busy while this one is waited for
+        if future is None:
+            return None  # Not submitted yet: the caller is ahead of the window
+        try:
+            return _collect_shared(future.result())
+        except BrokenProcessPool as e:
+            logger.warning("RAW decode workers stopped (%s), decoding in-process", e)
+            with self._lock:
+                self._broken = True
+            return None
+        except Exception as e:
+            logger.debug("RAW decode of %s in worker failed: %s", path, e)
+            return None
+
 
-def _read_exif_orientation(path):
-    """Read EXIF orientation tag from an image file.
+def _shared_memory_free():
+    """Bytes free for shared memory blocks, None if unknown."""
+    try:
+        st = os.statvfs("/dev/shm")
+    except (AttributeError, OSError):
+        return None
+    return st.f_bavail * st.f_frsize
+
+
+def _jpeg_dimensions(buf):
+    """(height, width) from a JPEG's SOF marker, without decoding; None if not found."""
+    try:
+        if bytes(buf[:2]) != b"\xff\xd8":
+            return None
+        pos = 2
+        while pos + 4 <= len(buf) and buf[pos] == 0xFF:
+            marker = buf[pos + 1]
+            if marker == 0xFF:  # Fill byte
+                pos += 1
+                continue
+            if marker in (0xDA, 0xD9):
+                break
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                return struct.unpack_from(">HH", buf, pos + 5)
+            pos += 2 + struct.unpack_from(">H", buf, pos + 2)[0]
+    except (struct.error, IndexError):
+        pass
+    return None
 
-    Uses PIL (available via Pillow/PySide6) to read just the EXIF data
-    without loading the full image. Returns orientation int (1-8) or None.
+
+_TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1}
+_EXIF_IFD_TAG = 0x8769
+
+
+def _tiff_tags(read, start, wanted, page=0):
+    """
+    Values of the wanted tags in IFD0 (and the Exif IFD it points to) of
+    the TIFF structure at offset start. read(offset, n) returns bytes, so
+    only the directories and the requested values are ever read. SHORT and
+    LONG tags give their first value, ASCII tags a str. page > 0 reads
+    that page's IFD instead (multi-page files); {} if there is none.
+    """
+    order = read(start, 2)
+    if order not in (b"II", b"MM"):
+        return {}
+    e = "<" if order == b"II" else ">"
+    values = {}
+    offset = struct.unpack(e + "I", read(start + 4, 4))[0]
+    seen = set()
+    for _ in range(page):
+        if not offset or offset in seen:
+            return {}
+        seen.add(offset)
+        count = struct.unpack(e + "H", read(start + offset, 2))[0]
+        offset = struct.unpack(e + "I", read(start + offset + 2 + 12 * count, 4))[0]
+    exif_offset = None
+    seen = set()
+    while offset and offset not in seen:
+        seen.add(offset)
+        count = struct.unpack(e + "H", read(start + offset, 2))[0]
+        entries = read(start + offset + 2, 12 * count)
+        for i in range(count):
+            tag, type_, n = struct.unpack_from(e + "HHI", entries, 12 * i)
+            if tag not in wanted and tag != _EXIF_IFD_TAG:
+                continue
+            size = _TIFF_TYPE_SIZES.get(type_, 1) * n
+            if size <= 4:
+                raw = entries[12 * i + 8:12 * i + 8 + size]
+            else:
+                raw = read(start + struct.unpack_from(e + "I", entries, 12 * i + 8)[0], min(size, 64))
+            if type_ == 2:
+                value = raw.split(b"\x00", 1)[0].decode("ascii", "replace")
+            elif type_ == 3:
+                value = struct.unpack_from(e + "H", raw)[0]
+            elif type_ == 4:
+                value = struct.unpack_from(e + "I", raw)[0]
+            else:
+                continue
+            if tag == _EXIF_IFD_TAG:
+                exif_offset = value
+            else:
+                values[tag] = value
+        offset, exif_offset = exif_offset, None  # IFD0, then its Exif IFD
+    return values
+
+
+def _tiff_page_count(read, limit=2):
+    """Number of IFDs (pages) in the TIFF read(offset, n) reads, counted up to limit."""
+    order = read(0, 2)
+    if order not in (b"II", b"MM"):
+        return 0
+    e = "<" if order == b"II" else ">"
+    offset = struct.unpack(e + "I", read(4, 4))[0]
+    seen = set()
+    while offset and offset not in seen and len(seen) < limit:
+        seen.add(offset)
+        count = struct.unpack(e + "H", read(offset, 2))[0]
+        offset = struct.unpack(e + "I", read(offset + 2 + 12 * count, 4))[0]
+    return len(seen)
+
+
+def _buffer_reader(buf):
+    return lambda offset, n: bytes(buf[offset:offset + n])
+
+
+@dataclass(frozen=True)
+class ImageMetadata:
+    """What ImageLoadingHandler.probe reads from a file's headers."""
+    width: int  # As stored, before orientation
+    height: int
+    channels: int  # As stored (loading expands gray to BGR and drops alpha)
+    bit_depth: int
+    orientation: int = 1  # EXIF orientation (1-8)
+    timestamp: Optional[datetime] = None  # Capture time (EXIF DateTimeOriginal), if recorded
+    multipage: bool = False  # TIFF with more than one page (IFD)
+
+    @property
+    def shape(self):
+        """(h, w) of the image as loaded, i.e. after orientation."""
+        if self.orientation in (5, 6, 7, 8):
+            return self.width, self.height
+        return self.height, self.width
+
+
+class _FileHeader:
+    """Reads parts of an open file on demand; the first block is kept."""
+
+    _BLOCK = 65536
+
+    def __init__(self, f):
+        self._f = f
+        self._head = f.read(self._BLOCK)
+
+    def __call__(self, offset, n):
+        if offset + n <= len(self._head):
+            return self._head[offset:offset + n]
+        self._f.seek(offset)
+        return self._f.read(n)
+
+
+_TAG_WIDTH, _TAG_HEIGHT, _TAG_BITS, _TAG_SAMPLES = 256, 257, 258, 277
+_TAG_ORIENTATION, _TAG_DATETIME, _TAG_DATETIME_ORIGINAL = 0x0112, 0x0132, 0x9003
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}  # Colour type -> samples (palette decodes to BGR)
+# LibRaw flip -> EXIF orientation
+_RAW_FLIP_ORIENTATION = {0: 1, 3: 3, 5: 8, 6: 6}
+
+
+def _exif_timestamp(tags):
+    value = tags.get(_TAG_DATETIME_ORIGINAL) or tags.get(_TAG_DATETIME)
+    try:
+        return datetime.strptime(value.strip(), "%Y:%m:%d %H:%M:%S") if value else None
+    except ValueError:
+        return None
+
+
+def _probe_header(read, page=0):
+    """
+    ImageMetadata from JPEG (SOF + Exif), PNG (IHDR + eXIf) or TIFF (IFD0,
+    or the IFD of page) headers.
+    """
+    head = read(0, 12)
+    exif_tags = (_TAG_ORIENTATION, _TAG_DATETIME, _TAG_DATETIME_ORIGINAL)
+    if head[:2] == b"\xff\xd8":
+        tags = {}
+        pos = 2
+        while True:
+            marker = read(pos, 4)
+            if len(marker) < 4 or marker[0] != 0xFF:
+                return None
+            if marker[1] == 0xFF:  # Fill byte
+                pos += 1
+                continue
+            length = struct.unpack(">H", marker[2:])[0]
+            if marker[1] == 0xE1 and read(pos + 4, 6) == b"Exif\x00\x00":
+                payload = read(pos + 10, length - 8)
+                tags = _tiff_tags(_buffer_reader(payload), 0, exif_tags)
+            elif 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                bits, h, w, channels = struct.unpack(">BHHB", read(pos + 4, 6))
+                return ImageMetadata(w, h, channels, bits, tags.get(_TAG_ORIENTATION, 1) or 1,
+                                     _exif_timestamp(tags))
+            elif marker[1] in (0xDA, 0xD9):
+                return None
+            pos += 2 + length
+    if head[:8] == b"\x89PNG\r\n\x1a\n":
+        w, h, bits, colour = struct.unpack(">IIBB", read(16, 10))
+        tags = {}
+        pos = 33  # First chunk after IHDR
+        while True:
+            chunk = read(pos, 8)
+            if len(chunk) < 8 or chunk[4:] in (b"IDAT", b"IEND"):
+                break
+            length = struct.unpack(">I", chunk[:4])[0]
+            if chunk[4:] == b"eXIf":
+                tags = _tiff_tags(_buffer_reader(read(pos + 8, length)), 0, exif_tags)
+                break
+            pos += 12 + length
+        return ImageMetadata(w, h, _PNG_CHANNELS.get(colour, 3), bits,
+                             tags.get(_TAG_ORIENTATION, 1) or 1, _exif_timestamp(tags))
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        tags = _tiff_tags(read, 0, (_TAG_WIDTH, _TAG_HEIGHT, _TAG_BITS, _TAG_SAMPLES) + exif_tags,
+                          page)
+        if _TAG_WIDTH not in tags or _TAG_HEIGHT not in tags:
+            return None
+        return ImageMetadata(tags[_TAG_WIDTH], tags[_TAG_HEIGHT], tags.get(_TAG_SAMPLES, 1),
+                             tags.get(_TAG_BITS, 1), tags.get(_TAG_ORIENTATION, 1) or 1,
+                             _exif_timestamp(tags), _tiff_page_count(read) > 1)
+    return None
+
+
+_probe_cache = {}  # (abspath, size, mtime_ns) -> ImageMetadata or None
+_probe_lock = threading.Lock()
+_PROBE_CACHE_SIZE = 4096
+
+
+def _read_exif_orientation(buf):
+    """Read the EXIF orientation tag from an encoded image buffer.
+
+    JPEG (APP1 Exif) and PNG (eXIf chunk) are parsed directly; WebP goes
+    through PIL on the same buffer. Only the header is scanned, the file
+    is not opened again. TIFF files return None: OpenCV's TIFF decoder
+    applies their Orientation tag itself. Returns orientation int (1-8)
+    or None.
     """
     try:
-        from PIL import Image
-        from PIL.ExifTags import Base as ExifBase
-        with Image.open(path) as pil_img:
-            exif = pil_img.getexif()
-            if exif:
-                return exif.get(ExifBase.Orientation, None)
+        head = bytes(buf[:12])
+        if head[:2] == b"\xff\xd8":
+            pos = 2
+            while pos + 4 <= len(buf) and buf[pos] == 0xFF:
+                marker = buf[pos + 1]
+                if marker == 0xFF:  # Fill byte
+                    pos += 1
+                    continue
+                if marker in (0xDA, 0xD9):  # Start of scan: no metadata after it
+                    break
+                length = struct.unpack_from(">H", buf, pos + 2)[0]
+                if marker == 0xE1 and bytes(buf[pos + 4:pos + 10]) == b"Exif\x00\x00":
+                    return _tiff_tags(_buffer_reader(buf), pos + 10, (0x0112,)).get(0x0112)
+                pos += 2 + length
+        elif head[:8] == b"\x89PNG\r\n\x1a\n":
+            pos = 8
+            while pos + 8 <= len(buf):
+                length = struct.unpack_from(">I", buf, pos)[0]
+                kind = bytes(buf[pos + 4:pos + 8])
+                if kind == b"eXIf":
+                    return _tiff_tags(_buffer_reader(buf), pos + 8, (0x0112,)).get(0x0112)
+                if kind in (b"IDAT", b"IEND"):
+                    break
+                pos += 12 + length
+        elif head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            from PIL import Image
+            from PIL.ExifTags import Base as ExifBase
+            with Image.open(BytesIO(buf)) as pil_img:
+                exif = pil_img.getexif()
+                if exif:
+                    return exif.get(ExifBase.Orientation, None)
     except Exception:
         pass
     return None
@@ -51,28 +592,164 @@ def _apply_exif_orientation(img, orientation):
     """Apply EXIF orientation transform to a numpy BGR image.
 
     Handles all 8 EXIF orientation values including rotations and flips.
+    Returns a view (negative/transposed strides) instead of a copy, so
+    the orientation is folded into whichever conversion copies the image
+    next; use np.ascontiguousarray when the pixels are needed as is.
     """
-    if orientation is None or orientation not in _EXIF_ORIENTATION_OPS:
-        return img
-    ops = _EXIF_ORIENTATION_OPS[orientation]
-    if ops is None:
-        return img
-
-    flip_code, rotate_code = ops
-    if flip_code is not None:
-        img = cv2.flip(img, flip_code)
-    if rotate_code is not None:
-        img = cv2.rotate(img, rotate_code)
-    return img
+    if orientation == 2:    # Flipped horizontally
+        return img[:, ::-1]
+    if orientation == 3:    # Rotated 180
+        return img[::-1, ::-1]
+    if orientation == 4:    # Flipped vertically
+        return img[::-1]
+    if orientation == 5:    # Transposed
+        return img.swapaxes(0, 1)
+    if orientation == 6:    # Rotated 90 CW
+        return img[::-1].swapaxes(0, 1)
+    if orientation == 7:    # Transverse
+        return img[::-1, ::-1].swapaxes(0, 1)
+    if orientation == 8:    # Rotated 90 CCW
+        return img[:, ::-1].swapaxes(0, 1)
+    return img              # Normal, missing or invalid
 
 
 class ImageLoadingHandler:
     def __init__(self, supported_formats=None, supported_raw=None):
         self.supported_formats = SUPPORTED_IMAGE_READ_FORMATS if supported_formats is None else supported_formats
         self.supported_raw = SUPPORTED_RAW_FORMATS if supported_raw is None else supported_raw
+        self._prefetch = None  # Active PrefetchReader, see prefetch()
+        self._raw_pool = None  # Active RawDecodePool, see raw_decode_pool()
+
+    @contextmanager
+    def prefetch(self, paths, read_ahead_bytes):
+        """
+        Read paths ahead (in order) on an I/O thread while the block runs;
+        loads of those paths from any thread take the prefetched bytes.
+        read_ahead_bytes <= 0 disables prefetching.
+        """
+        if read_ahead_bytes <= 0 or self._prefetch is not None:
+            yield None
+            return
+        # Container frames are decoded from their open container instead
+        paths = [p for p in paths if parse_frame_ref(p) is None]
+        with PrefetchReader(paths, read_ahead_bytes) as reader:
+            self._prefetch = reader
+            try:
+                yield reader
+            finally:
+                self._prefetch = None
+                logger.debug("Prefetch peak: %.1f MB buffered", reader.peak_bytes / 1024**2)
+
+    @contextmanager
+    def raw_decode_pool(self, paths, workers=0):
+        """
+        Develop the RAW files among paths ahead of their loads in worker
+        processes while the block runs (see RawDecodePool). workers=0
+        sizes the pool to the cores; with one worker (or one RAW file)
+        no pool is started and loads decode in-process as usual.
+        """
+        raw_paths = [p for p in paths if os.path.splitext(p)[1][1:].upper() in self.supported_raw]
+        cores = os.cpu_count() or 1
+        workers = min(workers or cores, len(raw_paths))
+        if workers <= 1 or self._raw_pool is not None:
+            yield None
+            return
+        max_in_flight = 2 * workers
+        meta = self.probe(raw_paths[0])
+        free = _shared_memory_free()
+        if meta is not None and free is not None:
+            # Decoded frames wait in shared memory: keep the window inside it
+            frame_bytes = meta.width * meta.height * meta.channels * 2
+            max_in_flight = min(max_in_flight, int(free * 0.8) // max(frame_bytes, 1))
+            if max_in_flight < 1:
+                logger.warning("Not enough shared memory for RAW decode workers")
+                yield None
+                return
+        with RawDecodePool(raw_paths, workers, max_in_flight,
+                           libraw_threads=max(1, cores // workers)) as pool:
+            self._raw_pool = pool
+            try:
+                yield pool
+            finally:
+                self._raw_pool = None
+
+    def probe(self, path):
+        """
+        ImageMetadata of path from its headers only, no pixel decode:
+        JPEG SOF/Exif, PNG IHDR/eXIf, TIFF IFD0, LibRaw sizes for RAW;
+        for container frames (FrameRef) the page's IFD or the video's
+        stream properties. Results are cached per file (keyed on size and
+        mtime). None when the file is missing, unsupported or its header
+        cannot be parsed.
+        """
+        ref = parse_frame_ref(path)
+        file_path = path if ref is None else ref.container
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        key = (os.path.abspath(file_path), st.st_size, st.st_mtime_ns,
+               None if ref is None else ref.index)
+        with _probe_lock:
+            if key in _probe_cache:
+                return _probe_cache[key]
+        ext = os.path.splitext(file_path)[1][1:]
+        meta = None
+        try:
+            if ref is not None:
+                meta = self._probe_frame(ref)
+            elif ext.upper() in self.supported_raw:
+                with rawpy.imread(path) as raw:  # Opening parses metadata only
+                    sizes = raw.sizes
+                    meta = ImageMetadata(sizes.width, sizes.height, 3, 16,
+                                         _RAW_FLIP_ORIENTATION.get(sizes.flip, 1))
+            elif ext.lower() in self.supported_formats:
+                with open(path, "rb") as f:
+                    meta = _probe_header(_FileHeader(f))
+        except Exception as e:
+            logger.debug("Probe of %s failed: %s", path, e)
+        with _probe_lock:
+            if len(_probe_cache) >= _PROBE_CACHE_SIZE:
+                _probe_cache.clear()
+            _probe_cache[key] = meta
+        return meta
+
+    @staticmethod
+    def _probe_frame(ref):
+        source = frame_source(ref.container)
+        if source is None or not 0 <= ref.index < len(source):
+            return None
+        if source.kind == "video":
+            return ImageMetadata(source.width, source.height, 3, 8)
+        with open(ref.container, "rb") as f:
+            return _probe_header(_FileHeader(f), ref.index)
+
+    def _read_frame(self, ref):
+        """Decoded frame of a container (native dtype, BGR or gray), None on failure."""
+        source = frame_source(ref.container)
+        try:
+            img = source.read(ref.index) if source is not None else None
+        except Exception as e:
+            logger.error("Failed to read frame %s: %s", ref, e)
+            return None
+        if img is None:
+            logger.error("Failed to read frame %s", ref)
+        return img
+
+    def _read_bytes(self, path):
+        reader = self._prefetch
+        buf = reader.take(path) if reader is not None else None
+        return buf if buf is not None else read_file_bytes(path)
+
+    def _release_bytes(self, buf):
+        reader = self._prefetch
+        if reader is not None:
+            reader.release(buf)
 
     def is_supported(self, path):
         """Check if a file path has a supported image extension."""
+        if parse_frame_ref(path) is not None:
+            return True
         _, ext = os.path.splitext(path)
         ext = ext.lstrip(".")
         return (ext.lower() in self.supported_formats
@@ -84,6 +761,10 @@ class ImageLoadingHandler:
         Applies EXIF orientation automatically.
         Returns None if loading fails.
         """
+        ref = parse_frame_ref(path)
+        if ref is not None:
+            img = self._read_frame(ref)
+            return None if img is None else np.ascontiguousarray(img)
         if not os.path.isfile(path):
             logger.error("File not found: %s", path)
             return None
@@ -93,13 +774,8 @@ class ImageLoadingHandler:
 
         if extension.lower() in self.supported_formats:
             try:
-                # Read EXIF orientation before OpenCV load (cv2 ignores EXIF)
-                orientation = _read_exif_orientation(path)
-                img = cv2.imread(path, -1)
-                if img is None:
-                    logger.error("cv2.imread returned None for: %s", path)
-                    return None
-                return _apply_exif_orientation(img, orientation)
+                img = self._decode(path)
+                return None if img is None else np.ascontiguousarray(img)
             except Exception as e:
                 logger.error("Failed to load image %s: %s", path, e)
                 return None
@@ -140,14 +816,18 @@ class ImageLoadingHandler:
             logger.error("Failed to load RAW image %s: %s", path, e)
             return None
 
-    def read_image_as_float32(self, path):
+    def read_image_native(self, path):
         """
-        Load image and convert to float32 BGR.
+        Load image as BGR in its decoded dtype, without float promotion.
         Applies EXIF orientation automatically.
-        For 8-bit images: values 0-255
-        For 16-bit images: values scaled to 0-255 range
-        For RAW: full postprocessed output as float32
+        uint8 and uint16 images are returned as-is (use dtype_scale() to map
+        them to the 0-255 float range); float formats are returned as float32
+        in the 0-255 range. Grayscale is expanded to BGR and alpha dropped.
         """
+        ref = parse_frame_ref(path)
+        if ref is not None:
+            img = self._read_frame(ref)
+            return self.native_bgr(img) if img is not None else None
         if not os.path.isfile(path):
             logger.error("File not found: %s", path)
             return None
@@ -157,20 +837,13 @@ class ImageLoadingHandler:
 
         if ext_lower in self.supported_formats:
             try:
-                # Read EXIF orientation before OpenCV load
-                orientation = _read_exif_orientation(path)
-                # IMREAD_UNCHANGED preserves 16-bit depth
-                img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
-                if img is None:
-                    logger.error("cv2.imread returned None for: %s", path)
-                    return None
-                img = _apply_exif_orientation(img, orientation)
-                return self._to_float32_bgr(img)
+                img = self._decode(path)
+                return self.native_bgr(img) if img is not None else None
             except Exception as e:
                 logger.error("Failed to load image %s: %s", path, e)
                 return None
         elif extension[1:].upper() in self.supported_raw:
-            return self._load_raw_float32(path)
+            return self._load_raw_native(path)
         elif ext_lower == "npy":
             try:
                 arr = np.load(path, allow_pickle=False)
@@ -182,45 +855,222 @@ class ImageLoadingHandler:
             logger.warning("Unsupported format: %s", extension)
             return None
 
+    def read_image_as_float32(self, path):
+        """
+        Load image and convert to float32 BGR.
+        Applies EXIF orientation automatically.
+        For 8-bit images: values 0-255
+        For 16-bit images: values scaled to 0-255 range
+        For RAW: full postprocessed output as float32
+        """
+        _, extension = os.path.splitext(path)
+        if extension[1:].lower() in self.supported_formats and os.path.isfile(path):
+            # Orientation stays a view; the float conversion is the only copy
+            try:
+                img = self._decode(path)
+            except Exception as e:
+                logger.error("Failed to load image %s: %s", path, e)
+                return None
+            return None if img is None else self._to_float32_bgr(img)
+        img = self.read_image_native(path)
+        if img is None or img.dtype == np.float32:
+            return img
+        return self._to_float32_bgr(img)
+
+    def decode_native(self, buf):
+        """
+        read_image_native for an encoded image already in memory (bytes or
+        a uint8 array), e.g. a frame received over a pipe. None if it does
+        not decode.
+        """
+        buf = np.frombuffer(buf, dtype=np.uint8)
+        img = cv2.imdecode(buf, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            return None
+        return self.native_bgr(_apply_exif_orientation(img, _read_exif_orientation(buf)))
+
+    def native_bgr(self, img):
+        """A decoded frame in read_image_native's layout (BGR; uint8, uint16 or float32)."""
+        if img.dtype not in (np.uint8, np.uint16):
+            return self._to_float32_bgr(img)
+        return np.ascontiguousarray(self._to_bgr(img))
+
+    def _decode(self, path):
+        """
+        Read path once (or take its prefetched bytes) and decode it from
+        memory (cv2.imdecode, depth preserved). The EXIF orientation is
+        parsed from the same bytes and returned applied as a view (see
+        _apply_exif_orientation).
+        """
+        buf = self._read_bytes(path)
+        img = cv2.imdecode(buf, cv2.IMREAD_UNCHANGED)
+        orientation = _read_exif_orientation(buf)
+        self._release_bytes(buf)
+        if img is None:
+            logger.error("cv2.imdecode returned None for: %s", path)
+            return None
+        return _apply_exif_orientation(img, orientation)
+
+    def read_reduced(self, path, factor):
+        """
+        Load path as 8-bit BGR at about 1/factor of its size (each side
+        ceil-divided), EXIF orientation applied. For previews, thumbnails
+        and measurements that do not need every pixel; full-size data is
+        never decoded where the format allows:
+          - JPEG: DCT scaling (1/2, 1/4, 1/8) during decode;
+          - RAW: the embedded preview when it is large enough, else a
+            half-size demosaic;
+          - TIFF: the closest reduced-resolution level (SubIFDs or reduced
+            pages) when tifffile is installed.
+        The rest is resized after decoding. Returns None if loading fails.
+        """
+        factor = max(1, int(factor))
+        if parse_frame_ref(path) is not None:
+            # Container frames have no reduced form: decode, then resize
+            img = self.read_image_native(path)
+            if img is None:
+                return None
+            if img.dtype == np.uint16:
+                img = (img >> 8).astype(np.uint8)
+            elif img.dtype != np.uint8:
+                img = np.clip(img, 0, 255).astype(np.uint8)
+            return self._shrink(img, max(img.shape[:2]), factor)
+        ext = os.path.splitext(path)[1][1:]
+        if not os.path.isfile(path):
+            logger.error("File not found: %s", path)
+            return None
+        try:
+            if ext.upper() in self.supported_raw:
+                return self._read_raw_reduced(path, factor)
+            if ext.lower() not in self.supported_formats:
+                logger.warning("Unsupported format: %s", ext)
+                return None
+            if factor > 1 and HAS_TIFFFILE and ext.lower() in ("tif", "tiff"):
+                img = self._read_tiff_level(path, factor)
+                if img is not None:
+                    return img
+            # Largest decode-time reduction that does not overshoot factor
+            step = max(f for f in _REDUCED_FLAGS if f <= factor)
+            buf = self._read_bytes(path)
+            img = cv2.imdecode(buf, _REDUCED_FLAGS[step])  # Applies EXIF orientation
+            self._release_bytes(buf)
+            if img is None:
+                logger.error("cv2.imdecode returned None for: %s", path)
+                return None
+            return self._shrink(img, max(img.shape[:2]) * step, factor)
+        except Exception as e:
+            logger.error("Failed to load reduced image %s: %s", path, e)
+            return None
+
+    @staticmethod
+    def _shrink(img, full_long_side, factor):
+        """Resize img (INTER_AREA) so its long side is ceil(full_long_side / factor)."""
+        target = -(-full_long_side // factor)
+        h, w = img.shape[:2]
+        if max(h, w) <= target:
+            return img
+        scale = target / max(h, w)
+        return cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))),
+                          interpolation=cv2.INTER_AREA)
+
+    def _read_raw_reduced(self, path, factor):
+        buf = self._read_bytes(path)
+        data = BytesIO(buf)
+        self._release_bytes(buf)
+        with rawpy.imread(data) as raw:
+            full_long = max(raw.sizes.width, raw.sizes.height)
+            try:
+                thumb = raw.extract_thumb()
+            except (rawpy.LibRawError, rawpy.LibRawNonFatalError):
+                thumb = None
+            if thumb is not None and thumb.format == rawpy.ThumbFormat.JPEG:
+                encoded = np.frombuffer(thumb.data, dtype=np.uint8)
+                size = _jpeg_dimensions(encoded)
+                if size is not None and max(size) * factor >= full_long:
+                    # Embedded preview is large enough: decode it only as finely as needed
+                    step = max(f for f in _REDUCED_FLAGS if max(size) * factor >= full_long * f)
+                    preview = cv2.imdecode(encoded, _REDUCED_FLAGS[step])
+                    if preview is not None:
+                        return self._shrink(preview, full_long, factor)
+            rgb = raw.postprocess(use_camera_wb=True, half_size=factor >= 2)
+        return self._shrink(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), full_long, factor)
+
+    @staticmethod
+    def _read_tiff_level(path, factor):
+        """Closest reduced-resolution TIFF level at or above 1/factor size, or None."""
+        with tifffile.TiffFile(path) as tif:
+            levels = tif.series[0].levels
+            if len(levels) < 2 or levels[0].axes not in ("YX", "YXS"):
+                return None
+            full_long = max(levels[0].shape[:2])
+            chosen = None
+            for level in levels[1:]:
+                if level.axes == levels[0].axes and max(level.shape[:2]) * factor >= full_long:
+                    chosen = level
+            if chosen is None:
+                return None
+            img = chosen.asarray()
+        if img.dtype == np.uint16:
+            img = (img >> 8).astype(np.uint8)
+        elif img.dtype != np.uint8:
+            img = np.clip(img * (255.0 if img.max() <= 1.0 else 1.0), 0, 255).astype(np.uint8)
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        else:
+            img = cv2.cvtColor(np.ascontiguousarray(img[:, :, :3]), cv2.COLOR_RGB2BGR)
+        return ImageLoadingHandler._shrink(img, full_long, factor)
+
+    @staticmethod
+    def dtype_scale(dtype):
+        """Multiplier that maps a native pixel dtype to the 0-255 float range."""
+        if dtype == np.uint16:
+            return 255.0 / 65535.0
+        return 1.0
+
+    @staticmethod
+    def _to_bgr(img):
+        """Expand grayscale to BGR and drop alpha, keeping the dtype."""
+        if img.ndim == 2:
+            return cv2.cvtColor(np.ascontiguousarray(img), cv2.COLOR_GRAY2BGR)
+        if img.shape[2] == 4:
+            # BGRA -> BGR
+            return img[:, :, :3]
+        return img
+
     def _to_float32_bgr(self, img):
         """Convert any loaded image to float32 BGR in 0-255 range."""
+        # order="C": img may be an oriented (flipped/transposed) view
         if img.dtype == np.uint16:
             # 16-bit: scale to 0-255 range as float32
-            img = img.astype(np.float32) * (255.0 / 65535.0)
+            scale = self.dtype_scale(img.dtype)
+            img = img.astype(np.float32, order="C")
+            img *= np.float32(scale)
         elif img.dtype == np.float32 or img.dtype == np.float64:
             # HDR/float: check a small sample to detect 0-1 range
             # (avoids expensive full-array img.max() scan on 24MP images)
             sample_max = img.flat[:1000].max() if img.size > 1000 else img.max()
+            img = img.astype(np.float32, order="C")
             if sample_max <= 1.0:
-                img = img.astype(np.float32) * 255.0
-            else:
-                img = img.astype(np.float32)
+                img *= np.float32(255.0)
         else:
-            img = img.astype(np.float32)
-
-        # Handle grayscale
-        if img.ndim == 2:
-            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-        elif img.shape[2] == 4:
-            # BGRA -> BGR
-            img = img[:, :, :3]
+            img = img.astype(np.float32, order="C")
 
-        return img
+        return self._to_bgr(img)
 
-    def _load_raw_float32(self, path):
-        """Load RAW file using rawpy with 16-bit output, return float32 BGR."""
+    def _load_raw_native(self, path):
+        """Load RAW file using rawpy with 16-bit output, return uint16 BGR."""
+        pool = self._raw_pool
+        bgr = pool.take(path) if pool is not None else None
+        if bgr is not None:
+            return bgr
         try:
-            with rawpy.imread(path) as raw:
+            buf = self._read_bytes(path)
+            data = BytesIO(buf)  # rawpy reads file objects into its own buffer
+            self._release_bytes(buf)
+            with rawpy.imread(data) as raw:
                 # Use full postprocessing for maximum quality
-                rgb16 = raw.postprocess(
-                    use_camera_wb=True,
-                    output_bps=16,
-                    no_auto_bright=True,
-                )
-                # Convert RGB16 -> float32 (0-255 range) -> BGR
-                img_f32 = rgb16.astype(np.float32) * (255.0 / 65535.0)
-                bgr = cv2.cvtColor(img_f32, cv2.COLOR_RGB2BGR)
-                return bgr
+                rgb16 = raw.postprocess(**RAW_POSTPROCESS)
+                return cv2.cvtColor(rgb16, cv2.COLOR_RGB2BGR)
         except Exception as e:
             logger.error("Failed to load RAW image %s: %s", path, e)
             # Fall back to old method
@@ -256,3 +1106,72 @@ class ImageLoadingHandler:
             return 0.0
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         return cv2.Laplacian(gray, cv2.CV_64F).var()
+
+
+class LumaPyramid:
+    """
+    Gaussian levels of a frame's luminance (float32, 0-255 range).
+    Built once per frame and shared by everything that looks at the frame
+    at reduced resolution (coarse alignment, multi-scale ECC, focus and
+    sharpness measures), so no stage re-resizes the full frame itself.
+    levels[0] is full resolution; level i is cv2.pyrDown of level i - 1.
+    Levels are only computed when first requested; building them is
+    locked so one pyramid (e.g. the reference's) can serve many threads.
+    """
+
+    def __init__(self, gray, min_size=32):
+        if gray.dtype != np.float32:
+            gray = gray.astype(np.float32)
+        self.levels = [gray]
+        self.min_size = min_size
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_image(cls, image, min_size=32):
+        """Build from a BGR or gray image of any dtype (uint16 is rescaled to 0-255)."""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        scale = ImageLoadingHandler.dtype_scale(gray.dtype)
+        if gray.dtype != np.float32 or scale != 1.0:
+            gray = gray.astype(np.float32) * np.float32(scale)
+        return cls(gray, min_size)
+
+    @property
+    def full(self):
+        return self.levels[0]
+
+    @property
+    def shape(self):
+        return self.levels[0].shape[:2]
+
+    def level(self, index):
+        """Gaussian level index (clamped to the coarsest allowed level)."""
+        if index >= len(self.levels):
+            with self._lock:
+                while len(self.levels) <= index:
+                    top = self.levels[-1]
+                    if min(top.shape[:2]) < 2 * self.min_size:
+                        break
+                    self.levels.append(cv2.pyrDown(top))
+        return self.levels[min(index, len(self.levels) - 1)]
+
+    def at_scale(self, scale):
+        """Luminance resized by scale (<= 1), taken from the nearest finer level."""
+        if scale >= 1.0:
+            return self.levels[0]
+        h, w = self.shape
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        index = 0
+        while True:
+            candidate = self.level(index + 1)
+            if (candidate is self.levels[index] or candidate.shape[1] < size[0]
+                    or candidate.shape[0] < size[1]):
+                break
+            index += 1
+        source = self.levels[index]
+        if source.shape[1] == size[0] and source.shape[0] == size[1]:
+            return source
+        return cv2.resize(source, size, interpolation=cv2.INTER_AREA)
+
+    def at_max_dim(self, max_dim):
+        """Luminance with its long side at most max_dim pixels."""
+        return self.at_scale(min(max_dim / max(self.shape), 1.0))
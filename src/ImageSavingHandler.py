@@ -0,0 +1,515 @@
+"""
+    Strip-wise image writers.
+    Rows are encoded as they arrive, so a result can be written while it is
+    still being reconstructed and the full image never has to exist in
+    memory. Compression runs on worker threads, one strip (or tile) per
+    job, while later rows are still being produced. PNG (8/16-bit) and
+    TIFF (8/16-bit, deflate or zstd, stripped or tiled, classic or
+    BigTIFF) are supported; other formats go through cv2.imwrite on a
+    full image (see save_image).
+"""
+import os
+import time
+import struct
+import zlib
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+logger = logging.getLogger(__name__)
+
+STRIP_FORMATS = ("png", "tif", "tiff")
+TIFF_CODECS = ("deflate", "zstd")
+SAVE_STRIP_ROWS = 256  # Rows quantised and handed to a strip writer at a time
+_TIFF_COMPRESSION_TAGS = {"deflate": 8, "zstd": 50000}
+
+
+def convert_to_bit_depth(image, bit_depth, out=None):
+    """float32 (0-255 range) -> uint8 or uint16 (0-65535, x257)."""
+    image = np.clip(image, 0, 255, out=out)
+    if bit_depth == 16:
+        image *= 257.0
+        return np.around(image, out=image).astype(np.uint16)
+    return np.around(image, out=image).astype(np.uint8)
+
+
+def supports_strips(path):
+    return os.path.splitext(path)[1].lower().lstrip(".") in STRIP_FORMATS
+
+
+def open_strip_writer(path, width, height, channels=3, bit_depth=8, compression=4,
+                      workers=0, **tiff_options):
+    """
+    Writer for path chosen by extension. compression is the deflate (or
+    zstd) level, 0-9; workers the compression threads (0 = one per core).
+    tiff_options go to TiffStripWriter (codec, tile_size, bigtiff). Use
+    as a context manager; write_rows() takes BGR (or gray) uint8/uint16
+    rows, top to bottom.
+    """
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext == "png":
+        return PngStripWriter(path, width, height, channels, bit_depth, compression, workers)
+    if ext in ("tif", "tiff"):
+        return TiffStripWriter(path, width, height, channels, bit_depth, compression,
+                               workers=workers, **tiff_options)
+    raise ValueError(f"No strip writer for '.{ext}' files")
+
+
+def check_tiff_options(codec="deflate", tile_size=0):
+    """Raise ValueError for TIFF writer options that cannot be written."""
+    if codec not in TIFF_CODECS:
+        raise ValueError(f"Unknown TIFF codec: {codec}")
+    if codec == "zstd" and not HAS_ZSTD:
+        raise ValueError("zstd TIFF compression requires the zstandard package")
+    if tile_size and (tile_size < 16 or tile_size % 16):
+        raise ValueError(f"TIFF tile size must be a multiple of 16, not {tile_size}")
+
+
+def output_bit_depth(path, bit_depth=8):
+    """Bit depth path is written at: EXR is always float, JPEG always 8-bit."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".exr":
+        return 32
+    if ext in (".jpg", ".jpeg"):
+        return 8
+    return bit_depth
+
+
+def quantize(image, bit_depth):
+    """float32 (0-255) result as written at bit_depth: uint8, uint16 or float 0-1 (32)."""
+    if bit_depth == 32:
+        return np.clip(image, 0, 255).astype(np.float32) / 255.0
+    return convert_to_bit_depth(image, bit_depth)
+
+
+def save_image(path, image, bit_depth=8, quality=95, compression=4, workers=0, **tiff_options):
+    """
+    Write a float32 (0-255) result to path. PNG and TIFF at 8/16 bits go
+    through a strip writer, quantised SAVE_STRIP_ROWS rows at a time, so
+    no full-size integer copy is made; JPEG (quality) and other formats
+    use cv2.imwrite. bit_depth 32 writes float 0-1 (EXR convention).
+    Returns path; raises OSError when the file cannot be written.
+    """
+    if bit_depth in (8, 16) and supports_strips(path):
+        h, w = image.shape[:2]
+        channels = image.shape[2] if image.ndim == 3 else 1
+        with open_strip_writer(path, w, h, channels, bit_depth, compression,
+                               workers, **tiff_options) as writer:
+            for y0 in range(0, h, SAVE_STRIP_ROWS):
+                writer.write_rows(convert_to_bit_depth(image[y0:y0 + SAVE_STRIP_ROWS], bit_depth))
+        return path
+    return write_quantized(path, quantize(image, bit_depth), quality, compression)
+
+
+def write_quantized(path, image, quality=95, compression=4, workers=0, **tiff_options):
+    """
+    Write an already quantised image (uint8, uint16 or float32 0-1, see
+    quantize) to path, through a strip writer where possible. Returns
+    path; raises OSError when the file cannot be written.
+    """
+    if image.dtype in (np.uint8, np.uint16) and supports_strips(path):
+        h, w = image.shape[:2]
+        channels = image.shape[2] if image.ndim == 3 else 1
+        with open_strip_writer(path, w, h, channels, image.dtype.itemsize * 8, compression,
+                               workers, **tiff_options) as writer:
+            for y0 in range(0, h, SAVE_STRIP_ROWS):
+                writer.write_rows(image[y0:y0 + SAVE_STRIP_ROWS])
+        return path
+
+    ext = os.path.splitext(path)[1].lower()
+    params = None
+    if ext in (".jpg", ".jpeg"):
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    elif ext == ".png":
+        params = [cv2.IMWRITE_PNG_COMPRESSION, compression]
+    try:
+        written = cv2.imwrite(path, image, params)
+    except cv2.error as e:
+        raise OSError(f"Failed to write {path}: {e}") from e
+    if not written:
+        raise OSError(f"Failed to write {path}")
+    return path
+
+
+def export_batch(image, targets, quality=95, compression=4, workers=0,
+                 progress_callback=None, **tiff_options):
+    """
+    Write one float32 (0-255) result to several files at once. targets
+    are (path, bit_depth) pairs. The image is quantised once per bit
+    depth, then the files are encoded concurrently, splitting workers
+    threads (0 = one per core) between them. progress_callback(done,
+    total, time_taken) is called as each file is finished, from a worker
+    thread. A failed file does not stop the others: returns (path,
+    error) per target, in order, error None when it was written.
+    """
+    workers = workers if workers > 0 else os.cpu_count() or 1
+    targets = [(path, output_bit_depth(path, bit_depth)) for path, bit_depth in targets]
+    quantized = {}
+    for _, bit_depth in targets:
+        if bit_depth not in quantized:
+            quantized[bit_depth] = quantize(image, bit_depth)
+
+    jobs = min(len(targets), workers)
+    lock = threading.Lock()
+    done = [0]
+
+    def _export(path, bit_depth):
+        start_time = time.time()
+        try:
+            write_quantized(path, quantized[bit_depth], quality, compression,
+                            max(1, workers // jobs), **tiff_options)
+            error = None
+        except Exception as e:
+            logger.error("Batch export of %s failed: %s", path, e)
+            error = e
+        with lock:
+            done[0] += 1
+            if progress_callback is not None:
+                progress_callback(done[0], len(targets), time.time() - start_time)
+        return path, error
+
+    if jobs <= 1:
+        return [_export(path, bit_depth) for path, bit_depth in targets]
+    with ThreadPoolExecutor(jobs, thread_name_prefix="export") as executor:
+        futures = [executor.submit(_export, path, bit_depth) for path, bit_depth in targets]
+        return [future.result() for future in futures]
+
+
+_save_executor = None
+_save_executor_lock = threading.Lock()
+
+
+def save_image_async(path, image, *args, **kwargs):
+    """
+    save_image on a background thread; returns its Future. Saves run one
+    at a time, in submission order. image must not be modified until the
+    Future is done.
+    """
+    global _save_executor
+    with _save_executor_lock:
+        if _save_executor is None:
+            _save_executor = ThreadPoolExecutor(1, thread_name_prefix="image-save")
+    return _save_executor.submit(save_image, path, image, *args, **kwargs)
+
+
+class _CompressQueue:
+    """
+    Runs compression jobs on worker threads and hands their results to
+    write() in submission order. At most two jobs per worker are in
+    flight, which bounds the memory held by rows waiting to be encoded.
+    With one worker, jobs run inline.
+    """
+
+    def __init__(self, write, workers=0):
+        self._write = write
+        self.workers = workers if workers > 0 else os.cpu_count() or 1
+        self._executor = None
+        if self.workers > 1:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="compress")
+        self._pending = deque()
+
+    def submit(self, fn, *args):
+        if self._executor is None:
+            self._write(fn(*args))
+            return
+        self._pending.append(self._executor.submit(fn, *args))
+        while self._pending and (len(self._pending) > 2 * self.workers or self._pending[0].done()):
+            self._write(self._pending.popleft().result())
+
+    def finish(self):
+        try:
+            while self._pending:
+                self._write(self._pending.popleft().result())
+        finally:
+            self.abort()
+
+    def abort(self):
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+def _deflate_block(data, level, zdict):
+    """
+    Raw deflate of one block of a larger stream, ending on a byte
+    boundary (sync flush) so blocks can be concatenated. zdict is the
+    tail of the previous block, which back-references may still reach.
+    """
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def _encode_tiff_chunk(chunk, codec, level):
+    """Horizontal predictor + compression of one TIFF strip or tile."""
+    # Predictor 2: each sample minus its left neighbour (wrapping)
+    diff = chunk.astype(chunk.dtype.newbyteorder("<"))
+    diff[:, 1:] = chunk[:, 1:] - chunk[:, :-1]
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(diff.tobytes())
+    return zlib.compress(diff.tobytes(), level)
+
+
+class _StripWriter:
+    def __init__(self, path, width, height, channels, bit_depth):
+        if channels not in (1, 3):
+            raise ValueError(f"Unsupported channel count: {channels}")
+        if bit_depth not in (8, 16):
+            raise ValueError(f"Unsupported bit depth: {bit_depth}")
+        self.path = path
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.bit_depth = bit_depth
+        self.rows_written = 0
+        self._queue = None
+        self._file = open(path, "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            if self._queue is not None:
+                self._queue.abort()
+            self._file.close()
+            os.remove(self.path)  # Never leave a truncated image behind
+        return False
+
+    def _check_rows(self, rows):
+        dtype = np.uint16 if self.bit_depth == 16 else np.uint8
+        if rows.dtype != dtype:
+            raise TypeError(f"Expected {np.dtype(dtype).name} rows, got {rows.dtype}")
+        if rows.shape[1] != self.width or (rows.shape[2] if rows.ndim == 3 else 1) != self.channels:
+            raise ValueError(f"Row shape {rows.shape} does not match the image")
+        if self.rows_written + rows.shape[0] > self.height:
+            raise ValueError("More rows written than the image height")
+        self.rows_written += rows.shape[0]
+
+    def _check_complete(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"Only {self.rows_written} of {self.height} rows were written")
+
+    def _to_rgb(self, rows):
+        """BGR rows -> RGB sample order (both formats store RGB)."""
+        return rows[:, :, ::-1] if self.channels == 3 else rows.reshape(rows.shape[:2] + (1,))
+
+
+class PngStripWriter(_StripWriter):
+    """
+    PNG with one zlib stream over all rows, flushed into IDAT chunks.
+    Every write_rows() call is deflated as its own block on a worker
+    thread (primed with the previous block's last 32 KB), and the blocks
+    are joined into the single stream PNG requires.
+    """
+
+    _IDAT_SIZE = 1 << 20
+    _WINDOW = 1 << 15
+
+    def __init__(self, path, width, height, channels=3, bit_depth=8, compression=4, workers=0):
+        super().__init__(path, width, height, channels, bit_depth)
+        self.compression = compression
+        self._queue = _CompressQueue(self._append, workers)
+        # zlib header (FLEVEL is informational) and running checksum
+        self._pending = bytearray(b"\x78" + bytes([(0x01, 0x5E, 0x9C, 0xDA)[
+            0 if compression < 2 else 1 if compression < 6 else 2 if compression == 6 else 3]]))
+        self._adler = 1
+        self._window = b""
+        self._prev_row = None
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        color_type = 2 if channels == 3 else 0
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth,
+                                         color_type, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    def _append(self, data):
+        self._pending += data
+        while len(self._pending) >= self._IDAT_SIZE:
+            self._chunk(b"IDAT", bytes(self._pending[:self._IDAT_SIZE]))
+            del self._pending[:self._IDAT_SIZE]
+
+    def write_rows(self, rows):
+        self._check_rows(rows)
+        samples = np.ascontiguousarray(self._to_rgb(rows))
+        if self.bit_depth == 16:
+            samples = samples.astype(">u2")
+        raw = samples.view(np.uint8).reshape(rows.shape[0], -1)
+        # "Up" filter: each row minus the row above (mod 256)
+        prev = np.empty_like(raw)
+        prev[0] = self._prev_row if self._prev_row is not None else 0
+        prev[1:] = raw[:-1]
+        filtered = np.empty((raw.shape[0], raw.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        np.subtract(raw, prev, out=filtered[:, 1:])
+        self._prev_row = raw[-1].copy()
+        data = filtered.tobytes()
+        self._adler = zlib.adler32(data, self._adler)
+        self._queue.submit(_deflate_block, data, self.compression, self._window)
+        self._window = data[-self._WINDOW:]
+
+    def close(self):
+        self._check_complete()
+        self._queue.finish()
+        # Empty final block (BFINAL, fixed Huffman, end of block) + Adler-32
+        self._append(b"\x03\x00" + struct.pack(">I", self._adler))
+        if self._pending:
+            self._chunk(b"IDAT", bytes(self._pending))
+        self._chunk(b"IEND", b"")
+        self._file.close()
+
+
+class TiffStripWriter(_StripWriter):
+    """
+    Little-endian TIFF, chunky RGB/gray, deflate (or zstd, codec="zstd")
+    with horizontal predictor. Rows are cut into strips of rows_per_strip
+    rows, or with tile_size (a multiple of 16) into square tiles, and
+    every strip or tile is compressed on a worker thread. BigTIFF (64-bit
+    offsets) is written when bigtiff is True, or by default when the
+    image could exceed the 4 GB of a classic TIFF. The IFD is written
+    after the image data, once the offsets are known.
+    """
+
+    def __init__(self, path, width, height, channels=3, bit_depth=8, compression=4,
+                 rows_per_strip=64, tile_size=0, codec="deflate", bigtiff=None, workers=0):
+        check_tiff_options(codec, tile_size)
+        super().__init__(path, width, height, channels, bit_depth)
+        if bigtiff is None:
+            raw_size = width * height * channels * bit_depth // 8
+            bigtiff = raw_size + raw_size // 100 + (1 << 20) >= 1 << 32
+        self.bigtiff = bigtiff
+        self.codec = codec
+        self.compression = compression
+        self.tile_size = tile_size
+        self.rows_per_strip = tile_size or rows_per_strip
+        self._queue = _CompressQueue(self._append, workers)
+        self._buffer = []
+        self._buffered = 0
+        self._offsets = []
+        self._counts = []
+        # IFD offset patched on close
+        self._file.write(b"II+\x00\x08\x00\x00\x00" + bytes(8) if bigtiff else b"II*\x00" + bytes(4))
+
+    def write_rows(self, rows):
+        self._check_rows(rows)
+        self._buffer.append(np.array(self._to_rgb(rows)))  # Caller may reuse rows
+        self._buffered += rows.shape[0]
+        while self._buffered >= self.rows_per_strip:
+            self._flush(self.rows_per_strip)
+        if self.rows_written == self.height and self._buffered:
+            self._flush(self._buffered)
+
+    def _flush(self, n_rows):
+        rows = np.concatenate(self._buffer) if len(self._buffer) > 1 else self._buffer[0]
+        strip, rest = rows[:n_rows], rows[n_rows:]
+        self._buffer = [rest] if len(rest) else []
+        self._buffered = len(rest)
+        if not self.tile_size:
+            self._queue.submit(_encode_tiff_chunk, strip, self.codec, self.compression)
+            return
+        # Tiles are always full size: the right and bottom edges are padded
+        size = self.tile_size
+        for x0 in range(0, self.width, size):
+            tile = strip[:, x0:x0 + size]
+            if tile.shape[:2] != (size, size):
+                padded = np.zeros((size, size, self.channels), dtype=strip.dtype)
+                padded[:tile.shape[0], :tile.shape[1]] = tile
+                tile = padded
+            self._queue.submit(_encode_tiff_chunk, tile, self.codec, self.compression)
+
+    def _append(self, data):
+        offset = self._file.tell()
+        if not self.bigtiff and offset + len(data) >= 1 << 32:
+            raise ValueError("Image too large for a classic TIFF (4 GB); use BigTIFF")
+        self._offsets.append(offset)
+        self._counts.append(len(data))
+        self._file.write(data)
+
+    def close(self):
+        self._check_complete()
+        self._queue.finish()
+        f = self._file
+        n = len(self._offsets)
+        big = self.bigtiff
+        formats = {3: "H", 4: "I", 16: "Q"}
+        inline_size = 8 if big else 4
+        offset_type = 16 if big else 4
+
+        def _array(values, type_):
+            # Values that do not fit the entry go out of line
+            fmt = formats[type_]
+            if len(values) * struct.calcsize(fmt) <= inline_size:
+                return None, values
+            if f.tell() % 2:
+                f.write(b"\x00")
+            offset = f.tell()
+            f.write(struct.pack(f"<{len(values)}{fmt}", *values))
+            return offset, values
+
+        bits = _array([self.bit_depth] * self.channels, 3)
+        offsets = _array(self._offsets, offset_type)
+        counts = _array(self._counts, offset_type)
+        if self.tile_size:
+            layout = [
+                (322, 4, [self.tile_size]),
+                (323, 4, [self.tile_size]),
+                (324, offset_type, offsets),
+                (325, offset_type, counts),
+            ]
+        else:
+            layout = [
+                (273, offset_type, offsets),
+                (278, 4, [self.rows_per_strip]),
+                (279, offset_type, counts),
+            ]
+        entries = sorted([
+            (256, 4, [self.width]),
+            (257, 4, [self.height]),
+            (258, 3, bits),
+            (259, 3, [_TIFF_COMPRESSION_TAGS[self.codec]]),
+            (262, 3, [2 if self.channels == 3 else 1]),
+            (277, 3, [self.channels]),
+            (284, 3, [1]),
+            (317, 3, [2]),  # Horizontal differencing
+        ] + layout, key=lambda entry: entry[0])
+        if f.tell() % 2:
+            f.write(b"\x00")
+        ifd_offset = f.tell()
+        f.write(struct.pack("<Q" if big else "<H", len(entries)))
+        entry_head = "<HHQ" if big else "<HHI"
+        for tag, type_, value in entries:
+            if isinstance(value, tuple):
+                offset, values = value
+            else:
+                offset, values = None, value
+            if offset is None:
+                inline = struct.pack(f"<{len(values)}{formats[type_]}", *values).ljust(inline_size, b"\x00")
+                f.write(struct.pack(entry_head, tag, type_, len(values)) + inline)
+            else:
+                f.write(struct.pack(entry_head, tag, type_, len(values))
+                        + struct.pack("<Q" if big else "<I", offset))
+        f.write(bytes(inline_size))  # No next IFD
+        f.seek(8 if big else 4)
+        f.write(struct.pack("<Q" if big else "<I", ifd_offset))
+        f.close()
+        logger.debug(f"Wrote {self.path}: {n} {'tiles' if self.tile_size else 'strips'}"
+                     f"{' (BigTIFF)' if big else ''}")
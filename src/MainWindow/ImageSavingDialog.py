@@ -3,11 +3,12 @@ Create dialog(s) for changing image export settings; and success/error message.
 Supports 8-bit (JPG, PNG, TIFF) and 16-bit (PNG, TIFF) output.
 """
 import os
-import cv2
-import numpy as np
 import PySide6.QtCore as qtc
 import PySide6.QtWidgets as qtw
 
+import src.ImageSavingHandler as ImageSavingHandler
+import src.MainWindow.Threading as QThreading
+
 
 # Quality selection dialog (depends on type of exported img)
 class SelectQualityDialog(qtw.QDialog):
@@ -165,41 +166,21 @@ class ResultDialog(qtw.QMessageBox):
             self.setInformativeText("File location:\n" + imgPath)
 
 
-def _convert_to_uint8(imageArray):
-    """Convert float32 image (0-255 range) to uint8."""
-    out = np.clip(imageArray, 0, 255)
-    return np.around(out).astype(np.uint8)
-
-
-def _convert_to_uint16(imageArray):
-    """Convert float32 image (0-255 range) to uint16 (0-65535 range).
-
-    Scales from 0-255 float to 0-65535 uint16, preserving the extra
-    precision from the float32 stacking pipeline. This gives 256x more
-    tonal gradations than 8-bit output.
-    """
-    out = np.clip(imageArray, 0, 255)
-    # Scale 0-255 -> 0-65535 (multiply by 257 = 65535/255)
-    out = out * 257.0
-    return np.around(out).astype(np.uint16)
-
-
 def createDialog(imageArray, imType, chosenPath):
     # Something went wrong
     if imType is None:
         return
 
-    imgPath = None
-    errorStackTrace = None
     bit_depth = 8
-    compressionFactor = None
+    quality = 95
+    compressionFactor = 4
 
     if imType == "JPG":
         # JPG: quality dialog only (always 8-bit)
         qualityDialog = SelectQualityDialog(imType)
         qualityDialog.exec()
         if qualityDialog.selectedQuality is not None:
-            compressionFactor = qualityDialog.selectedQuality
+            quality = qualityDialog.selectedQuality
         else:
             return
 
@@ -211,13 +192,11 @@ def createDialog(imageArray, imType, chosenPath):
             bit_depth = depthDialog.selectedBitDepth
             if depthDialog.slider is not None:
                 compressionFactor = depthDialog.slider.value()
-            else:
-                compressionFactor = 4
         else:
             return
 
     elif imType == "TIFF":
-        # TIFF: bit depth dialog only (no compression needed)
+        # TIFF: bit depth dialog only (deflate at the default level)
         depthDialog = SelectBitDepthDialog("TIFF")
         depthDialog.exec()
         if depthDialog.selectedBitDepth is not None:
@@ -229,27 +208,15 @@ def createDialog(imageArray, imType, chosenPath):
         # EXR: always 32-bit float, no dialog needed
         bit_depth = 32
 
-    # Convert to target bit depth
-    if bit_depth == 32:
-        # EXR: keep as float32, scale to 0-1 range (EXR convention)
-        imageOut = np.clip(imageArray, 0, 255).astype(np.float32) / 255.0
-    elif bit_depth == 16:
-        imageOut = _convert_to_uint16(imageArray)
-    else:
-        imageOut = _convert_to_uint8(imageArray)
-
-    # Build compression/quality params
-    compression_list = None
-    if imType == "JPG":
-        compression_list = [cv2.IMWRITE_JPEG_QUALITY, compressionFactor]
-    elif imType == "PNG":
-        compression_list = [cv2.IMWRITE_PNG_COMPRESSION, compressionFactor or 4]
-
-    # Try saving image to disk
-    try:
-        cv2.imwrite(chosenPath, imageOut, compression_list)
-        imgPath = chosenPath
-    except Exception as e:
-        errorStackTrace = e
-
-    ResultDialog(imgPath, errorStackTrace).exec()
+    # Encode on a pool thread (compression itself is multithreaded), so
+    # the UI stays responsive; the result dialog opens once it is written
+    def save(signals):
+        ImageSavingHandler.save_image(chosenPath, imageArray, bit_depth, quality, compressionFactor)
+
+    errors = []
+    worker = QThreading.Worker(save)
+    worker.signals.error.connect(lambda error: errors.append(error[2]))
+    worker.signals.finished.connect(
+        lambda: ResultDialog(None if errors else chosenPath, errors[0] if errors else None).exec()
+    )
+    qtc.QThreadPool.globalInstance().start(worker)
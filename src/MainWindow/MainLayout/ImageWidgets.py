@@ -9,8 +9,11 @@ import PySide6.QtWidgets as qtw
 import PySide6.QtGui as qtg
 
 import src.settings as settings
+from src.ImageLoadingHandler import ImageLoadingHandler
 from src.MainWindow.style import ACCENT, ACCENT_DIM, TEXT_MUTED, BG_SIDEBAR
 
+_loader = ImageLoadingHandler()
+
 
 # Background thumbnail loader
 class ThumbnailWorker(qtc.QRunnable):
@@ -25,11 +28,8 @@ class ThumbnailWorker(qtc.QRunnable):
 
     def run(self):
         try:
-            # Load at 1/8 resolution for speed (IMREAD_REDUCED_COLOR_8)
-            img = cv2.imread(self.path, cv2.IMREAD_REDUCED_COLOR_8)
-            if img is None:
-                # Fallback to full load for formats that don't support reduced
-                img = cv2.imread(self.path)
+            # Load at 1/8 resolution for speed (JPEG DCT scaling, RAW preview)
+            img = _loader.read_reduced(self.path, 8)
             if img is not None:
                 h, w = img.shape[:2]
                 if max(h, w) > self.size:
@@ -19,20 +19,31 @@ import src.settings as settings
 
 
 class PreviewWorker(qtc.QRunnable):
-    """Loads a full-resolution image in the background for preview display."""
+    """
+    Loads an image in the background for preview display. Large files are
+    first shown from a quick reduced decode, then at full resolution.
+    """
+    QUICK_PREVIEW_BYTES = 4 * 1024**2  # Files larger than this get a reduced first pass
+    QUICK_PREVIEW_FACTOR = 4
+
     class Signals(qtc.QObject):
-        ready = qtc.Signal(str, object)  # path, bgr_image
+        ready = qtc.Signal(str, object, bool)  # path, bgr_image, full resolution
 
-    def __init__(self, path):
+    def __init__(self, path, loader):
         super().__init__()
         self.path = path
+        self.loader = loader
         self.signals = self.Signals()
 
     def run(self):
         try:
-            bgr = cv2.imread(self.path, cv2.IMREAD_COLOR)
+            if os.path.getsize(self.path) > self.QUICK_PREVIEW_BYTES:
+                quick = self.loader.read_reduced(self.path, self.QUICK_PREVIEW_FACTOR)
+                if quick is not None:
+                    self.signals.ready.emit(self.path, quick, False)
+            bgr = self.loader.read_reduced(self.path, 1)
             if bgr is not None:
-                self.signals.ready.emit(self.path, bgr)
+                self.signals.ready.emit(self.path, bgr, True)
         except Exception:
             pass
 
@@ -102,7 +113,7 @@ class CenterWidget(qtw.QWidget):
                     pass
 
                 # Load full-res in background thread (UI stays responsive)
-                worker = PreviewWorker(path)
+                worker = PreviewWorker(path, self.ImageLoading)
                 worker.signals.ready.connect(self._on_preview_ready)
                 self._preview_pool.start(worker)
                 return
@@ -114,7 +125,7 @@ class CenterWidget(qtw.QWidget):
         except (KeyError, AttributeError):
             pass
 
-    def _on_preview_ready(self, path, bgr_image):
+    def _on_preview_ready(self, path, bgr_image, full_resolution=True):
         """Called on main thread when background image load completes."""
         if path != self._pending_preview_path:
             return
@@ -131,6 +142,8 @@ class CenterWidget(qtw.QWidget):
             size_str = f"{size_kb/1024:.1f} MB" if size_kb > 1024 else f"{size_kb:.0f} KB"
             name = os.path.basename(path)
             info = f"{name}  —  {w} x {h}  |  {ext}  |  {size_str}"
+            if not full_resolution:
+                info = f"{name}  —  {ext}  |  {size_str}  |  Loading full resolution..."
             settings.globalVars["MainWindow"].image_info_label.setText(info)
         except Exception:
             pass
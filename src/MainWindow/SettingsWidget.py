@@ -307,7 +307,7 @@ class SettingsPanel(qtw.QWidget):
 
         self.autocrop_checkbox = qtw.QCheckBox()
         self.autocrop_checkbox.setChecked(
-            bool(int(settings.globalVars["QSettings"].value("algorithm/auto_crop") or 1))
+            bool(int(settings.globalVars["QSettings"].value("algorithm/auto_crop", 1)))
         )
         self.autocrop_checkbox.toggled.connect(lambda v: self.change_setting("algorithm/auto_crop", int(v)))
         autocrop_control = qtw.QWidget()
@@ -388,15 +388,24 @@ class SettingsPanel(qtw.QWidget):
 
     def _auto_detect_params(self):
         """Auto-detect optimal parameters from currently loaded images."""
-        from src.config import auto_detect_params
+        from src.algorithms.auto_tune import tune_params
         paths = settings.globalVars.get("LoadedImagePaths", [])
         if not paths:
             return
-        import cv2
-        sample = cv2.imread(paths[0])
-        if sample is None:
+        self._apply_params(tune_params(paths))
+
+    def _suggest_params_from_header(self):
+        """Size-based parameters from the first image's header (no decode)."""
+        from src.config import auto_detect_params
+        from src.ImageLoadingHandler import ImageLoadingHandler
+        paths = settings.globalVars.get("LoadedImagePaths", [])
+        meta = ImageLoadingHandler().probe(paths[0]) if paths else None
+        if meta is not None:
+            self._apply_params(auto_detect_params(meta.shape, len(paths)))
+
+    def _apply_params(self, params):
+        if params is None:
             return
-        params = auto_detect_params(sample.shape, len(paths))
         self.kernel_spin.setValue(params["fusion_kernel_size"])
         self.pyramid_spin.setValue(params["pyramid_num_levels"])
         self.scale_spin.setValue(params["alignment_scale_factor"])
@@ -424,6 +433,7 @@ class SettingsPanel(qtw.QWidget):
             contrast_threshold=float(qs.value("algorithm/contrast_threshold") or 0.0),
             feather_radius=int(qs.value("algorithm/feather_radius") or 2),
             depthmap_smoothing=int(qs.value("algorithm/depthmap_smoothing") or 5),
+            auto_crop=bool(int(qs.value("algorithm/auto_crop", 1))),
         )
 
 
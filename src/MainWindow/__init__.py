@@ -18,6 +18,7 @@ import src.MainWindow.ImageSavingDialog as ImageSavingDialog
 import src.MainWindow.SettingsWidget as SettingsWidget
 
 import src.algorithms.API as algorithm_API
+import src.ImageSavingHandler as ImageSavingHandler
 from src.config import AlgorithmConfig
 
 if os.name == "nt":
@@ -155,39 +156,54 @@ class Window(qtw.QMainWindow):
             options=qtw.QFileDialog.DontUseNativeDialog,
         )
         if directory:
-            from src.MainWindow.ImageSavingDialog import _convert_to_uint8, _convert_to_uint16
-            import cv2
-            image_8 = _convert_to_uint8(self.LaplacianAlgorithm.output_image)
-            image_16 = _convert_to_uint16(self.LaplacianAlgorithm.output_image)
             base = os.path.join(directory, "stacked_output")
-            exported = []
-            try:
-                cv2.imwrite(base + ".jpg", image_8, [cv2.IMWRITE_JPEG_QUALITY, 95])
-                exported.append(base + ".jpg")
-                cv2.imwrite(base + ".png", image_16, [cv2.IMWRITE_PNG_COMPRESSION, 4])
-                exported.append(base + ".png (16-bit)")
-                cv2.imwrite(base + ".tif", image_16)
-                exported.append(base + ".tif (16-bit)")
-                # EXR: 32-bit float (0-1 range)
-                image_exr = np.clip(self.LaplacianAlgorithm.output_image, 0, 255).astype(np.float32) / 255.0
-                cv2.imwrite(base + ".exr", image_exr)
-                exported.append(base + ".exr (32-bit float)")
+            targets = [
+                (base + ".jpg", 8),
+                (base + ".png", 16),
+                (base + ".tif", 16),
+                (base + ".exr", 32),
+            ]
+            image = self.LaplacianAlgorithm.output_image
+
+            # Quantise once per bit depth, encode all formats in parallel
+            # off the GUI thread
+            def export(signals):
+                def progress(done, total, time_taken):
+                    signals.finished_inter_task.emit(["exported_file", done, total, time_taken])
+
+                results.extend(ImageSavingHandler.export_batch(
+                    image, targets, progress_callback=progress))
+
+            def exported_file(result_list):
+                _, done, total, _ = result_list
+                self.statusBar().showMessage(
+                    f"Batch export: {done}/{total} files written", self.statusbar_msg_display_time
+                )
 
+            def finished():
+                failed = [(path, error) for path, error in results if error is not None]
                 msg = qtw.QMessageBox(self)
                 msg.setStandardButtons(qtw.QMessageBox.Ok)
-                msg.setIcon(qtw.QMessageBox.Information)
-                msg.setWindowTitle("Batch export success")
-                msg.setText(f"Exported {len(exported)} files to:\n{directory}")
-                msg.setInformativeText("PNG/TIFF: 16-bit, EXR: 32-bit float.")
-                msg.show()
-            except Exception as e:
-                msg = qtw.QMessageBox(self)
-                msg.setStandardButtons(qtw.QMessageBox.Ok)
-                msg.setIcon(qtw.QMessageBox.Critical)
-                msg.setWindowTitle("Batch export failed")
-                msg.setText(f"Error during batch export:\n{e}")
+                if results and not failed:
+                    msg.setIcon(qtw.QMessageBox.Information)
+                    msg.setWindowTitle("Batch export success")
+                    msg.setText(f"Exported {len(results)} files to:\n{directory}")
+                    msg.setInformativeText("PNG/TIFF: 16-bit, EXR: 32-bit float.")
+                else:
+                    msg.setIcon(qtw.QMessageBox.Critical)
+                    msg.setWindowTitle("Batch export failed")
+                    msg.setText("Error during batch export:\n" + "\n".join(
+                        f"{os.path.basename(path)}: {error}" for path, error in failed
+                    ) if failed else "Error during batch export.")
                 msg.show()
 
+            results = []
+            worker = QThreading.Worker(export)
+            worker.signals.finished_inter_task.connect(exported_file)
+            worker.signals.finished.connect(finished)
+            self.threadpool.start(worker)
+            self.statusBar().showMessage("Batch exporting...", self.statusbar_msg_display_time)
+
     # Clear all loaded images
     def clear_all_images(self):
         if self.is_stacking:
@@ -282,8 +298,9 @@ class Window(qtw.QMainWindow):
                 settings.globalVars["LoadedImagePaths"] = validPaths
                 self._output_exported = False
 
-                # Auto-detect optimal parameters from first image
-                self.SettingsWidget._auto_detect_params()
+                # Size-based parameters from the first image's header; the
+                # content-measuring tune runs from "Reset to recommended"
+                self.SettingsWidget._suggest_params_from_header()
 
     @property
     def is_stacking(self):
@@ -306,6 +323,18 @@ class Window(qtw.QMainWindow):
             msg.show()
             return False
 
+        errors, _ = self.LaplacianAlgorithm.validate_frames(
+            align=method_name == "align_and_stack_images")
+        if errors:
+            msg = qtw.QMessageBox(self)
+            msg.setStandardButtons(qtw.QMessageBox.Ok)
+            msg.setIcon(qtw.QMessageBox.Critical)
+            msg.setWindowTitle("Stacking failed")
+            msg.setText("Frames differ in size and cannot be stacked without alignment:\n"
+                        + "\n".join(errors[:10]))
+            msg.show()
+            return False
+
         self._sync_algorithm_config()
         self._stacking_active = True
         self.SettingsWidget.setEnabled(False)  # Lock settings during stacking
@@ -365,6 +394,8 @@ class Window(qtw.QMainWindow):
                 f"Cropped: {top}px top, {bottom}px bottom, {left}px left, {right}px right",
                 self.statusbar_msg_display_time
             )
+        elif self.LaplacianAlgorithm.crop_bounds is not None:
+            self.statusBar().showMessage("Output is already cropped", self.statusbar_msg_display_time)
         else:
             self.statusBar().showMessage("No alignment shifts to crop", self.statusbar_msg_display_time)
 
@@ -393,20 +424,18 @@ class Window(qtw.QMainWindow):
 
         # If cancelled or no output produced, discard everything
         if self.LaplacianAlgorithm.output_image is None:
-            self.LaplacianAlgorithm.Algorithm.alignment_shifts = []
+            self.LaplacianAlgorithm.Algorithm.reset_alignment()
             self.statusBar().showMessage("Stacking cancelled", self.statusbar_msg_display_time)
             return
 
-        # Auto-crop black edges if enabled in settings
-        auto_crop = bool(int(settings.globalVars["QSettings"].value("algorithm/auto_crop") or 1))
-        if auto_crop:
-            bounds = self.LaplacianAlgorithm.auto_crop_output()
-            if bounds:
-                top, bottom, left, right = bounds
-                self.statusBar().showMessage(
-                    f"Auto-cropped: {top}px top, {bottom}px bottom, {left}px left, {right}px right",
-                    self.statusbar_msg_display_time
-                )
+        # Black edges were auto-cropped by the run if enabled in settings
+        bounds = self.LaplacianAlgorithm.crop_bounds
+        if bounds:
+            top, bottom, left, right = bounds
+            self.statusBar().showMessage(
+                f"Auto-cropped: {top}px top, {bottom}px bottom, {left}px left, {right}px right",
+                self.statusbar_msg_display_time
+            )
 
         self._main_content.add_processed_image(self.LaplacianAlgorithm.output_image)
         self._output_exported = False
@@ -7,13 +7,20 @@
       - weighted_average: Contrast-weighted blending (smooth results)
       - depth_map: Per-pixel selection from sharpest source (best color fidelity)
 """
+import os
 import time
 import logging
+import threading
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 import numpy as np
 import src.utilities as utilities
+import src.frame_sources as frame_sources
+import src.ImageSavingHandler as ImageSavingHandler
 import src.algorithms as algorithms
+import src.algorithms.valid_region as valid_region
+import src.algorithms.pipeline as pipeline
 import src.algorithms.stacking_algorithms.cpu as CPU
 from src.config import AlgorithmConfig
 
@@ -36,6 +43,11 @@ class LaplacianPyramid:
         self.output_image = None
         self.depth_map = None  # Populated by depth_map method
         self.image_paths = []
+        self.rejected_frames = []  # Paths dropped as alignment outliers
+        self.crop_bounds = None  # (top, bottom, left, right) once output is cropped
+        self.pipeline_stats = None  # PipelineStats of the last Laplacian CPU run
+        self.output_path = None  # File written by the last streamed run (output_image stays None)
+        self._stream_target = None  # (path, bit_depth, compression, writer options), see stream_output_to
         self.Algorithm = algorithms.Algorithm()
 
     @property
@@ -55,6 +67,10 @@ class LaplacianPyramid:
         self.Algorithm.toggle_cpu_gpu(
             self.config.use_gpu, self.config.selected_gpu_id,
         )
+        self.Algorithm.planar_pyramids = self.config.pyramid_layout == "planar"
+        self.Algorithm.quantized_pyramids = self.config.pyramid_dtype == "int16"
+        self.Algorithm.int16_overflow = False
+        self.Algorithm.hierarchical_fusion = self.config.hierarchical_fusion
 
     def cancel(self):
         self.Algorithm.cancel()
@@ -66,30 +82,89 @@ class LaplacianPyramid:
         self.Algorithm.resume()
 
     def update_image_paths(self, new_image_paths):
-        self.image_paths = sorted(new_image_paths, key=utilities.int_string_sorting)
+        """
+        Set the stack's frames. Multi-page TIFFs and videos among the paths
+        stand for all their frames: they are replaced by one FrameRef per
+        frame (see src.frame_sources), decoded lazily from the container.
+        """
+        self.image_paths = sorted(frame_sources.expand_paths(new_image_paths),
+                                  key=utilities.int_string_sorting)
+
+    def validate_frames(self, align=True):
+        """
+        Header-only check that the frames belong in one stack, before any
+        pixels are decoded (see ImageLoadingHandler.probe). Returns
+        (errors, warnings), lists of messages. A frame whose size differs
+        from the first is an error without alignment (frames are fused
+        pixel for pixel) and a warning with it (it is cropped or padded to
+        the reference). Mixed bit depths are a warning; frames whose
+        header cannot be read are not checked.
+        """
+        loader = self.Algorithm.ImageLoadingHandler
+        errors, warnings = [], []
+        reference = None
+        for path in self.image_paths:
+            meta = loader.probe(path)
+            if meta is None:
+                continue
+            if reference is None:
+                reference = (path, meta)
+                continue
+            ref_path, ref = reference
+            name = os.path.basename(path)
+            if meta.shape != ref.shape:
+                message = (f"{name} is {meta.shape[1]}x{meta.shape[0]}, "
+                           f"{os.path.basename(ref_path)} is {ref.shape[1]}x{ref.shape[0]}")
+                (warnings if align else errors).append(message)
+            if meta.bit_depth != ref.bit_depth:
+                warnings.append(f"{name} is {meta.bit_depth}-bit, "
+                                f"{os.path.basename(ref_path)} is {ref.bit_depth}-bit")
+        for message in warnings:
+            logger.warning(message)
+        return errors, warnings
+
+    def _check_frames(self, align):
+        errors, _ = self.validate_frames(align)
+        if errors:
+            raise ValueError("Frames cannot be stacked without alignment: " + "; ".join(errors))
+
+    def _valid_spans(self):
+        """Row spans of the region every aligned frame covers, or None."""
+        shape = self.Algorithm.alignment_frame_shape
+        matrices = self.Algorithm.alignment_matrices
+        if shape is None or not matrices:
+            return None
+        spans = valid_region.new_spans(shape)
+        for matrix in matrices:
+            valid_region.intersect_footprint(spans, matrix, shape)
+        return spans
 
     def get_crop_bounds(self):
         """
         Compute crop rectangle to remove black edges from alignment.
-        Works for both translation-only shifts (signed x,y) and
-        RST shifts (max corner displacement, always positive).
+        Each frame's warp matrix maps its footprint into the output; the
+        crop is the largest axis-aligned rectangle inside the intersection
+        of all footprints, so rotation and scale are handled exactly.
         Returns (top, bottom, left, right) pixel counts.
         """
-        shifts = self.Algorithm.alignment_shifts
-        if not shifts:
+        spans = self._valid_spans()
+        if spans is None:
+            return None
+        rect = valid_region.largest_rectangle(spans)
+        if rect is None:
             return None
-        import math
-        # For RST, shifts store (max_abs_dx, max_abs_dy) — always positive.
-        # For translation, shifts can be negative.
-        # Handle both: use max absolute value in each direction.
-        max_x = max(abs(s[0]) for s in shifts)
-        max_y = max(abs(s[1]) for s in shifts)
-        # Apply symmetrically + 1px margin
-        crop_x = math.ceil(max_x) + 1
-        crop_y = math.ceil(max_y) + 1
-        return (crop_y, crop_y, crop_x, crop_x)
+        x0, y0, x1, y1 = rect
+        h, w = self.Algorithm.alignment_frame_shape
+        return (y0, h - y1, x0, w - x1)
 
     def auto_crop_output(self):
+        """
+        Crop the output to get_crop_bounds(). Returns the bounds cropped by
+        this call, or None when nothing was cropped; cropping twice is a
+        no-op (the first crop stays in crop_bounds).
+        """
+        if self.crop_bounds is not None:
+            return None
         if self.output_image is None:
             return None
         bounds = self.get_crop_bounds()
@@ -100,6 +175,7 @@ class LaplacianPyramid:
         if top + bottom >= h or left + right >= w:
             return None
         self.output_image = self.output_image[top:h - bottom, left:w - right].copy()
+        self.crop_bounds = bounds
         return bounds
 
     def _get_reference_index(self):
@@ -108,50 +184,145 @@ class LaplacianPyramid:
             return len(self.image_paths) // 2
         return 0
 
-    def _load_and_align(self, ref_image, path):
-        """Load an image and align it to the reference. Returns float32."""
-        return self.Algorithm.align_image_pair(
+    def _load_and_align(self, ref_image, path, out=None, index=None, label=None, gray_out=None):
+        """Load an image and align it to the reference.
+
+        The frame is decoded in its native dtype and warped straight into
+        out (a reusable float32 buffer), its gray plane into gray_out. Returns an AlignmentResult, or
+        None when the frame is rejected as an alignment outlier. Safe to
+        call from several workers: the transform is recorded under the
+        frame's index, so completion order does not matter. path may also
+        be a decoded frame, named label in logs and rejected_frames.
+        """
+        result = self.Algorithm.align_frame(
             ref_image, path,
             scale_factor=self.config.alignment_scale_factor,
             use_rst=self.config.align_rotation_scale,
+            out=out, gray_out=gray_out,
         )
+        result = self._apply_outlier_policy(ref_image, path, result, label)
+        if result is not None:
+            self.Algorithm.record_alignment(result, index)
+        return result
+
+    def _apply_outlier_policy(self, ref_image, path, result, label=None):
+        """Re-align or drop a frame whose alignment confidence is too low."""
+        threshold = self.config.alignment_min_confidence
+        if threshold <= 0 or result.confidence >= threshold:
+            return result
+        policy = self.config.alignment_outlier_policy
+        if label is None:
+            label = path
+        name = os.path.basename(label) if isinstance(label, str) else "frame"
+        if policy == "keep":
+            logger.warning(f"Low alignment confidence for {name}: {result.confidence:.3f}")
+            return result
+        if policy == "realign" and result.method == "translation":
+            # ECC refines rotation too; its confidence is on the same scale
+            retry = self.Algorithm.align_frame(
+                ref_image, path,
+                scale_factor=self.config.alignment_scale_factor,
+                use_rst=True, out=result.image, gray_out=result.gray,
+            )
+            if retry.confidence >= threshold:
+                logger.info(f"Re-aligned {name} with ECC: "
+                            f"{result.confidence:.3f} -> {retry.confidence:.3f}")
+                return retry
+        logger.warning(f"Dropping {name} from the stack: alignment confidence "
+                       f"{result.confidence:.3f} < {threshold:.3f}")
+        self.rejected_frames.append(label)
+        return None
+
+    def _aligned_frames(self, ref_image):
+        """Yield (index, aligned, gray) for every accepted frame of the stack.
+
+        The consumer must be done with a frame before requesting the next
+        one: every aligned frame is warped into the same float32 buffers.
+        """
+        yield 0, ref_image, None
+        buffer = gray_buffer = None
+        for i, path in enumerate(self.image_paths):
+            if i == 0:
+                continue
+            result = self._load_and_align(ref_image, path, out=buffer, index=i,
+                                          gray_out=gray_buffer)
+            if result is None:
+                continue
+            buffer, gray_buffer = result.image, result.gray
+            yield i, result.image, result.gray
 
     # ─── Align + Stack (dispatches to chosen method) ───
 
     def align_and_stack_images(self, signals=None, progress_callback=None):
         """Align and stack using the configured stacking method."""
         method = self.config.stacking_method
-        if method == "weighted_average":
-            self._align_and_stack_weighted_average(signals, progress_callback)
-        elif method == "depth_map":
-            self._align_and_stack_depthmap(signals, progress_callback)
-        elif method == "exposure_fusion":
-            self._align_and_stack_exposure(signals, progress_callback)
-        else:
-            self._align_and_stack_laplacian(signals, progress_callback)
+        self.crop_bounds = None
+        self.pipeline_stats = None
+        self.output_path = None
+        self._check_frames(align=True)
+        with self._prefetch_frames():
+            if method == "weighted_average":
+                self._align_and_stack_weighted_average(signals, progress_callback)
+            elif method == "depth_map":
+                self._align_and_stack_depthmap(signals, progress_callback)
+            elif method == "exposure_fusion":
+                self._align_and_stack_exposure(signals, progress_callback)
+            else:
+                self._align_and_stack_laplacian(signals, progress_callback)
+        # Workers may reject frames out of order; report them in stack order
+        order = {path: i for i, path in enumerate(self.image_paths)}
+        self.rejected_frames.sort(key=lambda path: order.get(path, len(order)))
+        if self.config.auto_crop:
+            self.auto_crop_output()
 
     def stack_images(self, signals=None, progress_callback=None):
         """Stack without alignment using the configured method."""
         method = self.config.stacking_method
-        if method == "weighted_average":
-            self._stack_weighted_average(signals, progress_callback)
-        elif method == "depth_map":
-            self._stack_depthmap(signals, progress_callback)
-        elif method == "exposure_fusion":
-            self._stack_exposure(signals, progress_callback)
-        else:
-            self._stack_laplacian(signals, progress_callback)
+        self.crop_bounds = None
+        self.pipeline_stats = None
+        self.output_path = None
+        self._check_frames(align=False)
+        with self._prefetch_frames():
+            if method == "weighted_average":
+                self._stack_weighted_average(signals, progress_callback)
+            elif method == "depth_map":
+                self._stack_depthmap(signals, progress_callback)
+            elif method == "exposure_fusion":
+                self._stack_exposure(signals, progress_callback)
+            else:
+                self._stack_laplacian(signals, progress_callback)
+
+    @contextmanager
+    def _prefetch_frames(self):
+        """
+        Prepare the stack's frames ahead of their loads: RAW files are
+        developed in worker processes (config.raw_decode_workers), other
+        files are read ahead of decoding (config.read_ahead_mb).
+        """
+        loader = self.Algorithm.ImageLoadingHandler
+        with loader.raw_decode_pool(self.image_paths, self.config.raw_decode_workers) as pool:
+            paths = [p for p in self.image_paths if pool is None or p not in pool]
+            with loader.prefetch(paths, self.config.read_ahead_mb * 1024**2):
+                yield
 
     # ─── Laplacian Pyramid Method ───
 
     def _can_use_cupy_path(self):
-        """Check if the fully GPU-resident CuPy path can be used."""
+        """
+        Check if the fully GPU-resident CuPy path can be used. It always
+        reconstructs the whole image, so streamed output (stream_output_to)
+        runs the CPU pipeline instead.
+        """
+        if _HAS_CUPY and self.config.use_gpu and self._stream_target is not None:
+            logger.info("Streamed output: CuPy path skipped, using the CPU pipeline")
+            return False
         return _HAS_CUPY and self.config.use_gpu
 
     def _align_and_stack_laplacian(self, signals=None, progress_callback=None):
         self.apply_gpu_settings()
         self.Algorithm.reset_cancel()
-        self.Algorithm.alignment_shifts = []
+        self.Algorithm.reset_alignment()
+        self.rejected_frames = []
 
         # Use fully GPU-resident path when CuPy is available
         if self._can_use_cupy_path():
@@ -164,63 +335,83 @@ class LaplacianPyramid:
         fused_pyr = self.Algorithm.generate_laplacian_pyramid(
             ref_image, self.pyramid_num_levels
         )
+        if self.pyramid_num_levels == 0:
+            # A 0-level pyramid is the reference itself; it is fused in
+            # place while workers still align against the reference
+            fused_pyr = [level.copy() for level in fused_pyr]
+        fused_gray = []  # Focus state of fused_pyr, carried across frames
         new_pyr = None
         paths = self.image_paths
-
-        def _align_and_pyramid(path):
-            """Load, align, and build pyramid in one worker call."""
-            aligned = self._load_and_align(ref_image, path)
+        # One warp buffer per worker thread: the pyramid never references
+        # its full-res input (with >= 1 level), so it can be overwritten.
+        # The gray plane is not used at all here and is always reused.
+        warp_buffers = threading.local()
+        # With auto-crop, pixels outside the intersection of the footprints
+        # seen so far can never survive the crop, so fusion skips them.
+        # The intersection only shrinks as frames arrive (in any order).
+        crop_spans = valid_region.new_spans(ref_image.shape) if self.config.auto_crop else None
+        crop_seen = set()
+
+        def _align_and_pyramid(index):
+            """Load, align, and build pyramid in one worker call.
+            Returns None for frames rejected as alignment outliers."""
+            result = self._load_and_align(
+                ref_image, paths[index], out=getattr(warp_buffers, "image", None),
+                index=index, gray_out=getattr(warp_buffers, "gray", None),
+            )
+            if result is None:
+                return None
+            aligned = result.image
+            warp_buffers.gray = result.gray
+            del result
             pyr = self.Algorithm.generate_laplacian_pyramid(
                 aligned, self.pyramid_num_levels
             )
+            if self.pyramid_num_levels > 0:
+                warp_buffers.image = aligned
             del aligned
             return pyr
 
+        frame_pipeline = self._frame_pipeline(_align_and_pyramid, ref_image.shape)
         try:
-            # Use 2 workers: pre-compute alignment + pyramid for next images
-            # while main thread fuses current pair. cv2 ops release GIL.
-            with ThreadPoolExecutor(max_workers=2) as pool:
-                pending = {}
-                lookahead = 3
-                for j in range(1, min(1 + lookahead, len(paths))):
-                    pending[j] = pool.submit(_align_and_pyramid, paths[j])
-
-                for i in range(1, len(paths)):
+            # Workers align + build pyramids for the next frames while the
+            # main thread fuses the current one. cv2 ops release the GIL.
+            with frame_pipeline:
+                t_last = time.time()
+                for i, new_pyr in frame_pipeline:
                     self.Algorithm.wait_if_paused()
                     if self.Algorithm.is_cancelled:
                         logger.info("Stacking cancelled")
-                        for f in pending.values():
-                            f.cancel()
                         return
 
-                    start_time = time.time()
-
-                    if i in pending:
-                        new_pyr = pending.pop(i).result()
-                    else:
-                        new_pyr = _align_and_pyramid(paths[i])
-
-                    # Refill lookahead
-                    for j in range(i + 1, min(i + 1 + lookahead, len(paths))):
-                        if j not in pending:
-                            pending[j] = pool.submit(_align_and_pyramid, paths[j])
-
-                    fused_pyr = self.Algorithm.focus_fuse_pyramid_pair(
-                        fused_pyr, new_pyr, self.fusion_kernel_size,
-                        self.config.contrast_threshold, self.config.feather_radius,
-                    )
+                    # Rejected outlier frames skip the fuse pass entirely
+                    if new_pyr is not None:
+                        roi = None
+                        if crop_spans is not None:
+                            for index, t in self.Algorithm.alignment_records():
+                                if index not in crop_seen and t.matrix is not None:
+                                    valid_region.intersect_footprint(
+                                        crop_spans, t.matrix, ref_image.shape)
+                                    crop_seen.add(index)
+                            roi = valid_region.bounding_box(crop_spans)
+                        fused_pyr = self.Algorithm.fuse_pyramid_into(
+                            fused_pyr, new_pyr, self.fusion_kernel_size,
+                            self.config.contrast_threshold, self.config.feather_radius,
+                            roi, fused_gray,
+                        )
                     del new_pyr
                     new_pyr = None
-                    elapsed = time.time() - start_time
+                    elapsed = time.time() - t_last
+                    t_last = time.time()
                     self._emit_progress(signals, progress_callback, i + 1, len(paths), elapsed)
         finally:
-            del new_pyr, ref_image
+            del new_pyr, ref_image, fused_gray
+            self._report_pipeline(frame_pipeline)
 
         if self.Algorithm.is_cancelled:
             return
 
-        self.output_image = self.Algorithm.reconstruct_pyramid(fused_pyr)
-        self.output_image = CPU.local_tone_map(self.output_image, strength=0.3)
+        self._finish_laplacian(fused_pyr)
 
     def _align_and_stack_laplacian_cupy(self, signals=None, progress_callback=None):
         """Two-phase GPU pipeline: align ALL on CPU, then stream-fuse on GPU.
@@ -234,7 +425,6 @@ class LaplacianPyramid:
         """
         import cupy as cp
         GPU = _GPU_module
-        import os
 
         paths = self.image_paths
         n = len(paths)
@@ -250,7 +440,7 @@ class LaplacianPyramid:
         with ThreadPoolExecutor(max_workers=n_workers) as pool:
             futures = {}
             for j in range(1, n):
-                futures[j] = pool.submit(self._load_and_align, ref_image, paths[j])
+                futures[j] = pool.submit(self._load_and_align, ref_image, paths[j], None, j)
 
             t_last = time.time()
             for i in range(1, n):
@@ -261,8 +451,10 @@ class LaplacianPyramid:
                         f.cancel()
                     return
 
-                aligned = futures[i].result()
-                aligned_images.append(aligned)
+                result = futures[i].result()
+                # Rejected outlier frames are kept as None and skipped below
+                aligned_images.append(result.image if result is not None else None)
+                del result
                 t_now = time.time()
                 per_image_time = t_now - t_last
                 t_last = t_now
@@ -279,6 +471,19 @@ class LaplacianPyramid:
         if self.Algorithm.is_cancelled:
             return
 
+        # All transforms are known now: with auto-crop, fuse only the
+        # final valid rectangle instead of cropping after reconstruction
+        if self.config.auto_crop:
+            bounds = self.get_crop_bounds()
+            if bounds is not None:
+                top, bottom, left, right = bounds
+                h, w = aligned_images[0].shape[:2]
+                aligned_images = [
+                    img[top:h - bottom, left:w - right] if img is not None else None
+                    for img in aligned_images
+                ]
+                self.crop_bounds = bounds
+
         # ── Phase 2: Stream-fuse on GPU (pairwise, all data in RAM already) ──
         t_gpu = time.time()
         GPU._cupy_warmup()
@@ -291,6 +496,8 @@ class LaplacianPyramid:
         for i in range(1, n):
             if self.Algorithm.is_cancelled:
                 return
+            if aligned_images[i] is None:
+                continue
             img_gpu = cp.asarray(aligned_images[i])
             aligned_images[i] = None  # free RAM as we go
             new_pyr = GPU._cupy_laplacian_pyramid(img_gpu, self.pyramid_num_levels)
@@ -313,10 +520,12 @@ class LaplacianPyramid:
 
         # ── Reconstruct ──
         t_recon = time.time()
+        base = self._tone_map_base(fused_pyr, to_host=cp.asnumpy)
         result_gpu = GPU._cupy_reconstruct(fused_pyr)
         self.output_image = cp.asnumpy(result_gpu)
         del result_gpu, fused_pyr
-        self.output_image = CPU.local_tone_map(self.output_image, strength=0.3)
+        if base is not None:
+            CPU.apply_tone_map(self.output_image, base, self.config.tone_map_strength)
         logger.info(f"[CuPy GPU] Reconstruct+tonemap: {time.time()-t_recon:.3f}s")
         logger.info(f"[CuPy GPU] Total: {time.time()-t_total:.2f}s "
                      f"(align={align_time:.1f}s + gpu={gpu_time:.1f}s)")
@@ -332,66 +541,54 @@ class LaplacianPyramid:
         else:
             logger.info(f"Using CPU pipeline (use_gpu={self.config.use_gpu}, CuPy={_HAS_CUPY})")
 
-        im0 = self.Algorithm.load_image(self.image_paths[0])
+        # Frames stay in their decoded dtype until the pyramid build
+        im0 = self.Algorithm.load_image_native(self.image_paths[0])
         fused_pyr = self.Algorithm.generate_laplacian_pyramid(im0, self.pyramid_num_levels)
+        shape = im0.shape
         del im0
+        fused_gray = []  # Focus state of fused_pyr, carried across frames
         new_pyr = None
         paths = self.image_paths
 
-        def _load_and_pyramid(path):
+        def _load_and_pyramid(index):
             """Load image and build pyramid in worker thread."""
-            img = self.Algorithm.load_image(path)
+            img = self.Algorithm.load_image_native(paths[index])
             pyr = self.Algorithm.generate_laplacian_pyramid(img, self.pyramid_num_levels)
             del img
             return pyr
 
+        frame_pipeline = self._frame_pipeline(_load_and_pyramid, shape)
         try:
             # Pre-compute load+pyramid in background while main thread fuses
-            with ThreadPoolExecutor(max_workers=2) as pool:
-                pending = {}
-                lookahead = 3
-                for j in range(1, min(1 + lookahead, len(paths))):
-                    pending[j] = pool.submit(_load_and_pyramid, paths[j])
-
-                for i in range(1, len(paths)):
+            with frame_pipeline:
+                t_last = time.time()
+                for i, new_pyr in frame_pipeline:
                     self.Algorithm.wait_if_paused()
                     if self.Algorithm.is_cancelled:
-                        for f in pending.values():
-                            f.cancel()
                         return
 
-                    start_time = time.time()
-
-                    if i in pending:
-                        new_pyr = pending.pop(i).result()
-                    else:
-                        new_pyr = _load_and_pyramid(paths[i])
-
-                    for j in range(i + 1, min(i + 1 + lookahead, len(paths))):
-                        if j not in pending:
-                            pending[j] = pool.submit(_load_and_pyramid, paths[j])
-
-                    fused_pyr = self.Algorithm.focus_fuse_pyramid_pair(
+                    fused_pyr = self.Algorithm.fuse_pyramid_into(
                         fused_pyr, new_pyr, self.fusion_kernel_size,
                         self.config.contrast_threshold, self.config.feather_radius,
+                        fused_gray=fused_gray,
                     )
                     del new_pyr
                     new_pyr = None
-                    elapsed = time.time() - start_time
+                    elapsed = time.time() - t_last
+                    t_last = time.time()
                     self._emit_progress(signals, progress_callback, i + 1, len(paths), elapsed)
         finally:
-            del new_pyr
+            del new_pyr, fused_gray
+            self._report_pipeline(frame_pipeline)
 
         if self.Algorithm.is_cancelled:
             return
-        self.output_image = self.Algorithm.reconstruct_pyramid(fused_pyr)
-        self.output_image = CPU.local_tone_map(self.output_image, strength=0.3)
+        self._finish_laplacian(fused_pyr)
 
     def _stack_laplacian_cupy(self, signals=None, progress_callback=None):
         """GPU-resident stacking with parallel image loading."""
         import cupy as cp
         GPU = _GPU_module
-        import os
 
         paths = self.image_paths
         n = len(paths)
@@ -400,9 +597,14 @@ class LaplacianPyramid:
         t_start = time.time()
         GPU._cupy_warmup()
 
-        im0 = self.Algorithm.load_image(paths[0])
+        # Look-ahead frames are queued and uploaded in their decoded dtype
+        # (uint8: 1/4 of the float32 bytes); the GPU promotes them
+        load = self.Algorithm.load_image_native
+        dtype_scale = self.Algorithm.ImageLoadingHandler.dtype_scale
+        im0 = load(paths[0])
         img0_gpu = cp.asarray(im0)
-        fused_pyr = GPU._cupy_laplacian_pyramid(img0_gpu, self.pyramid_num_levels)
+        fused_pyr = GPU._cupy_laplacian_pyramid(img0_gpu, self.pyramid_num_levels,
+                                                dtype_scale(im0.dtype))
         del im0, img0_gpu
 
         try:
@@ -410,7 +612,7 @@ class LaplacianPyramid:
                 pending = {}
                 lookahead = n_workers + 1
                 for j in range(1, min(1 + lookahead, n)):
-                    pending[j] = pool.submit(self.Algorithm.load_image, paths[j])
+                    pending[j] = pool.submit(load, paths[j])
 
                 for i in range(1, n):
                     self.Algorithm.wait_if_paused()
@@ -424,16 +626,17 @@ class LaplacianPyramid:
                     if i in pending:
                         im1 = pending.pop(i).result()
                     else:
-                        im1 = self.Algorithm.load_image(paths[i])
+                        im1 = load(paths[i])
 
                     for j in range(i + 1, min(i + 1 + lookahead, n)):
                         if j not in pending:
-                            pending[j] = pool.submit(self.Algorithm.load_image, paths[j])
+                            pending[j] = pool.submit(load, paths[j])
 
                     t_gpu = time.time()
                     img_gpu = cp.asarray(im1)
+                    scale = dtype_scale(im1.dtype)
                     del im1
-                    new_pyr = GPU._cupy_laplacian_pyramid(img_gpu, self.pyramid_num_levels)
+                    new_pyr = GPU._cupy_laplacian_pyramid(img_gpu, self.pyramid_num_levels, scale)
                     del img_gpu
                     fused_pyr = GPU._cupy_fuse_pyramid_pair(
                         fused_pyr, new_pyr, self.fusion_kernel_size,
@@ -455,10 +658,12 @@ class LaplacianPyramid:
             return
 
         t_recon = time.time()
+        base = self._tone_map_base(fused_pyr, to_host=cp.asnumpy)
         result_gpu = GPU._cupy_reconstruct(fused_pyr)
         self.output_image = cp.asnumpy(result_gpu)
         del result_gpu, fused_pyr
-        self.output_image = CPU.local_tone_map(self.output_image, strength=0.3)
+        if base is not None:
+            CPU.apply_tone_map(self.output_image, base, self.config.tone_map_strength)
         logger.info(f"[CuPy GPU] Reconstruct+tonemap: {time.time()-t_recon:.3f}s")
         logger.info(f"[CuPy GPU] Total: {time.time()-t_start:.2f}s")
 
@@ -469,17 +674,20 @@ class LaplacianPyramid:
     # from pairwise blending of already-blended results.
 
     def _weighted_avg_core(self, image_iter, total, signals, progress_callback):
-        """Core weighted average: accumulate weights and weighted pixels."""
+        """Core weighted average: accumulate weights and weighted pixels.
+
+        image_iter yields (index, image, gray); gray may be None.
+        """
         weighted_sum = None
         weight_total = None
 
-        for i, img in image_iter:
+        for i, img, gray in image_iter:
             self.Algorithm.wait_if_paused()
             if self.Algorithm.is_cancelled:
                 return
             start_time = time.time()
 
-            w = CPU.compute_focus_weights(img, self.fusion_kernel_size)
+            w = CPU.compute_focus_weights(img, self.fusion_kernel_size, gray=gray)
             w3 = w[:, :, np.newaxis] if img.ndim == 3 else w
 
             if weighted_sum is None:
@@ -488,7 +696,7 @@ class LaplacianPyramid:
             else:
                 weighted_sum += img.astype(np.float64) * w3
                 weight_total += w.astype(np.float64)
-            del img
+            del img, gray
 
             elapsed = time.time() - start_time
             self._emit_progress(signals, progress_callback, i + 1, total, elapsed)
@@ -505,19 +713,14 @@ class LaplacianPyramid:
     def _align_and_stack_weighted_average(self, signals=None, progress_callback=None):
         self.apply_gpu_settings()
         self.Algorithm.reset_cancel()
-        self.Algorithm.alignment_shifts = []
+        self.Algorithm.reset_alignment()
+        self.rejected_frames = []
 
         ref_image = self.Algorithm.load_image(self.image_paths[0])
 
-        def image_iter():
-            yield 0, ref_image
-            for i, path in enumerate(self.image_paths):
-                if i == 0:
-                    continue
-                aligned = self._load_and_align(ref_image, path)
-                yield i, aligned
-
-        self._weighted_avg_core(image_iter(), len(self.image_paths), signals, progress_callback)
+        self._weighted_avg_core(
+            self._aligned_frames(ref_image), len(self.image_paths), signals, progress_callback,
+        )
 
     def _stack_weighted_average(self, signals=None, progress_callback=None):
         self.Algorithm.reset_cancel()
@@ -526,7 +729,7 @@ class LaplacianPyramid:
             for i, path in enumerate(self.image_paths):
                 img = self.Algorithm.load_image(path)
                 if img is not None:
-                    yield i, img
+                    yield i, img, None
 
         self._weighted_avg_core(image_iter(), len(self.image_paths), signals, progress_callback)
 
@@ -538,11 +741,14 @@ class LaplacianPyramid:
     # this is correct incrementally.
 
     def _depthmap_core(self, image_iter, total, signals, progress_callback):
-        """Core depth map: per-pixel keep sharpest source."""
+        """Core depth map: per-pixel keep sharpest source.
+
+        image_iter yields (index, image, gray); gray may be None.
+        """
         result = None
         best_sharpness = None
 
-        for i, img in image_iter:
+        for i, img, gray in image_iter:
             self.Algorithm.wait_if_paused()
             if self.Algorithm.is_cancelled:
                 return
@@ -552,6 +758,7 @@ class LaplacianPyramid:
                 img,
                 scales=(5, self.fusion_kernel_size | 1, self.fusion_kernel_size * 3 + 1),
                 smoothing=self.config.depthmap_smoothing,
+                gray=gray,
             )
 
             if result is None:
@@ -565,7 +772,7 @@ class LaplacianPyramid:
                     mask_3ch = mask
                 result = np.where(mask_3ch, img, result)
                 best_sharpness = np.maximum(best_sharpness, sharpness)
-            del img
+            del img, gray
 
             elapsed = time.time() - start_time
             self._emit_progress(signals, progress_callback, i + 1, total, elapsed)
@@ -578,19 +785,14 @@ class LaplacianPyramid:
     def _align_and_stack_depthmap(self, signals=None, progress_callback=None):
         self.apply_gpu_settings()
         self.Algorithm.reset_cancel()
-        self.Algorithm.alignment_shifts = []
+        self.Algorithm.reset_alignment()
+        self.rejected_frames = []
 
         ref_image = self.Algorithm.load_image(self.image_paths[0])
 
-        def image_iter():
-            yield 0, ref_image
-            for i, path in enumerate(self.image_paths):
-                if i == 0:
-                    continue
-                aligned = self._load_and_align(ref_image, path)
-                yield i, aligned
-
-        self._depthmap_core(image_iter(), len(self.image_paths), signals, progress_callback)
+        self._depthmap_core(
+            self._aligned_frames(ref_image), len(self.image_paths), signals, progress_callback,
+        )
 
     def _stack_depthmap(self, signals=None, progress_callback=None):
         self.Algorithm.reset_cancel()
@@ -599,7 +801,7 @@ class LaplacianPyramid:
             for i, path in enumerate(self.image_paths):
                 img = self.Algorithm.load_image(path)
                 if img is not None:
-                    yield i, img
+                    yield i, img, None
 
         self._depthmap_core(image_iter(), len(self.image_paths), signals, progress_callback)
 
@@ -629,7 +831,9 @@ class LaplacianPyramid:
             return
         if batch:
             if len(batch) == 1:
-                intermediates.append(batch[0].astype(np.float32))
+                img = batch[0]
+                intermediates.append(CPU.to_float32(
+                    img, self.Algorithm.ImageLoadingHandler.dtype_scale(img.dtype)))
             else:
                 intermediates.append(CPU.mertens_fuse_batch(batch))
         if not intermediates:
@@ -642,7 +846,8 @@ class LaplacianPyramid:
     def _align_and_stack_exposure(self, signals=None, progress_callback=None):
         self.apply_gpu_settings()
         self.Algorithm.reset_cancel()
-        self.Algorithm.alignment_shifts = []
+        self.Algorithm.reset_alignment()
+        self.rejected_frames = []
         ref_image = self.Algorithm.load_image(self.image_paths[0])
 
         def image_iter():
@@ -650,7 +855,9 @@ class LaplacianPyramid:
             for i, path in enumerate(self.image_paths):
                 if i == 0:
                     continue
-                yield i, self._load_and_align(ref_image, path)
+                result = self._load_and_align(ref_image, path, index=i)
+                if result is not None:
+                    yield i, result.image
 
         self._exposure_core(image_iter(), len(self.image_paths), signals, progress_callback)
 
@@ -658,16 +865,210 @@ class LaplacianPyramid:
         self.Algorithm.reset_cancel()
 
         def image_iter():
+            # Batched frames stay native: Mertens takes 8-bit input anyway
             for i, path in enumerate(self.image_paths):
-                img = self.Algorithm.load_image(path)
+                img = self.Algorithm.load_image_native(path)
                 if img is not None:
                     yield i, img
 
         self._exposure_core(image_iter(), len(self.image_paths), signals, progress_callback)
 
+    # ─── Streamed input ───
+
+    def stack_stream(self, frames, align=False, signals=None, progress_callback=None):
+        """
+        Stack frames as they arrive with the configured method. frames is
+        an iterable of decoded images (e.g. a frame_sources.FrameStream
+        over stdin) whose length need not be known up front; each frame is
+        fused into the running result as soon as it is received, so the
+        stack never touches disk. image_paths is not used. The first frame
+        is the alignment reference. Progress reports the frames received
+        so far as the total.
+        """
+        method = self.config.stacking_method
+        self.crop_bounds = None
+        self.pipeline_stats = None
+        self.output_path = None
+        self.apply_gpu_settings()
+        self.Algorithm.reset_cancel()
+        self.Algorithm.reset_alignment()
+        self.rejected_frames = []
+
+        # Exposure fusion holds a batch of frames, so each needs its own buffer
+        frames = self._streamed_frames(frames, align, native=method in ("laplacian", "exposure_fusion"),
+                                       reuse_buffer=method != "exposure_fusion")
+        if method == "weighted_average":
+            self._weighted_avg_core(frames, None, signals, progress_callback)
+        elif method == "depth_map":
+            self._depthmap_core(frames, None, signals, progress_callback)
+        elif method == "exposure_fusion":
+            self._exposure_core(((i, img) for i, img, _ in frames), None, signals, progress_callback)
+        else:
+            self._stack_laplacian_stream(frames, signals, progress_callback)
+        if align and self.config.auto_crop:
+            self.auto_crop_output()
+
+    def _streamed_frames(self, frames, align, native=False, reuse_buffer=True):
+        """
+        Yield (index, image, gray) per accepted frame of a stream, like
+        _aligned_frames. Unaligned frames are float32 unless native. With
+        reuse_buffer, aligned frames are warped into the same buffer, so
+        the consumer must be done with a frame before requesting the next.
+        """
+        loader = self.Algorithm.ImageLoadingHandler
+        dtype_scale = loader.dtype_scale
+        frames = (loader.native_bgr(img) for img in frames)
+        first = next(frames, None)
+        if first is None:
+            raise ValueError("The input stream contains no frames")
+        ref_image = first if native and not align else CPU.to_float32(first, dtype_scale(first.dtype))
+        del first
+        yield 0, ref_image, None
+        buffer = gray_buffer = None
+        for i, img in enumerate(frames, 1):
+            if not align:
+                yield i, img if native else CPU.to_float32(img, dtype_scale(img.dtype)), None
+                continue
+            result = self._load_and_align(ref_image, img, out=buffer, index=i, label=f"stream:{i}",
+                                          gray_out=gray_buffer)
+            del img
+            if result is None:
+                continue
+            if reuse_buffer:
+                buffer, gray_buffer = result.image, result.gray
+            yield i, result.image, result.gray
+
+    def _stack_laplacian_stream(self, frames, signals=None, progress_callback=None):
+        fused_pyr = None
+        fused_gray = []  # Focus state of fused_pyr, carried across frames
+        for i, img, _ in frames:
+            self.Algorithm.wait_if_paused()
+            if self.Algorithm.is_cancelled:
+                return
+            start_time = time.time()
+            pyr = self.Algorithm.generate_laplacian_pyramid(img, self.pyramid_num_levels)
+            del img
+            if fused_pyr is None:
+                fused_pyr = pyr
+                if self.pyramid_num_levels == 0:
+                    # A 0-level pyramid is the reference itself; it is fused
+                    # in place while later frames still align against it
+                    fused_pyr = [level.copy() for level in fused_pyr]
+            else:
+                fused_pyr = self.Algorithm.fuse_pyramid_into(
+                    fused_pyr, pyr, self.fusion_kernel_size,
+                    self.config.contrast_threshold, self.config.feather_radius,
+                    fused_gray=fused_gray,
+                )
+            del pyr
+            self._emit_progress(signals, progress_callback, i + 1, None, time.time() - start_time)
+
+        if self.Algorithm.is_cancelled:
+            return
+        self._finish_laplacian(fused_pyr)
+
+    # ─── Output ───
+
+    def stream_output_to(self, path, bit_depth=8, compression=4, **writer_options):
+        """
+        Make Laplacian runs write their result straight to path
+        instead of setting output_image: the pyramid is reconstructed,
+        tone-mapped, cropped (auto_crop) and quantized strip by strip, so
+        the full float32 image never exists. Only PNG and TIFF can be
+        streamed; for other formats this returns False and output_image is
+        used as usual. path=None switches streaming off. writer_options
+        go to ImageSavingHandler.open_strip_writer (workers, TIFF codec,
+        tile_size, bigtiff). While streaming, use_gpu runs take the CPU
+        pipeline rather than the CuPy one.
+        """
+        if path is None:
+            self._stream_target = None
+            return True
+        if not ImageSavingHandler.supports_strips(path) or bit_depth not in (8, 16):
+            return False
+        self._stream_target = (path, bit_depth, compression, writer_options)
+        return True
+
+    def _finish_laplacian(self, fused_pyr):
+        """Reconstruct + tone map into output_image, or stream to the target file."""
+        if self._stream_target is None:
+            self.output_image = self.Algorithm.reconstruct_pyramid(fused_pyr)
+            base = self._tone_map_base(fused_pyr)
+            if base is not None:
+                if self.output_image.dtype != np.float32:
+                    self.output_image = self.output_image.astype(np.float32)
+                CPU.apply_tone_map(self.output_image, base, self.config.tone_map_strength)
+            return
+        self._write_streamed(fused_pyr)
+
+    def _tone_map_base(self, fused_pyr, to_host=None):
+        """
+        Tone-map base of fused_pyr's output (the same on every path), or
+        None with tone mapping off. to_host copies device (CuPy) levels to
+        NumPy; only the coarse levels the base needs are copied.
+        """
+        if self.config.tone_map_strength <= 0:
+            return None
+        planar = self.Algorithm.planar_pyramids
+        if to_host is not None:
+            fused_pyr = [to_host(level) for level in
+                         fused_pyr[:CPU.tone_map_levels(fused_pyr, planar)]]
+        return CPU.tone_map_base_from_pyramid(fused_pyr, planar)
+
+    def _write_streamed(self, fused_pyr):
+        path, bit_depth, compression, writer_options = self._stream_target
+        recon = CPU.StripReconstruction(fused_pyr, planar=self.Algorithm.planar_pyramids)
+        h, w = recon.height, recon.width
+        top = bottom = left = right = 0
+        bounds = self.get_crop_bounds() if self.config.auto_crop else None
+        if bounds is not None and bounds[0] + bounds[1] < h and bounds[2] + bounds[3] < w:
+            top, bottom, left, right = bounds
+            self.crop_bounds = bounds
+        strength = self.config.tone_map_strength
+        base = self._tone_map_base(fused_pyr)
+
+        t0 = time.time()
+        self.output_image = None
+        with ImageSavingHandler.open_strip_writer(
+            path, w - left - right, h - top - bottom, recon.channels, bit_depth, compression,
+            **writer_options,
+        ) as writer:
+            for y0 in range(top, h - bottom, CPU.TONE_MAP_STRIP_ROWS):
+                y1 = min(h - bottom, y0 + CPU.TONE_MAP_STRIP_ROWS)
+                rows = recon.rows(y0, y1)
+                if base is not None:
+                    CPU.apply_tone_map(rows, base, strength, y0, (h, w))
+                rows = rows[:, left:w - right]
+                writer.write_rows(ImageSavingHandler.convert_to_bit_depth(rows, bit_depth, rows))
+        self.output_path = path
+        logger.info(f"Streamed {w - left - right}x{h - top - bottom} result to {path} "
+                    f"in {time.time() - t0:.2f}s")
+
+    # ─── Pipeline ───
+
+    def _frame_pipeline(self, job, shape):
+        """Bounded pipeline of job(index) for frames 1.. (see algorithms.pipeline)."""
+        itemsize = 2 if self.config.pyramid_dtype == "int16" else 4
+        return pipeline.FramePipeline(
+            job, len(self.image_paths), pipeline.frame_nbytes(shape, itemsize),
+            workers=self.config.pipeline_workers,
+            memory_budget=self.config.pipeline_memory_mb * 1024**2,
+        )
+
+    def _report_pipeline(self, frame_pipeline):
+        stats = frame_pipeline.stats
+        self.pipeline_stats = stats
+        logger.info(
+            f"Pipeline: {stats.frames} frames, {stats.workers} workers "
+            f"(peak window {stats.peak_in_flight}), build {stats.build_time:.2f}s, "
+            f"fuse {stats.fuse_time:.2f}s, stalled {stats.stall_time:.2f}s"
+        )
+
     # ─── Progress ───
 
     def _emit_progress(self, signals, progress_callback, current, total, time_taken):
+        if total is None:
+            total = current  # Streamed input: only the frames received so far are known
         if signals is not None:
             signals.finished_inter_task.emit(
                 ["finished_image", current, total, time_taken]
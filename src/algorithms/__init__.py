@@ -4,8 +4,10 @@
     Pipeline operates in float32 to preserve full bit depth.
 """
 import math
+import logging
 import threading
 import os
+from dataclasses import dataclass
 import cv2
 import numpy as np
 
@@ -29,18 +31,89 @@ try:
 except Exception:
     HAS_GPU = False
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AlignmentResult:
+    """Outcome of aligning one frame to the reference."""
+    image: np.ndarray  # aligned float32 BGR
+    gray: np.ndarray  # grayscale of image, emitted by the warp
+    shift: tuple  # (x, y) displacement, used for auto-crop
+    confidence: float  # correlation of the aligned frame with the reference (any method)
+    method: str  # "translation" or "rst"
+    matrix: np.ndarray = None  # 2x3 inverse map (output -> source) the warp applied
+
+    def transform(self):
+        return FrameTransform(self.shift, self.matrix, self.confidence, self.method)
+
+
+@dataclass
+class FrameTransform:
+    """What is kept of an accepted frame's alignment once its pixels are fused."""
+    shift: tuple
+    matrix: np.ndarray
+    confidence: float
+    method: str
+
 
 class Algorithm:
+    SKIP_CELL = 32  # Hierarchical fusion: block size (px) skipped or evaluated as a whole
+    CONFIDENCE_SIZE = 512  # Long side (px) at which alignment confidence is measured
+    SKIP_VARIANCE_RATIO = 4.0  # Hierarchical fusion: skip where fused variance > this x the new frame's
+
     def __init__(self):
         self.ImageLoadingHandler = ImageLoadingHandler.ImageLoadingHandler()
         self.DFT_Imreg = dft_imreg.im_reg()
         self.DFT_Imreg.last_shift = (0.0, 0.0)
         self.useGpu = False
+        self.planar_pyramids = False  # (C, H, W) pyramid levels instead of (H, W, C)
+        self.quantized_pyramids = False  # int16 fixed-point pyramid levels (half the memory)
+        self.int16_overflow = False  # A frame exceeded the int16 range: later levels stay float32
+        self.hierarchical_fusion = False  # Skip fine-level blocks where the fused pyramid is clearly sharper
+        self.skipped_fraction = 0.0  # Share of focusmap pixels skipped by the last hierarchical fuse
         self._cancel_event = threading.Event()
         self._pause_event = threading.Event()
         self._pause_event.set()  # Start unpaused (set = running)
-        self.alignment_shifts = []  # Track all (x, y) shifts for auto-crop
-        self._ref_gray_cache = (None, None)  # (id(ref_im), gray) cache
+        # Alignment workers run concurrently: every call returns its own
+        # AlignmentResult, and accepted frames are recorded by frame index
+        self.frame_transforms = {}  # frame index -> FrameTransform
+        self.alignment_frame_shape = None  # (h, w) of the aligned frames
+        self._record_lock = threading.Lock()
+        self._ref_luma_cache = (None, None)  # (ref_im, LumaPyramid)
+        self._ref_luma_lock = threading.Lock()
+
+    def reset_alignment(self):
+        """Forget the transforms recorded by a previous stack."""
+        with self._record_lock:
+            self.frame_transforms = {}
+            self.alignment_frame_shape = None
+        with self._ref_luma_lock:
+            self._ref_luma_cache = (None, None)
+
+    def record_alignment(self, result, index=None):
+        """Keep an accepted frame's transform for auto-crop.
+        Without an index the frame is numbered after the last recorded one."""
+        with self._record_lock:
+            if index is None:
+                index = max(self.frame_transforms, default=0) + 1
+            self.frame_transforms[index] = result.transform()
+            self.alignment_frame_shape = result.image.shape[:2]
+
+    def alignment_records(self):
+        """Snapshot of the recorded (index, FrameTransform) pairs, in frame order."""
+        with self._record_lock:
+            return sorted(self.frame_transforms.items(), key=lambda item: item[0])
+
+    @property
+    def alignment_shifts(self):
+        """(x, y) shifts of the recorded frames, in frame order."""
+        return [t.shift for _, t in self.alignment_records()]
+
+    @property
+    def alignment_matrices(self):
+        """Inverse warp matrices of the recorded frames, in frame order."""
+        return [t.matrix for _, t in self.alignment_records() if t.matrix is not None]
 
     def cancel(self):
         self._cancel_event.set()
@@ -81,6 +154,10 @@ class Algorithm:
         """Load image from path as float32 (preserving full bit depth)."""
         return self.ImageLoadingHandler.read_image_as_float32(path)
 
+    def load_image_native(self, path):
+        """Load image from path in its decoded dtype (uint8/uint16/float32)."""
+        return self.ImageLoadingHandler.read_image_native(path)
+
     @staticmethod
     def _match_dimensions(ref_im, im_to_align):
         """Resize im_to_align to match ref_im dimensions if they differ.
@@ -100,7 +177,7 @@ class Algorithm:
             return cv2.resize(im_to_align, (rw, rh), interpolation=cv2.INTER_AREA)
 
         # Center-crop if larger, zero-pad if smaller
-        result = np.zeros_like(ref_im)
+        result = np.zeros(ref_im.shape[:2] + im_to_align.shape[2:], dtype=im_to_align.dtype)
         # Source region (from im_to_align)
         sy = max(0, (ah - rh) // 2)
         sx = max(0, (aw - rw) // 2)
@@ -114,10 +191,16 @@ class Algorithm:
         return result
 
     def align_image_pair(self, ref_im, im_to_align, scale_factor=10,
-                         coarse_fine=False, use_rst=False):
+                         coarse_fine=False, use_rst=False, out=None,
+                         return_gray=False, gray_out=None):
         """
         Align im_to_align to ref_im.
-        Returns float32 aligned image.
+        Returns float32 aligned image, or (aligned, gray) if return_gray.
+
+        Paths are decoded in their native dtype and promoted to float32 by
+        the warp itself, which also emits the grayscale plane for focus
+        measures. Pass float32 buffers as out (and gray_out) to reuse them
+        across frames.
 
         Handles mixed image dimensions by resizing to match reference.
         If use_rst=True, uses rotation+scale+translation alignment.
@@ -125,76 +208,121 @@ class Algorithm:
         """
         # Handle path loading
         if isinstance(ref_im, str) and isinstance(im_to_align, str) and ref_im == im_to_align:
-            return self.load_image(im_to_align)
+            result = self.load_image(im_to_align)
+            if return_gray:
+                return result, cv2.cvtColor(result, cv2.COLOR_BGR2GRAY)
+            return result
+        result = self.align_frame(
+            ref_im, im_to_align, scale_factor, coarse_fine, use_rst, out, gray_out,
+        )
+        self.record_alignment(result)
+        if return_gray:
+            return result.image, result.gray
+        return result.image
+
+    def align_frame(self, ref_im, im_to_align, scale_factor=10,
+                    coarse_fine=False, use_rst=False, out=None, gray_out=None):
+        """
+        Align im_to_align to ref_im and return an AlignmentResult, which
+        carries the aligned image together with its confidence score.
+        Unlike align_image_pair, nothing is recorded for auto-crop.
+        """
         if isinstance(ref_im, str):
             ref_im = self.load_image(ref_im)
         if isinstance(im_to_align, str):
-            im_to_align = self.load_image(im_to_align)
+            im_to_align = self.load_image_native(im_to_align)
 
         # Handle different image dimensions (#29)
         if ref_im is not None and im_to_align is not None:
             im_to_align = self._match_dimensions(ref_im, im_to_align)
 
+        # One luminance pyramid per frame serves every estimation scale
+        luma = ImageLoadingHandler.LumaPyramid.from_image(im_to_align)
         if use_rst:
-            result = self._align_rst(ref_im, im_to_align, scale_factor)
-        else:
-            result = self._align_translation(ref_im, im_to_align, scale_factor, coarse_fine)
-
-        return result
-
-    def _get_ref_gray(self, ref_im):
-        """Get cached grayscale of reference image (avoids redundant cvtColor)."""
-        ref_id = id(ref_im)
-        if self._ref_gray_cache[0] != ref_id:
-            if ref_im.ndim == 3:
-                gray = cv2.cvtColor(ref_im, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = ref_im
-            self._ref_gray_cache = (ref_id, gray)
-        return self._ref_gray_cache[1]
+            return self._align_rst(ref_im, im_to_align, scale_factor, out, luma, gray_out)
+        return self._align_translation(ref_im, im_to_align, scale_factor, coarse_fine, out, luma,
+                                       gray_out)
 
-    def _align_translation(self, ref_im, im_to_align, scale_factor, coarse_fine):
+    @staticmethod
+    def _warp(im_to_align, inverse_matrix, out, gray_out=None):
+        """Warp + float32 promotion + gray in one pass (see CPU.warp_to_float32)."""
+        scale = ImageLoadingHandler.ImageLoadingHandler.dtype_scale(im_to_align.dtype)
+        return CPU.warp_to_float32(im_to_align, inverse_matrix, scale=scale, out=out,
+                                   gray_out=gray_out)
+
+    @classmethod
+    def _match_confidence(cls, ref_luma, luma, inverse_matrix):
+        """
+        Alignment confidence on one scale for every method: the zero-mean
+        normalized cross-correlation of the reference and the frame warped
+        by inverse_matrix, at CONFIDENCE_SIZE, over the pixels the warp
+        covers. The method's own score (phase-correlation peak, ECC
+        coefficient) is not comparable across methods.
+        """
+        h, w = ref_luma.shape
+        s = min(1.0, cls.CONFIDENCE_SIZE / max(h, w))
+        ref = ref_luma.at_scale(s).astype(np.float32, copy=False)
+        moving = luma.at_scale(s).astype(np.float32, copy=False)
+        matrix = np.array(inverse_matrix, dtype=np.float64)
+        matrix[:, 2] *= s  # Uniform scaling keeps the linear part
+        size = (ref.shape[1], ref.shape[0])
+        flags = cv2.INTER_LINEAR + cv2.WARP_INVERSE_MAP
+        warped = cv2.warpAffine(moving, matrix, size, flags=flags)
+        valid = cv2.warpAffine(np.ones_like(moving), matrix, size, flags=flags) > 0.999
+        if valid.sum() < 16:
+            return 0.0
+        a = ref[valid] - ref[valid].mean()
+        b = warped[valid] - warped[valid].mean()
+        denom = np.sqrt(float(np.dot(a, a)) * float(np.dot(b, b)))
+        return float(np.dot(a, b) / denom) if denom > 0 else 0.0
+
+    def _get_ref_luma(self, ref_im):
+        """Get the cached luminance pyramid of the reference image.
+        Keyed by identity (not id(), which can be reused once freed)."""
+        with self._ref_luma_lock:
+            cached_ref, luma = self._ref_luma_cache
+            if cached_ref is not ref_im:
+                luma = ImageLoadingHandler.LumaPyramid.from_image(ref_im)
+                self._ref_luma_cache = (ref_im, luma)
+            return luma
+
+    def _align_translation(self, ref_im, im_to_align, scale_factor, coarse_fine, out=None,
+                           luma=None, gray_out=None):
         """Translation-only alignment using DFT phase correlation."""
-        ref_gray = self._get_ref_gray(ref_im)
+        ref_luma = self._get_ref_luma(ref_im)
+        if luma is None:
+            luma = ImageLoadingHandler.LumaPyramid.from_image(im_to_align)
 
         if coarse_fine and min(ref_im.shape[:2]) > 1000:
-            small_ref = cv2.resize(ref_im, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA)
-            small_align = cv2.resize(im_to_align, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA)
-            self.DFT_Imreg.register_image_translation(
-                small_ref, small_align, scale_factor=max(1, scale_factor // 2)
+            # Quarter resolution is pyramid level 2 of both frames
+            self.DFT_Imreg.estimate_translation(
+                ref_luma.level(2), luma.level(2), scale_factor=max(1, scale_factor // 2)
             )
-            del small_ref, small_align
 
-        result = self.DFT_Imreg.register_image_translation(
-            ref_im, im_to_align, scale_factor=scale_factor,
-            ref_gray=ref_gray,
+        x_shift, y_shift, _ = self.DFT_Imreg.estimate_translation(
+            ref_luma.full, luma.full, scale_factor=scale_factor,
         )
-        self.alignment_shifts.append(self.DFT_Imreg.last_shift)
-        return result
 
-    def _align_rst(self, ref_im, im_to_align, scale_factor):
+        # Output pixel (x, y) samples the source at (x - dx, y - dy)
+        inverse_matrix = np.float64([[1, 0, -x_shift], [0, 1, -y_shift]])
+        image, gray = self._warp(im_to_align, inverse_matrix, out, gray_out)
+        confidence = self._match_confidence(ref_luma, luma, inverse_matrix)
+        return AlignmentResult(image, gray, (x_shift, y_shift), confidence,
+                               "translation", inverse_matrix)
+
+    def _align_rst(self, ref_im, im_to_align, scale_factor, out=None, luma=None, gray_out=None):
         """
         Rotation + Scale + Translation alignment using multi-scale ECC.
         Uses MOTION_EUCLIDEAN (translation + rotation, 3 DOF) which is
         the right model for focus stacking — no shear, no anisotropic scale.
         Focus breathing (uniform scale) is handled by ORB feature matching fallback.
         """
-        # Convert to grayscale (reuse cached ref grayscale when available)
-        ref_gray = self._get_ref_gray(ref_im)
-        if im_to_align.ndim == 3:
-            align_gray = cv2.cvtColor(im_to_align, cv2.COLOR_BGR2GRAY)
-        else:
-            align_gray = im_to_align
-
-        # Ensure uint8
-        if ref_gray.dtype != np.uint8:
-            ref_u8 = np.clip(ref_gray, 0, 255).astype(np.uint8)
-            align_u8 = np.clip(align_gray, 0, 255).astype(np.uint8)
-        else:
-            ref_u8 = ref_gray
-            align_u8 = align_gray
+        # Every ECC scale is read off the frames' luminance pyramids
+        ref_luma = self._get_ref_luma(ref_im)
+        if luma is None:
+            luma = ImageLoadingHandler.LumaPyramid.from_image(im_to_align)
 
-        h_full, w_full = ref_u8.shape[:2]
+        h_full, w_full = ref_luma.shape
 
         # Multi-scale ECC: coarse → fine
         # Level 0: 1/4 res (coarse alignment)
@@ -210,12 +338,9 @@ class Algorithm:
 
         try:
             for i, s in enumerate(scales):
-                if s < 1.0:
-                    ref_s = cv2.resize(ref_u8, None, fx=s, fy=s, interpolation=cv2.INTER_AREA)
-                    align_s = cv2.resize(align_u8, None, fx=s, fy=s, interpolation=cv2.INTER_AREA)
-                else:
-                    ref_s = ref_u8
-                    align_s = align_u8
+                # ECC runs on uint8
+                ref_s = np.clip(ref_luma.at_scale(s), 0, 255).astype(np.uint8)
+                align_s = np.clip(luma.at_scale(s), 0, 255).astype(np.uint8)
 
                 # Scale warp matrix translation from previous level
                 if i > 0:
@@ -245,15 +370,12 @@ class Algorithm:
 
         except cv2.error:
             # ECC failed — fall back to translation-only DFT
-            return self._align_translation(ref_im, im_to_align, scale_factor)
+            return self._align_translation(ref_im, im_to_align, scale_factor, False, out, luma,
+                                           gray_out)
 
         # Apply the warp to the full-resolution color image
-        h, w = im_to_align.shape[:2]
-        result = cv2.warpAffine(
-            im_to_align, warp_matrix, (w, h),
-            flags=cv2.INTER_LINEAR + cv2.WARP_INVERSE_MAP,
-            borderMode=cv2.BORDER_CONSTANT, borderValue=0
-        )
+        # (ECC's warp_matrix is already in WARP_INVERSE_MAP form)
+        image, gray = self._warp(im_to_align, warp_matrix, out, gray_out)
 
         # Track shifts for auto-crop.
         # For RST we compute the max displacement at any corner of the image,
@@ -274,75 +396,324 @@ class Algorithm:
             max_dx = max(max_dx, abs(tx))
             max_dy = max(max_dy, abs(ty))
 
-        self.alignment_shifts.append((max_dx, max_dy))
-
-        # warpAffine on float32 input already returns float32
-        return result
+        warp_matrix = warp_matrix.astype(np.float64)
+        confidence = self._match_confidence(ref_luma, luma, warp_matrix)
+        return AlignmentResult(image, gray, (max_dx, max_dy), confidence, "rst", warp_matrix)
 
     def generate_laplacian_pyramid(self, im1, num_levels):
+        """
+        Pyramid of im1 (a path, or a float32 / native uint8 / uint16 frame).
+        Native frames are promoted to float32 inside the pyramid build.
+        """
         if isinstance(im1, str):
-            im1 = self.load_image(im1)
-        if self.useGpu and HAS_GPU:
-            return GPU.generate_laplacian_pyramid(im1, num_levels)
-        return CPU.generate_laplacian_pyramid(im1, num_levels)
+            im1 = self.load_image_native(im1)
+        scale = ImageLoadingHandler.ImageLoadingHandler.dtype_scale(im1.dtype)
+        if self.planar_pyramids:
+            laplacian_pyr = CPU.generate_laplacian_pyramid_planar(im1, num_levels, scale)
+        elif self.useGpu and HAS_GPU:
+            laplacian_pyr = GPU.generate_laplacian_pyramid(im1, num_levels, scale)
+        else:
+            laplacian_pyr = CPU.generate_laplacian_pyramid(im1, num_levels, scale)
+        if self.quantized_pyramids and not self.int16_overflow:
+            if CPU.fits_int16(im1, scale):
+                return CPU.quantize_pyramid(laplacian_pyr)
+            self.int16_overflow = True
+            logger.warning("Frame values exceed the int16 pyramid range (HDR input?); "
+                           "storing pyramid levels as float32")
+        return laplacian_pyr
 
     def reconstruct_pyramid(self, laplacian_pyr):
+        if laplacian_pyr[0].dtype == np.int16:
+            laplacian_pyr = CPU.dequantize_pyramid(laplacian_pyr)
+        if self.planar_pyramids:
+            return CPU.reconstruct_pyramid_planar(laplacian_pyr)
         if self.useGpu and HAS_GPU:
             return GPU.reconstruct_pyramid(laplacian_pyr)
         return CPU.reconstruct_pyramid(laplacian_pyr)
 
+    def _use_gpu_fuse(self, contrast_threshold, feather_radius):
+        # GPU path doesn't support contrast_threshold/feather_radius or
+        # planar/int16 levels — fall back to CPU for consistent results
+        return (self.useGpu and HAS_GPU and not self.planar_pyramids
+                and not self.quantized_pyramids
+                and contrast_threshold <= 0 and feather_radius <= 0)
+
     def focus_fuse_pyramid_pair(self, pyr1, pyr2, kernel_size,
-                               contrast_threshold=0.0, feather_radius=0):
-        # GPU path doesn't support contrast_threshold/feather_radius —
-        # fall back to CPU when those are enabled for consistent results
-        if self.useGpu and HAS_GPU and contrast_threshold <= 0 and feather_radius <= 0:
+                               contrast_threshold=0.0, feather_radius=0, roi=None):
+        """
+        Fuse two Laplacian pyramids, keeping the sharper coefficients.
+        roi is an optional (x0, y0, x1, y1) full-resolution rectangle: only
+        coefficients that can reach it are fused, everything else is taken
+        from pyr1 unchanged (used when the output will be cropped anyway).
+        """
+        if self._use_gpu_fuse(contrast_threshold, feather_radius):
             return self._fuse_gpu(pyr1, pyr2, kernel_size)
-        return self._fuse_cpu(pyr1, pyr2, kernel_size, contrast_threshold, feather_radius)
+        return self._fuse_cpu(pyr1, pyr2, kernel_size, contrast_threshold, feather_radius, roi)
+
+    def fuse_pyramid_into(self, fused_pyr, new_pyr, kernel_size,
+                          contrast_threshold=0.0, feather_radius=0, roi=None,
+                          fused_gray=None):
+        """
+        In-place variant of focus_fuse_pyramid_pair: the levels of
+        fused_pyr are overwritten where new_pyr wins (or blended into, with
+        feathering), so no new pyramid is allocated per frame. fused_pyr
+        must own its levels. Returns fused_pyr.
+
+        fused_gray is an optional list that carries the gray planes of
+        fused_pyr from one call to the next. Pass an empty list with the
+        first frame; it is filled, then updated with the same focusmap as
+        the levels, so the fused pyramid's gray is never rebuilt.
+        """
+        if self._use_gpu_fuse(contrast_threshold, feather_radius):
+            fused_pyr[:] = self._fuse_gpu(fused_pyr, new_pyr, kernel_size)
+            if fused_gray is not None:
+                fused_gray.clear()  # Stale: rebuilt on the next CPU fuse
+            return fused_pyr
+        return self._fuse_cpu(fused_pyr, new_pyr, kernel_size, contrast_threshold,
+                              feather_radius, roi, inplace=True, fused_gray=fused_gray)
 
-    def _fuse_cpu(self, pyr1, pyr2, kernel_size, contrast_threshold=0.0, feather_radius=0):
-        threshold_index = len(pyr1) - 1
+    @staticmethod
+    def _level_window(level_shape, full_shape, roi, margin):
+        """(y0, y1, x0, x1) of roi scaled to one pyramid level, grown by margin."""
+        h, w = level_shape[:2]
+        sy = h / full_shape[0]
+        sx = w / full_shape[1]
+        x0, y0, x1, y1 = roi
+        return (max(0, int(y0 * sy) - margin), min(h, math.ceil(y1 * sy) + margin),
+                max(0, int(x0 * sx) - margin), min(w, math.ceil(x1 * sx) + margin))
+
+    @staticmethod
+    def _upsample_focusmap_window(focusmap, prev_window, prev_shape, window, shape):
+        """Nearest-neighbour resample of a windowed focusmap onto the next level's window."""
+        py0, _, px0, _ = prev_window
+        y0, y1, x0, x1 = window
+        ys = np.clip(np.arange(y0, y1) * prev_shape[0] // shape[0] - py0,
+                     0, focusmap.shape[0] - 1)
+        xs = np.clip(np.arange(x0, x1) * prev_shape[1] // shape[1] - px0,
+                     0, focusmap.shape[1] - 1)
+        return focusmap[np.ix_(ys, xs)]
+
+    def _level_hw(self, level):
+        return level.shape[1:] if self.planar_pyramids else level.shape[:2]
+
+    def _level_gray(self, level):
+        if level.dtype == np.int16:
+            return CPU.quantized_level_gray(level, planar=self.planar_pyramids)
+        if self.planar_pyramids:
+            return CPU.planar_to_gray(level)
+        return cv2.cvtColor(level, cv2.COLOR_BGR2GRAY)
+
+    def _window(self, level, window):
+        if window is None:
+            return level
+        y0, y1, x0, x1 = window
+        if self.planar_pyramids:
+            return level[:, y0:y1, x0:x1]
+        return level[y0:y1, x0:x1]
+
+    def _fuse_cpu(self, pyr1, pyr2, kernel_size, contrast_threshold=0.0, feather_radius=0,
+                  roi=None, inplace=False, fused_gray=None):
+        if pyr1[0].dtype != pyr2[0].dtype:
+            # int16 storage was given up mid-stack (see generate_laplacian_pyramid)
+            if pyr1[0].dtype == np.int16:
+                dequantized = CPU.dequantize_pyramid(pyr1)
+                if inplace:
+                    pyr1[:] = dequantized
+                else:
+                    pyr1 = dequantized
+            else:
+                pyr2 = CPU.dequantize_pyramid(pyr2)
+        # The finest level reuses the focusmap of the one above; a 0-level
+        # pyramid has none, so its single level gets its own
+        threshold_index = max(1, len(pyr1) - 1)
         new_pyr = []
         current_focusmap = None
         use_soft = feather_radius > 0
+        planar = self.planar_pyramids
+        full_shape = self._level_hw(pyr1[-1])
+        # Coefficients this far outside roi still feed the variance window,
+        # the feathering blur and pyrUp during reconstruction
+        margin = kernel_size + 2 * feather_radius + 4
+        window = None
+        total_pixels = skipped_pixels = 0
+        contested = None  # Hierarchical: where the new frame was not clearly less sharp, one level coarser
 
         for pyramid_level in range(len(pyr1)):
+            level1 = pyr1[pyramid_level]
+            level2 = pyr2[pyramid_level]
+            level_hw = self._level_hw(level1)
+            prev_window = window
+            if roi is not None:
+                window = self._level_window(level_hw, full_shape, roi, margin)
+                y0, y1, x0, x1 = window
+                level1 = self._window(level1, window)
+                level2 = self._window(level2, window)
+
+            gray1 = None
             if pyramid_level < threshold_index:
-                if contrast_threshold > 0:
-                    # Thresholded focusmap needs the Numba path
-                    gray1 = cv2.cvtColor(pyr1[pyramid_level], cv2.COLOR_BGR2GRAY)
-                    gray2 = cv2.cvtColor(pyr2[pyramid_level], cv2.COLOR_BGR2GRAY)
-                    current_focusmap = CPU.compute_focusmap_thresholded(
-                        gray1, gray2, kernel_size, np.float32(contrast_threshold),
-                    )
-                elif HAS_GPU:
-                    # Use fast vectorized focusmap (cv2.blur variance, O(1)/pixel)
-                    current_focusmap = GPU.compute_focusmap_fast(
-                        pyr1[pyramid_level], pyr2[pyramid_level], kernel_size,
+                if fused_gray is not None:
+                    if len(fused_gray) <= pyramid_level:
+                        fused_gray.append(self._level_gray(pyr1[pyramid_level]))
+                    gray1 = fused_gray[pyramid_level]
+                    if window is not None:
+                        gray1 = gray1[y0:y1, x0:x1]
+                active = None
+                if contested is not None:
+                    prev_hw = self._level_hw(pyr1[pyramid_level - 1])
+                    if roi is not None:
+                        coarse = self._upsample_focusmap_window(
+                            contested, prev_window, prev_hw, window, level_hw)
+                    else:
+                        coarse = cv2.resize(contested, (level_hw[1], level_hw[0]),
+                                            interpolation=cv2.INTER_NEAREST)
+                    active = self._active_cells(coarse)
+                    total_pixels += coarse.size
+                if active is not None and not active.all():
+                    current_focusmap, gray1, gray2, computed = self._sparse_focusmap(
+                        level1, level2, gray1, active, kernel_size, contrast_threshold,
+                        kernel_size + feather_radius + 2,
                     )
+                    skipped_pixels += coarse.size - computed
                 else:
-                    gray1 = cv2.cvtColor(pyr1[pyramid_level], cv2.COLOR_BGR2GRAY)
-                    gray2 = cv2.cvtColor(pyr2[pyramid_level], cv2.COLOR_BGR2GRAY)
-                    current_focusmap = CPU.compute_focusmap(
-                        gray1, gray2, kernel_size,
-                    )
+                    if gray1 is None:
+                        gray1 = self._level_gray(level1)
+                    gray2 = self._level_gray(level2)
+                    current_focusmap = self._focusmap(gray1, gray2, kernel_size, contrast_threshold)
+                if self.hierarchical_fusion and pyramid_level > 0:
+                    # The low-pass top level says nothing about detail: gating starts below it
+                    contested = self._contested(gray1, gray2, kernel_size, active)
+            elif roi is not None:
+                current_focusmap = self._upsample_focusmap_window(
+                    current_focusmap, prev_window, self._level_hw(pyr1[pyramid_level - 1]),
+                    window, level_hw,
+                )
             else:
-                s = pyr2[pyramid_level].shape
                 current_focusmap = cv2.resize(
-                    current_focusmap, (s[1], s[0]), interpolation=cv2.INTER_AREA
+                    current_focusmap, (level_hw[1], level_hw[0]), interpolation=cv2.INTER_AREA
                 )
 
-            if use_soft:
-                soft_map = CPU.feather_focusmap(current_focusmap, feather_radius)
-                new_pyr_level = CPU.fuse_pyramid_levels_soft(
-                    pyr1[pyramid_level], pyr2[pyramid_level], soft_map,
-                )
+            if inplace:
+                # level1 is pyr1's own level (or a window view of it)
+                carry = fused_gray is not None and gray1 is not None
+                self._fuse_level_into(level1, level2, current_focusmap, feather_radius,
+                                      gray1 if carry else None, gray2 if carry else None)
+                new_pyr.append(pyr1[pyramid_level])
+                continue
+
+            if use_soft or planar or level1.dtype == np.int16:
+                new_pyr_level = level1.copy()
+                self._fuse_level_into(new_pyr_level, level2, current_focusmap, feather_radius)
             else:
                 new_pyr_level = CPU.fuse_pyramid_levels_using_focusmap(
-                    pyr1[pyramid_level], pyr2[pyramid_level], current_focusmap,
+                    level1, level2, current_focusmap,
                 )
+            if roi is not None and new_pyr_level.shape != pyr1[pyramid_level].shape:
+                fused_window = new_pyr_level
+                new_pyr_level = pyr1[pyramid_level].copy()
+                if planar:
+                    new_pyr_level[:, y0:y1, x0:x1] = fused_window
+                else:
+                    new_pyr_level[y0:y1, x0:x1] = fused_window
             new_pyr.append(new_pyr_level)
+        if total_pixels:
+            self.skipped_fraction = skipped_pixels / total_pixels
         return new_pyr
 
+    def _focusmap(self, gray1, gray2, kernel_size, contrast_threshold):
+        if contrast_threshold > 0:
+            # Thresholded focusmap needs the Numba path
+            return CPU.compute_focusmap_thresholded(
+                gray1, gray2, kernel_size, np.float32(contrast_threshold),
+            )
+        if HAS_GPU:
+            # Use fast vectorized focusmap (cv2.blur variance, O(1)/pixel)
+            return GPU.compute_focusmap_fast(gray1, gray2, kernel_size)
+        return CPU.compute_focusmap(gray1, gray2, kernel_size)
+
+    def _contested(self, gray1, gray2, kernel_size, active=None):
+        """
+        Pixels of a level where the new frame (gray2) is not clearly less
+        sharp than the fused one (gray1): its local variance is at least
+        1/SKIP_VARIANCE_RATIO of the fused variance. Cells left out of
+        active were already clearly lost and stay uncontested.
+        """
+        k = (kernel_size, kernel_size)
+        variances = []
+        for gray in (gray1, gray2):
+            mean = cv2.blur(gray, k)
+            variances.append(cv2.blur(gray * gray, k) - mean * mean)
+        contested = (variances[1] * np.float32(self.SKIP_VARIANCE_RATIO) >= variances[0]).astype(np.uint8)
+        if active is not None:
+            c = self.SKIP_CELL
+            h, w = contested.shape
+            contested &= np.repeat(np.repeat(active, c, axis=0), c, axis=1)[:h, :w]
+        return contested
+
+    def _active_cells(self, coarse_contested):
+        """
+        Cells (SKIP_CELL pixels square) of a level that are evaluated: the
+        new frame was contested (see _contested) somewhere in the cell or
+        a neighbouring one at the coarser level (resampled to this level).
+        Elsewhere the fused pyramid is clearly sharper and is kept.
+        """
+        c = self.SKIP_CELL
+        h, w = coarse_contested.shape
+        padded = np.zeros((-(-h // c) * c, -(-w // c) * c), dtype=np.uint8)
+        padded[:h, :w] = coarse_contested
+        cells = padded.reshape(padded.shape[0] // c, c, padded.shape[1] // c, c).max(axis=(1, 3))
+        return cv2.dilate(cells, np.ones((3, 3), np.uint8)) > 0
+
+    def _sparse_focusmap(self, level1, level2, gray1, active, kernel_size,
+                         contrast_threshold, margin):
+        """
+        Focusmap computed only in active cells (0 = keep fused elsewhere).
+        Each run of active cells along a row is evaluated with margin pixels
+        of context, so inside the run the result equals the full focusmap.
+        Returns (focusmap, gray1, gray2, pixels computed); the gray planes
+        are filled within margin of the runs and zero elsewhere.
+        """
+        c = self.SKIP_CELL
+        h, w = self._level_hw(level1)
+        focusmap = np.zeros((h, w), dtype=np.uint8)
+        gray2 = np.zeros((h, w), dtype=np.float32)
+        fill_gray1 = gray1 is None
+        if fill_gray1:
+            gray1 = np.zeros((h, w), dtype=np.float32)
+        computed = 0
+        for cy in range(active.shape[0]):
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], active[cy], [0])).astype(np.int8)))
+            for cx0, cx1 in zip(edges[::2], edges[1::2]):
+                y0, y1 = cy * c, min(h, (cy + 1) * c)
+                x0, x1 = cx0 * c, min(w, cx1 * c)
+                win = (max(0, y0 - margin), min(h, y1 + margin),
+                       max(0, x0 - margin), min(w, x1 + margin))
+                wy0, wy1, wx0, wx1 = win
+                g2 = gray2[wy0:wy1, wx0:wx1]
+                g2[:] = self._level_gray(self._window(level2, win))
+                g1 = gray1[wy0:wy1, wx0:wx1]
+                if fill_gray1:
+                    g1[:] = self._level_gray(self._window(level1, win))
+                fm = self._focusmap(g1, g2, kernel_size, contrast_threshold)
+                focusmap[y0:y1, x0:x1] = fm[y0 - wy0:y1 - wy0, x0 - wx0:x1 - wx0]
+                computed += (y1 - y0) * (x1 - x0)
+        return focusmap, gray1, gray2, computed
+
+    def _fuse_level_into(self, fused_level, new_level, focusmap, feather_radius,
+                         fused_gray=None, new_gray=None):
+        """Fuse one level in place; fused_gray (if given) follows the same focusmap."""
+        if feather_radius > 0:
+            CPU.feather_fuse_into(fused_level, new_level, focusmap, feather_radius,
+                                  planar=self.planar_pyramids,
+                                  fused_gray=fused_gray, new_gray=new_gray)
+            return
+        if fused_gray is not None:
+            # Gray planes are (1, H, W) planar levels
+            CPU.fuse_planar_levels_into(fused_gray[None], new_gray[None], focusmap)
+        if self.planar_pyramids:
+            CPU.fuse_planar_levels_into(fused_level, new_level, focusmap)
+        else:
+            CPU.fuse_pyramid_levels_into(fused_level, new_level, focusmap)
+
     def _fuse_gpu(self, pyr1, pyr2, kernel_size):
         """GPU fusion — batched pipeline that keeps data on-GPU.
         Batch-uploads all pyramid levels, runs all kernels without
@@ -0,0 +1,166 @@
+"""
+    Content-driven parameter tuning.
+    auto_detect_params (config.py) sizes parameters from megapixels alone.
+    This samples a few frames of the actual stack at low resolution and
+    measures what the fusion needs:
+      - noise: robust sigma of the finest Laplacian band (full resolution
+        crop of the first sample), which sets the contrast threshold and
+        kernel size;
+      - inter-frame shift: phase correlation between sampled frames, which
+        decides how fine the alignment needs to be;
+      - detail scale: per pyramid band, how much the sampled frames differ.
+        Bands coarser than the last one that differs by more than the
+        tolerance never change the output, so the pyramid can stop there.
+"""
+import math
+import logging
+
+import cv2
+import numpy as np
+
+from src.config import auto_detect_params
+from src.ImageLoadingHandler import ImageLoadingHandler, LumaPyramid
+import src.algorithms.stacking_algorithms.cpu as CPU
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_SIZE = 512  # Long side of the analysed luminance (px)
+NOISE_CROP = 512  # Side of the full-resolution crop used for the noise estimate
+LEVEL_TOLERANCE = 0.5  # RMS grey levels below which a band's fusion choice is invisible
+
+
+def sample_indices(num_images, sample_count=3):
+    """Evenly spread frame indices, always including the first and last."""
+    if num_images <= sample_count:
+        return list(range(num_images))
+    return sorted({round(i * (num_images - 1) / (sample_count - 1)) for i in range(sample_count)})
+
+
+def estimate_noise(gray):
+    """Noise sigma (grey levels) of the finest Laplacian band of a center crop (MAD)."""
+    h, w = gray.shape[:2]
+    y0 = max(0, (h - NOISE_CROP) // 2)
+    x0 = max(0, (w - NOISE_CROP) // 2)
+    crop = np.ascontiguousarray(gray[y0:y0 + NOISE_CROP, x0:x0 + NOISE_CROP])
+    band = CPU.generate_laplacian_pyramid(crop, 1)[-1]
+    return float(1.4826 * np.median(np.abs(band)))
+
+
+def measure_shift(gray1, gray2):
+    """(dx, dy) translation of gray2 relative to gray1 (phase correlation)."""
+    window = cv2.createHanningWindow(gray1.shape[::-1], cv2.CV_32F)
+    (dx, dy), _ = cv2.phaseCorrelate(gray1, gray2, window)
+    return dx, dy
+
+
+def band_differences(grays, shifts, num_levels):
+    """
+    RMS difference (grey levels) between sampled frames for every band of
+    their Laplacian pyramids, finest band first. Frames are shifted onto
+    the first sample; a border the size of the largest shift is ignored.
+    """
+    h, w = grays[0].shape
+    pyramids = []
+    for gray, (dx, dy) in zip(grays, shifts):
+        matrix = np.float32([[1, 0, dx], [0, 1, dy]])
+        aligned = cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                                 borderMode=cv2.BORDER_REPLICATE)
+        pyramids.append(CPU.generate_laplacian_pyramid(aligned, num_levels))
+    margin = int(math.ceil(max((max(abs(dx), abs(dy)) for dx, dy in shifts), default=0))) + 4
+
+    diffs = []
+    for band in range(num_levels, 0, -1):  # pyramids are coarse-to-fine
+        scale = 2 ** (num_levels - band)
+        m = max(1, margin // scale)
+        rms = 0.0
+        for i in range(len(pyramids)):
+            for j in range(i + 1, len(pyramids)):
+                d = (pyramids[i][band] - pyramids[j][band])[m:-m, m:-m]
+                if d.size:
+                    rms = max(rms, float(np.sqrt(np.mean(d * d))))
+        diffs.append(rms)
+    return diffs
+
+
+def tune_params(image_paths, sample_count=3, tolerance=LEVEL_TOLERANCE, loader=None):
+    """
+    Suggest parameters for image_paths (same keys as auto_detect_params,
+    plus "measurements"). Falls back to the size-based suggestion when
+    fewer than two frames can be read.
+    """
+    loader = loader or ImageLoadingHandler()
+    grays = []
+    full_shape = None
+    sigma = 0.0
+    for index in sample_indices(len(image_paths), sample_count):
+        path = image_paths[index]
+        if full_shape is None:
+            # One frame at full resolution: the noise needs the finest band
+            image = loader.read_image_from_path(path)
+            if image is None:
+                continue
+            luma = LumaPyramid.from_image(image)
+            del image
+            full_shape = luma.shape
+            sigma = estimate_noise(luma.full)
+            # Block-average like a reduced decode, so all samples share pixel centres
+            factor = 2 ** max(0, int(math.log2(max(full_shape) / ANALYSIS_SIZE)))
+            h, w = full_shape
+            luma = LumaPyramid(cv2.resize(luma.full, (-(-w // factor), -(-h // factor)),
+                                          interpolation=cv2.INTER_AREA))
+        else:
+            # Others are only needed at the analysis size: decode them reduced
+            image = loader.read_reduced(path, factor)
+            if image is None:
+                continue
+            luma = LumaPyramid.from_image(image)
+            del image
+        gray = luma.at_max_dim(ANALYSIS_SIZE)
+        if grays and gray.shape != grays[0].shape:
+            # Reduced decodes round sizes up: match the first sample exactly
+            gray = cv2.resize(gray, grays[0].shape[::-1], interpolation=cv2.INTER_AREA)
+        grays.append(np.ascontiguousarray(gray))
+    if full_shape is None:
+        return None
+
+    params = auto_detect_params(full_shape, len(image_paths))
+    if len(grays) < 2:
+        return params
+
+    # Shift of every sample relative to the first, in full-resolution pixels
+    downscale = max(full_shape) / max(grays[0].shape)
+    shifts = [(0.0, 0.0)] + [measure_shift(grays[0], g) for g in grays[1:]]
+    max_shift = max(math.hypot(dx, dy) for dx, dy in shifts) * downscale
+
+    # Bands at analysis size map to full-size bands log2(downscale) finer
+    analysis_levels = max(1, int(math.log2(min(grays[0].shape))) - 3)
+    diffs = band_differences(grays, shifts, analysis_levels)
+    significant = [i for i, d in enumerate(diffs) if d > tolerance]
+    level_offset = max(0, int(round(math.log2(downscale))))
+    max_levels = params["pyramid_num_levels"]
+    if not significant:
+        levels = min(max_levels, level_offset + 1)
+    elif significant[-1] == len(diffs) - 1:
+        levels = max_levels  # Still differs at the coarsest analysed band
+    else:
+        levels = min(max_levels, level_offset + significant[-1] + 2)  # One band of margin
+    params["pyramid_num_levels"] = max(2, levels)
+
+    # Noise: switch only on contrast well above the noise variance, and
+    # average the focus measure over a wider window on noisy stacks
+    params["contrast_threshold"] = round(2.0 * sigma * sigma, 2)
+    if sigma > 2.0:
+        params["fusion_kernel_size"] += 2
+
+    # Frames that barely move do not need fine sub-pixel alignment
+    if max_shift < 0.5:
+        params["alignment_scale_factor"] = min(params["alignment_scale_factor"], 4)
+
+    params["measurements"] = {
+        "noise_sigma": sigma,
+        "max_shift": max_shift,
+        "band_rms_differences": diffs,
+    }
+    logger.info(f"Auto-tune: noise={sigma:.2f}, shift={max_shift:.1f}px, "
+                f"levels={params['pyramid_num_levels']}, kernel={params['fusion_kernel_size']}")
+    return params
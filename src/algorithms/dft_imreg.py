@@ -940,6 +940,21 @@ def resize_image(im, division_factor):
 
 
 class im_reg:
+    def estimate_translation(self, ref_gray, align_gray, scale_factor):
+        """Return (x_shift, y_shift, success) that moves align_gray onto ref_gray.
+
+        Both inputs are single-channel; phase correlation runs on copies
+        downscaled by scale_factor and the shift is scaled back up.
+        success is the correlation peak strength (~1 for a clean match,
+        ~0.2 for unrelated content).
+        """
+        translation_result = translation(
+            resize_image(ref_gray, scale_factor),
+            resize_image(align_gray, scale_factor),
+        )
+        y_shift, x_shift = translation_result["tvec"] * scale_factor
+        return float(x_shift), float(y_shift), float(translation_result["success"])
+
     # Register im1 to im0 for Translation only
     def register_image_translation(self, im0, im1, scale_factor,
                                    ref_gray=None):
@@ -953,13 +968,8 @@ class im_reg:
             ref_gray = cv2.cvtColor(im0, cv2.COLOR_BGR2GRAY)
         align_gray = cv2.cvtColor(im1, cv2.COLOR_BGR2GRAY)
 
-        translation_result = translation(
-            resize_image(ref_gray, scale_factor),
-            resize_image(align_gray, scale_factor),
-        )
-
+        x_shift, y_shift, _ = self.estimate_translation(ref_gray, align_gray, scale_factor)
         height, width = im1.shape[:2]
-        y_shift, x_shift = translation_result["tvec"] * scale_factor
 
         translation_matrix = np.float64(
             [
@@ -970,7 +980,7 @@ class im_reg:
         # warpAffine on float32 input returns float32 — no astype needed
         result = cv2.warpAffine(im1, translation_matrix, (width, height))
 
-        self.last_shift = (float(x_shift), float(y_shift))
+        self.last_shift = (x_shift, y_shift)
 
         return result
 
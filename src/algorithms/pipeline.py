@@ -0,0 +1,144 @@
+"""
+    Bounded frame pipeline for the Laplacian CPU paths.
+    Worker threads load (and align) a frame and build its pyramid; the
+    main thread fuses finished pyramids in frame order. Every job in flight
+    ends up holding a full pyramid, so the look-ahead window is capped by a
+    memory budget. Within that cap it is sized from measured stage times:
+    enough builds in flight that the fuse loop does not wait on them.
+"""
+import math
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+logger = logging.getLogger(__name__)
+
+_FALLBACK_MEMORY = 2 * 1024**3  # Used when free memory cannot be queried
+_EMA = 0.3  # Weight of the newest stage time sample
+
+
+@dataclass
+class PipelineStats:
+    """Timing of one pipelined run (seconds)."""
+    workers: int = 0  # Worker threads (upper bound on builds in flight)
+    peak_in_flight: int = 0  # Largest look-ahead window used
+    frames: int = 0
+    build_time: float = 0.0  # Summed worker time (load/align + pyramid)
+    fuse_time: float = 0.0  # Main thread time between frames
+    stall_time: float = 0.0  # Main thread time spent waiting for a frame
+
+
+def available_memory():
+    """Free physical memory in bytes (best effort)."""
+    if HAS_PSUTIL:
+        return psutil.virtual_memory().available
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return _FALLBACK_MEMORY
+
+
+def frame_nbytes(shape, itemsize=4):
+    """Memory held by one in-flight frame: its pyramid (~4/3 of the image)
+    plus the full-resolution float32 image it is built from."""
+    pixels = shape[0] * shape[1] * (shape[2] if len(shape) > 2 else 1)
+    return int(pixels * itemsize * 4 / 3) + pixels * 4
+
+
+class FramePipeline:
+    """
+    Run job(index) for frames first..n_frames-1 on worker threads and
+    iterate the results in frame order:
+
+        with FramePipeline(job, n, frame_bytes) as pipeline:
+            for index, result in pipeline:
+                fuse(result)
+
+    workers > 0 fixes the number of builds in flight; 0 sizes it from the
+    core count and memory_budget (bytes, 0 = half of free memory), then
+    adapts the window to the ratio of build to fuse time.
+    """
+
+    def __init__(self, job, n_frames, frame_bytes, workers=0, memory_budget=0, first=1):
+        self._job = job
+        self._n_frames = n_frames
+        self._first = first
+        self.adaptive = workers <= 0
+        budget = memory_budget if memory_budget > 0 else available_memory() // 2
+        # The frame being fused is held on top of the window
+        memory_cap = max(1, budget // max(frame_bytes, 1) - 1)
+        cores = os.cpu_count() or 4
+        self.max_in_flight = max(1, min(workers if workers > 0 else cores, memory_cap,
+                                        n_frames - first))
+        if workers > memory_cap:
+            logger.warning(f"pipeline_workers={workers} exceeds the memory budget; "
+                           f"using {self.max_in_flight}")
+        self.window = self.max_in_flight if not self.adaptive else min(2, self.max_in_flight)
+        self.stats = PipelineStats(workers=self.max_in_flight, peak_in_flight=self.window)
+        self._build_ema = None
+        self._fuse_ema = None
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pending = {}
+
+    def __enter__(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        return self
+
+    def __exit__(self, *exc):
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._pool.shutdown(wait=True)
+        return False
+
+    def _timed_job(self, index):
+        t0 = time.perf_counter()
+        result = self._job(index)
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self.stats.build_time += elapsed
+            self._build_ema = elapsed if self._build_ema is None else (
+                _EMA * elapsed + (1 - _EMA) * self._build_ema)
+        return result
+
+    def _fill(self, next_index):
+        while next_index < self._n_frames and len(self._pending) < self.window:
+            self._pending[next_index] = self._pool.submit(self._timed_job, next_index)
+            next_index += 1
+        return next_index
+
+    def _adapt(self, fuse_time):
+        self._fuse_ema = fuse_time if self._fuse_ema is None else (
+            _EMA * fuse_time + (1 - _EMA) * self._fuse_ema)
+        if not self.adaptive or self._build_ema is None:
+            return
+        # Builds needed in parallel to deliver one frame per fuse, plus one spare
+        needed = math.ceil(self._build_ema / max(self._fuse_ema, 1e-3)) + 1
+        self.window = max(1, min(needed, self.max_in_flight))
+        self.stats.peak_in_flight = max(self.stats.peak_in_flight, self.window)
+
+    def __iter__(self):
+        next_index = self._fill(self._first)
+        for index in range(self._first, self._n_frames):
+            next_index = self._fill(next_index)
+            t0 = time.perf_counter()
+            result = self._pending.pop(index).result()
+            t1 = time.perf_counter()
+            self.stats.stall_time += t1 - t0
+            # Top up before handing the frame over, so builds overlap the fuse
+            next_index = self._fill(next_index)
+            yield index, result
+            fuse_time = time.perf_counter() - t1
+            self.stats.fuse_time += fuse_time
+            self.stats.frames += 1
+            self._adapt(fuse_time)
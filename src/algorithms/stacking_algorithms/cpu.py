@@ -45,9 +45,23 @@ def get_deviation(matrix):
     return summed_deviation
 
 
-def gaussian_pyramid(img, num_levels):
-    """Calculate Gaussian pyramid."""
-    lower = img if img.dtype == np.float32 else img.astype(np.float32)
+def to_float32(img, scale=1.0):
+    """
+    Native-dtype (uint8/uint16/float32) image -> float32 in the 0-255 range,
+    converted and scaled in one pass. float32 input at scale 1 is returned
+    as is.
+    """
+    if img.dtype == np.float32 and scale == 1.0:
+        return img
+    out = img.astype(np.float32, order="C")
+    if scale != 1.0:
+        out *= np.float32(scale)
+    return out
+
+
+def gaussian_pyramid(img, num_levels, scale=1.0):
+    """Calculate Gaussian pyramid. img may be native-dtype (see to_float32)."""
+    lower = to_float32(img, scale)
     gaussian_pyr = [lower]
     for _ in range(num_levels):
         lower = cv2.pyrDown(lower)  # returns float32 when input is float32
@@ -55,6 +69,86 @@ def gaussian_pyramid(img, num_levels):
     return gaussian_pyr
 
 
+# ──────────────────────────────────────────────
+# Alignment warp (fused with dtype promotion + gray)
+# ──────────────────────────────────────────────
+
+_WARP_SIGNATURE_ARGS = (nb.float64[:, :], nb.float32, nb.float32[:, :, :], nb.float32[:, :])
+
+
+@nb.njit(
+    [nb.void(dtype[:, :, :], *_WARP_SIGNATURE_ARGS)
+     for dtype in (nb.uint8, nb.uint16, nb.float32)],
+    fastmath=True, parallel=True, cache=True,
+)
+def warp_affine_bilinear_fused(src, inverse_matrix, scale, out, gray_out):
+    """
+    Bilinear affine warp of a BGR image into a float32 buffer.
+    inverse_matrix maps output (x, y) to source coordinates, like
+    cv2.WARP_INVERSE_MAP. Pixels are multiplied by scale while they are
+    written, and the BT.601 gray plane is emitted in the same pass.
+    Samples outside the source read as 0 (cv2.BORDER_CONSTANT).
+    """
+    src_h = src.shape[0]
+    src_w = src.shape[1]
+    for y in nb.prange(out.shape[0]):
+        for x in range(out.shape[1]):
+            sx = inverse_matrix[0, 0] * x + inverse_matrix[0, 1] * y + inverse_matrix[0, 2]
+            sy = inverse_matrix[1, 0] * x + inverse_matrix[1, 1] * y + inverse_matrix[1, 2]
+            x0 = int(np.floor(sx))
+            y0 = int(np.floor(sy))
+            b = 0.0
+            g = 0.0
+            r = 0.0
+            if x0 >= -1 and y0 >= -1 and x0 < src_w and y0 < src_h:
+                fx = sx - x0
+                fy = sy - y0
+                for dy in range(2):
+                    yy = y0 + dy
+                    if yy < 0 or yy >= src_h:
+                        continue
+                    wy = fy if dy == 1 else 1.0 - fy
+                    for dx in range(2):
+                        xx = x0 + dx
+                        if xx < 0 or xx >= src_w:
+                            continue
+                        w = wy * (fx if dx == 1 else 1.0 - fx)
+                        b += w * src[yy, xx, 0]
+                        g += w * src[yy, xx, 1]
+                        r += w * src[yy, xx, 2]
+            b *= scale
+            g *= scale
+            r *= scale
+            out[y, x, 0] = b
+            out[y, x, 1] = g
+            out[y, x, 2] = r
+            gray_out[y, x] = 0.114 * b + 0.587 * g + 0.299 * r
+
+
+def warp_to_float32(img, inverse_matrix, scale=1.0, out=None, gray_out=None):
+    """
+    Warp a native-dtype (uint8/uint16/float32) BGR image straight into a
+    float32 buffer and return (warped, gray).
+
+    Replaces the load -> astype(float32) -> warpAffine -> cvtColor chain
+    with a single pass. out/gray_out are reused when their shape matches,
+    so callers can keep one buffer per worker across frames.
+    """
+    h, w = img.shape[:2]
+    if out is None or out.shape != (h, w, 3) or out.dtype != np.float32:
+        out = np.empty((h, w, 3), dtype=np.float32)
+    if gray_out is None or gray_out.shape != (h, w) or gray_out.dtype != np.float32:
+        gray_out = np.empty((h, w), dtype=np.float32)
+    if img.dtype not in (np.uint8, np.uint16, np.float32):
+        img = img.astype(np.float32)
+    warp_affine_bilinear_fused(
+        np.ascontiguousarray(img),
+        np.ascontiguousarray(inverse_matrix, dtype=np.float64),
+        np.float32(scale), out, gray_out,
+    )
+    return out, gray_out
+
+
 # ──────────────────────────────────────────────
 # Laplacian Pyramid stacking (original algorithm)
 # ──────────────────────────────────────────────
@@ -155,9 +249,313 @@ def fuse_pyramid_levels_using_focusmap(pyr_level1, pyr_level2, focusmap):
     return output
 
 
-def generate_laplacian_pyramid(img, num_levels):
-    """Generate Laplacian pyramid (from Gaussian pyramid)."""
-    gaussian_pyr = gaussian_pyramid(img, num_levels)
+@nb.njit(
+    [nb.void(level, level, nb.uint8[:, :]) for level in (nb.float32[:, :, :], nb.int16[:, :, :])],
+    fastmath=True, parallel=True, cache=True,
+)
+def fuse_pyramid_levels_into(fused_level, pyr_level2, focusmap):
+    """In-place fuse: copy only the pixels where focusmap picks pyr_level2."""
+    for y in nb.prange(focusmap.shape[0]):
+        for x in range(focusmap.shape[1]):
+            if focusmap[y, x] != 0:
+                fused_level[y, x, :] = pyr_level2[y, x, :]
+
+
+_FEATHER_TILE_ROWS = 64
+
+
+@nb.njit(nb.int64(nb.int64, nb.int64), cache=True)
+def _reflect_101(i, n):
+    """cv2.BORDER_REFLECT_101 index (the GaussianBlur default)."""
+    if n == 1:
+        return 0
+    while i < 0 or i >= n:
+        if i < 0:
+            i = -i
+        else:
+            i = 2 * n - 2 - i
+    return i
+
+
+@nb.njit(
+    nb.void(nb.uint8[:, ::1], nb.float32[::1], nb.int64, nb.float32[:, ::1]),
+    fastmath=True, cache=True,
+)
+def _feather_rows(focusmap, weights, first_row, rows):
+    """Horizontal blur of focusmap rows first_row.. into the tile scratch rows."""
+    h, w = focusmap.shape
+    n_taps = weights.shape[0]
+    r = n_taps // 2
+    row_f = np.empty(w, dtype=np.float32)
+    for j in range(rows.shape[0]):
+        src = focusmap[_reflect_101(first_row + j, h)]
+        dst = rows[j]
+        for x in range(w):
+            row_f[x] = src[x]
+        # Interior: no border handling
+        for x in range(r, w - r):
+            acc = np.float32(0.0)
+            for k in range(n_taps):
+                acc += weights[k] * row_f[x - r + k]
+            dst[x] = acc
+        # Borders: reflected taps
+        for x in range(min(r, w)):
+            for xb in (x, w - 1 - x):
+                acc = np.float32(0.0)
+                for k in range(n_taps):
+                    acc += weights[k] * src[_reflect_101(xb + k - r, w)]
+                dst[xb] = acc
+
+
+@nb.njit(
+    nb.void(nb.float32[:, ::1], nb.float32[::1], nb.int64, nb.float32[::1]),
+    fastmath=True, cache=True,
+)
+def _feather_column_blur(rows, weights, y, out):
+    """Vertical blur of tile row y (scratch rows y .. y + 2r) into out."""
+    w = rows.shape[1]
+    src = rows[y]
+    w0 = weights[0]
+    for x in range(w):
+        out[x] = w0 * src[x]
+    for k in range(1, weights.shape[0]):
+        wk = weights[k]
+        src = rows[y + k]
+        for x in range(w):
+            out[x] += wk * src[x]
+
+
+@nb.njit(nb.boolean(nb.uint8[:, ::1], nb.int64), cache=True)
+def _has_full_window(focusmap, k):
+    """True if some k x k block is all at the map's peak value.
+    The blurred peak then equals the map peak, so no max pass is needed."""
+    h, w = focusmap.shape
+    peak = focusmap.max()
+    if peak == 0:
+        return False
+    col_run = np.zeros(w, dtype=np.int64)
+    for y in range(h):
+        run = 0
+        for x in range(w):
+            run = run + 1 if focusmap[y, x] == peak else 0
+            col_run[x] = col_run[x] + 1 if run >= k else 0
+            if col_run[x] >= k:
+                return True
+    return False
+
+
+_LEVEL_TYPES = (
+    # C-contiguous levels vectorize; any-layout covers auto-crop window views
+    nb.float32[:, :, ::1], nb.float32[:, :, :],
+    # Fixed-point storage (see quantize_pyramid)
+    nb.int16[:, :, ::1], nb.int16[:, :, :],
+)
+
+
+@nb.njit(
+    [nb.void(level, level, nb.uint8[:, ::1], nb.float32[::1], nb.boolean, nb.boolean,
+             nb.float32[:, :], nb.float32[:, :])
+     for level in _LEVEL_TYPES],
+    fastmath=True, parallel=True, cache=True,
+)
+def feather_fuse_levels_into(fused_level, pyr_level2, focusmap, weights, planar, quantized,
+                             fused_gray, new_gray):
+    """
+    Soft fuse in place: same result as feather_focusmap followed by
+    fuse_pyramid_levels_soft, without the float map or blend temporaries.
+    Rows are processed in tiles; each tile blurs its rows horizontally into
+    a small scratch, then blurs vertically and blends row by row.
+    planar: levels are (C, H, W) instead of (H, W, C).
+    quantized: levels are int16 fixed point; blended values are rounded.
+    fused_gray/new_gray: gray planes blended with the same weights, so the
+    fused gray stays in step with fused_level (pass empty arrays to skip).
+    """
+    h, w = focusmap.shape
+    n_taps = weights.shape[0]
+    r = n_taps // 2
+    n_tiles = (h + _FEATHER_TILE_ROWS - 1) // _FEATHER_TILE_ROWS
+
+    # Normalizing max (feather_focusmap divides by the blurred map's max).
+    # Nearly always some window is saturated, which a uint8 scan detects.
+    if _has_full_window(focusmap, n_taps):
+        max_val = np.float32(focusmap.max())
+    else:
+        tile_max = np.zeros(n_tiles, dtype=np.float32)
+        for t in nb.prange(n_tiles):
+            y0 = t * _FEATHER_TILE_ROWS
+            y1 = min(h, y0 + _FEATHER_TILE_ROWS)
+            rows = np.empty((y1 - y0 + 2 * r, w), dtype=np.float32)
+            vrow = np.empty(w, dtype=np.float32)
+            _feather_rows(focusmap, weights, y0 - r, rows)
+            m = np.float32(0.0)
+            for y in range(y1 - y0):
+                _feather_column_blur(rows, weights, y, vrow)
+                m = max(m, vrow.max())
+            tile_max[t] = m
+        max_val = tile_max.max()
+    if max_val <= 0:
+        return
+    inv_max = np.float32(1.0) / max_val
+
+    # Rows with any focus: tiles whose blur window has none keep fused_level
+    # as is (most of a level when only part of the frame is in focus)
+    row_live = np.zeros(h, dtype=np.bool_)
+    for y in nb.prange(h):
+        for x in range(w):
+            if focusmap[y, x] != 0:
+                row_live[y] = True
+                break
+
+    n_channels = fused_level.shape[0] if planar else fused_level.shape[2]
+    with_gray = fused_gray.shape[0] > 0
+    for t in nb.prange(n_tiles):
+        y0 = t * _FEATHER_TILE_ROWS
+        y1 = min(h, y0 + _FEATHER_TILE_ROWS)
+        live = False
+        for y in range(max(0, y0 - r), min(h, y1 + r)):
+            if row_live[y]:
+                live = True
+                break
+        if not live:
+            continue
+        rows = np.empty((y1 - y0 + 2 * r, w), dtype=np.float32)
+        vrow = np.empty(w, dtype=np.float32)
+        _feather_rows(focusmap, weights, y0 - r, rows)
+        for y in range(y1 - y0):
+            _feather_column_blur(rows, weights, y, vrow)
+            if with_gray:
+                gray_row = fused_gray[y0 + y]
+                new_gray_row = new_gray[y0 + y]
+                for x in range(w):
+                    gray_row[x] += (new_gray_row[x] - gray_row[x]) * (vrow[x] * inv_max)
+            if planar:
+                # Contiguous plane rows: branch-free blend vectorizes
+                for x in range(w):
+                    vrow[x] *= inv_max
+                for c in range(n_channels):
+                    fused_row = fused_level[c, y0 + y]
+                    new_row = pyr_level2[c, y0 + y]
+                    for x in range(w):
+                        f = np.float32(fused_row[x])
+                        v = f + (np.float32(new_row[x]) - f) * vrow[x]
+                        if quantized:
+                            fused_row[x] = np.rint(v)
+                        else:
+                            fused_row[x] = v
+                continue
+            fused_row = fused_level[y0 + y]
+            new_row = pyr_level2[y0 + y]
+            for x in range(w):
+                m = vrow[x] * inv_max
+                if m > 0:
+                    for c in range(n_channels):
+                        f = np.float32(fused_row[x, c])
+                        v = f + (np.float32(new_row[x, c]) - f) * m
+                        if quantized:
+                            fused_row[x, c] = np.rint(v)
+                        else:
+                            fused_row[x, c] = v
+
+
+_NO_GRAY = np.empty((0, 0), dtype=np.float32)
+
+
+def feather_fuse_into(fused_level, pyr_level2, focusmap, radius, planar=False,
+                      fused_gray=None, new_gray=None):
+    """
+    Feather a binary focusmap and blend pyr_level2 into fused_level, in one kernel.
+    If fused_gray/new_gray are given, fused_gray is blended the same way.
+    """
+    k = radius * 2 + 1
+    weights = cv2.getGaussianKernel(k, 0, ktype=cv2.CV_32F).ravel()
+    if fused_gray is None:
+        fused_gray = new_gray = _NO_GRAY
+    feather_fuse_levels_into(
+        fused_level, pyr_level2, np.ascontiguousarray(focusmap, dtype=np.uint8), weights,
+        planar, fused_level.dtype == np.int16, fused_gray, new_gray,
+    )
+
+
+# ──────────────────────────────────────────────
+# Planar (channel-first) pyramids
+# ──────────────────────────────────────────────
+# Levels are (C, H, W): every plane row is contiguous, so gray conversion,
+# fusion and blending loops run over unit-stride float32 rows.
+
+_PLANAR_LEVEL_TYPES = (nb.float32[:, :, ::1], nb.float32[:, :, :])
+
+
+def generate_laplacian_pyramid_planar(img, num_levels, scale=1.0):
+    """Laplacian pyramid with (C, H, W) levels, built plane by plane."""
+    img = to_float32(img, scale)
+    planes = cv2.split(img) if img.ndim == 3 else [img]
+    gaussian = [gaussian_pyramid(plane, num_levels) for plane in planes]
+    laplacian_pyr = [np.stack([g[-1] for g in gaussian])]
+    for i in range(num_levels, 0, -1):
+        h, w = gaussian[0][i - 1].shape
+        level = np.empty((len(planes), h, w), dtype=np.float32)
+        for c, g in enumerate(gaussian):
+            expanded = cv2.pyrUp(g[i], dstsize=(w, h))
+            cv2.subtract(g[i - 1], expanded, dst=level[c])
+        laplacian_pyr.append(level)
+    return laplacian_pyr
+
+
+def reconstruct_pyramid_planar(laplacian_pyr):
+    """Reconstruct an (H, W, C) image from a planar Laplacian pyramid."""
+    planes = [
+        reconstruct_pyramid([level[c] for level in laplacian_pyr])
+        for c in range(laplacian_pyr[0].shape[0])
+    ]
+    return cv2.merge(planes) if len(planes) > 1 else planes[0]
+
+
+@nb.njit(
+    [nb.void(level, nb.float32[:, ::1]) for level in _PLANAR_LEVEL_TYPES],
+    fastmath=True, parallel=True, cache=True,
+)
+def _planar_gray_kernel(level, out):
+    for y in nb.prange(out.shape[0]):
+        b = level[0, y]
+        g = level[1, y]
+        r = level[2, y]
+        row = out[y]
+        for x in range(out.shape[1]):
+            row[x] = 0.114 * b[x] + 0.587 * g[x] + 0.299 * r[x]
+
+
+def planar_to_gray(level):
+    """Gray plane of a (3, H, W) level (same weights as cv2 BGR2GRAY)."""
+    if level.shape[0] == 1:
+        return np.ascontiguousarray(level[0])
+    out = np.empty(level.shape[1:], dtype=np.float32)
+    _planar_gray_kernel(level, out)
+    return out
+
+
+@nb.njit(
+    [nb.void(level, level, nb.uint8[:, :]) for level in _LEVEL_TYPES],
+    fastmath=True, parallel=True, cache=True,
+)
+def fuse_planar_levels_into(fused_level, pyr_level2, focusmap):
+    """In-place fuse of (C, H, W) levels: take pyr_level2 where focusmap is set."""
+    for y in nb.prange(focusmap.shape[0]):
+        fm = focusmap[y]
+        for c in range(fused_level.shape[0]):
+            fused_row = fused_level[c, y]
+            new_row = pyr_level2[c, y]
+            for x in range(focusmap.shape[1]):
+                if fm[x] != 0:
+                    fused_row[x] = new_row[x]
+
+
+def generate_laplacian_pyramid(img, num_levels, scale=1.0):
+    """
+    Generate Laplacian pyramid (from Gaussian pyramid). img may be a
+    native uint8/uint16 frame: it is promoted to float32 (times scale)
+    here, so callers can queue frames in their decoded dtype.
+    """
+    gaussian_pyr = gaussian_pyramid(img, num_levels, scale)
     laplacian_top = gaussian_pyr[-1]
     laplacian_pyr = [laplacian_top]
     for i in range(num_levels, 0, -1):
@@ -179,54 +577,179 @@ def reconstruct_pyramid(laplacian_pyr):
     return top
 
 
-def local_tone_map(image, strength=0.5):
+class StripReconstruction:
+    """
+    Reconstruct a Laplacian pyramid in horizontal strips of the full
+    resolution image. All levels but the last are collapsed up front (a
+    quarter of the output size, available as .coarse); each strip is then
+    pyrUp of the coarse rows it depends on plus the matching rows of the
+    last level, which equals the same rows of reconstruct_pyramid.
+    Levels may be planar (C, H, W) and/or int16 fixed point.
     """
-    Local tone-mapping to compensate for the contrast boost inherent
-    in Laplacian pyramid max-contrast selection (PMax-style).
 
-    Max-contrast selection pushes darks darker and brights brighter.
-    This uses CLAHE (Contrast Limited Adaptive Histogram Equalization)
-    blended with the original to bring the dynamic range back.
+    def __init__(self, laplacian_pyr, planar=False):
+        self.planar = planar
+        self.full = laplacian_pyr[-1]
+        self.height, self.width = self.full.shape[1:] if planar else self.full.shape[:2]
+        self.channels = self.full.shape[0] if planar else self.full.shape[2]
+        coarse_pyr = laplacian_pyr[:-1]
+        if coarse_pyr and coarse_pyr[0].dtype == np.int16:
+            coarse_pyr = dequantize_pyramid(coarse_pyr)
+        if not coarse_pyr:
+            self.coarse = None
+        elif planar:
+            self.coarse = reconstruct_pyramid_planar(coarse_pyr)
+        else:
+            self.coarse = reconstruct_pyramid(coarse_pyr)
+
+    def _full_rows(self, y0, y1):
+        rows = self.full[:, y0:y1].transpose(1, 2, 0) if self.planar else self.full[y0:y1]
+        if rows.dtype == np.int16:
+            return rows.astype(np.float32) * np.float32(1.0 / PYRAMID_INT16_SCALE)
+        return np.array(rows, dtype=np.float32)
+
+    def rows(self, y0, y1):
+        """float32 (y1 - y0, W, C) rows of the reconstructed image."""
+        strip = self._full_rows(y0, y1)
+        if self.coarse is None:
+            return strip
+        ch = self.coarse.shape[0]
+        # pyrUp output row y reads coarse rows (y - 1) // 2 .. (y + 2) // 2;
+        # two extra rows keep the chunk's own border handling out of range
+        c0 = max(0, y0 // 2 - 2)
+        c1 = min(ch, (y1 + 1) // 2 + 2)
+        # At the bottom edge the chunk must end exactly where the image does
+        out_h = self.height - 2 * c0 if c1 == ch else 2 * (c1 - c0)
+        up = cv2.pyrUp(self.coarse[c0:c1], dstsize=(self.width, out_h))
+        if up.ndim == 2:
+            up = up[:, :, None]
+        strip += up[y0 - 2 * c0:y1 - 2 * c0]
+        return strip
+
+    def strips(self, strip_rows=256):
+        """Yield (y0, rows) over the whole image, top to bottom."""
+        for y0 in range(0, self.height, strip_rows):
+            yield y0, self.rows(y0, min(self.height, y0 + strip_rows))
 
-    Args:
-        image: float32 BGR in 0-255 range
-        strength: 0.0 = no tone-mapping, 1.0 = full CLAHE. Default 0.5.
+
+# ──────────────────────────────────────────────
+# Tone mapping (post-process)
+# ──────────────────────────────────────────────
+# Max-contrast selection pushes darks darker and brights brighter. The
+# correction works on a heavily smoothed, low-resolution luminance "base"
+# layer only: the base is pulled toward its mean and the difference is
+# added to every channel. Fine detail, colour and float precision are
+# untouched, and the full-resolution work is a single add per pixel, so
+# it can be applied strip by strip.
+
+TONE_MAP_BASE_SIZE = 128  # Long side of the base layer (px)
+TONE_MAP_STRIP_ROWS = 256
+
+
+def tone_map_base(image):
     """
-    if strength <= 0:
-        return image
+    Low-resolution smoothed luminance of image (any resolution of the
+    output, e.g. a coarse pyramid reconstruction). Blur sigma is 1/16 of
+    the long side, comparable to an 8x8 CLAHE tile grid.
+    """
+    h, w = image.shape[:2]
+    scale = TONE_MAP_BASE_SIZE / max(h, w)
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    small = cv2.resize(image.astype(np.float32, copy=False), size, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3 and small.shape[2] == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    elif small.ndim == 3:
+        small = small[:, :, 0]
+    return cv2.GaussianBlur(small, (0, 0), TONE_MAP_BASE_SIZE / 16)
+
+
+def tone_map_levels(laplacian_pyr, planar=False):
+    """Number of coarse levels (up to the first at least twice the base size) the base needs."""
+    for i, level in enumerate(laplacian_pyr):
+        if max(level.shape[1:] if planar else level.shape[:2]) >= 2 * TONE_MAP_BASE_SIZE:
+            return i + 1
+    return len(laplacian_pyr)
+
+
+def tone_map_base_from_pyramid(laplacian_pyr, planar=False):
+    """
+    tone_map_base of a fused Laplacian pyramid's output, built from its
+    coarse levels only (see tone_map_levels), so in-memory, GPU and
+    strip-streamed outputs share exactly the same base without the
+    full-resolution image.
+    """
+    partial = laplacian_pyr[:tone_map_levels(laplacian_pyr, planar)]
+    if partial[0].dtype == np.int16:
+        partial = dequantize_pyramid(partial)
+    if planar:
+        return tone_map_base(reconstruct_pyramid_planar(partial))
+    return tone_map_base(reconstruct_pyramid(partial))
 
-    img_u8 = np.clip(image, 0, 255).astype(np.uint8)
 
-    # Convert to LAB — only adjust L channel (luminance), preserve color
-    lab = cv2.cvtColor(img_u8, cv2.COLOR_BGR2LAB)
-    l_channel = lab[:, :, 0]
+def apply_tone_map(image, base, strength, row_offset=0, full_shape=None):
+    """
+    Tone map image in place from its base layer.
+    image may be a row strip of a larger output: row_offset is its first
+    row and full_shape the (h, w) of the whole output.
+    strength: 0.0 = unchanged, 1.0 = base layer fully flattened.
+    """
+    if strength <= 0:
+        return image
+    full_h = full_shape[0] if full_shape is not None else image.shape[0]
+    h, w = image.shape[:2]
+    bh = base.shape[0]
+    target = np.float32(base.mean())
+    for y0 in range(0, h, TONE_MAP_STRIP_ROWS):
+        y1 = min(h, y0 + TONE_MAP_STRIP_ROWS)
+        # Bilinear (half-pixel centred) upsample of the base for these rows:
+        # vertical lerp of base rows, then a horizontal-only resize
+        ys = (np.arange(row_offset + y0, row_offset + y1) + 0.5) * (bh / full_h) - 0.5
+        ys = np.clip(ys, 0, bh - 1)
+        i0 = ys.astype(np.int64)
+        i1 = np.minimum(i0 + 1, bh - 1)
+        t = (ys - i0).astype(np.float32)[:, None]
+        rows = base[i0] * (1 - t) + base[i1] * t
+        delta = cv2.resize(rows, (w, y1 - y0), interpolation=cv2.INTER_LINEAR)
+        delta = (target - delta) * np.float32(strength)
+        strip = image[y0:y1]
+        if strip.ndim == 3:
+            strip += delta[:, :, None]
+        else:
+            strip += delta
+    return image
 
-    # CLAHE with moderate clip limit
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    l_corrected = clahe.apply(l_channel)
 
-    # Blend original L with CLAHE L
-    l_blended = cv2.addWeighted(l_channel, 1.0 - strength, l_corrected, strength, 0)
-    lab[:, :, 0] = l_blended
+def local_tone_map(image, strength=0.3):
+    """
+    Local tone-mapping to compensate for the contrast boost inherent
+    in Laplacian pyramid max-contrast selection (PMax-style).
 
-    result = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
-    return result.astype(np.float32)
+    Args:
+        image: float32 BGR in 0-255 range (modified in place)
+        strength: 0.0 = no tone-mapping (returned as is), 1.0 = base
+            luminance fully flattened. Default 0.3.
+    """
+    if strength <= 0:
+        return image
+    if image.dtype != np.float32:
+        image = image.astype(np.float32)
+    return apply_tone_map(image, tone_map_base(image), strength)
 
 
 # ──────────────────────────────────────────────
 # Weighted Average stacking
 # ──────────────────────────────────────────────
 
-def compute_focus_weights(image, kernel_size=5):
+def compute_focus_weights(image, kernel_size=5, gray=None):
     """
     Compute per-pixel focus weight map using local Laplacian energy.
     Higher weight = more in-focus.
+    gray: optional precomputed grayscale of image (e.g. from warp_to_float32).
     """
-    if image.ndim == 3:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    else:
-        gray = image
-    gray = gray.astype(np.float32)
+    if gray is None:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    if gray.dtype != np.float32:
+        gray = gray.astype(np.float32)
 
     # Laplacian gives high response at edges/detail
     lap = cv2.Laplacian(gray, cv2.CV_32F)
@@ -362,6 +885,8 @@ def depthmap_fuse_multi(images, kernel_size=11):
 # ──────────────────────────────────────────────
 
 def _to_u8(img):
+    if img.dtype == np.uint16:
+        return cv2.convertScaleAbs(img, alpha=255.0 / 65535.0)  # Native 16-bit frame
     if img.dtype != np.uint8:
         return np.clip(img, 0, 255).astype(np.uint8)
     return img
@@ -386,7 +911,7 @@ def mertens_fuse_batch(images, contrast_weight=1.0, saturation_weight=1.0, expos
 # Multi-resolution Depth Map
 # ──────────────────────────────────────────────
 
-def compute_multires_sharpness(image, scales=(5, 11, 21), smoothing=0):
+def compute_multires_sharpness(image, scales=(5, 11, 21), smoothing=0, gray=None):
     """
     Compute sharpness at multiple window sizes and combine.
     Uses Sum Modified Laplacian (Nayar & Nakagawa) — the standard
@@ -398,8 +923,11 @@ def compute_multires_sharpness(image, scales=(5, 11, 21), smoothing=0):
             depth discontinuities at edges (like Zerene's DMap).
             Higher = smoother transitions, fewer artifacts.
             Lower = sharper but more halos at boundaries.
+        gray: optional precomputed grayscale of image (e.g. from warp_to_float32).
     """
-    if image.ndim == 3:
+    if gray is not None:
+        gray = gray if gray.dtype == np.float32 else gray.astype(np.float32)
+    elif image.ndim == 3:
         gray = cv2.cvtColor(
             image.astype(np.float32) if image.dtype != np.float32 else image,
             cv2.COLOR_BGR2GRAY
@@ -431,3 +959,87 @@ def compute_multires_sharpness(image, scales=(5, 11, 21), smoothing=0):
         combined = cv2.bilateralFilter(combined, d, sigma_color, sigma_space)
 
     return combined
+
+
+# ──────────────────────────────────────────────
+# Reduced-precision (int16 fixed point) pyramid storage
+# ──────────────────────────────────────────────
+# Coefficients of a 0-255 range image lie in [-255, 255], so scaling by
+# 128 fits int16 with 1/128 resolution (finer than a 15-bit source step)
+# at half the bytes of float32. Arithmetic stays float32 inside kernels.
+# Float (HDR) frames may go beyond that range; see fits_int16.
+
+PYRAMID_INT16_SCALE = 128.0
+PYRAMID_INT16_RANGE = 32767 / PYRAMID_INT16_SCALE  # Largest storable magnitude
+
+
+def fits_int16(img, scale=1.0):
+    """
+    True if every Laplacian coefficient of img (times scale) can be stored
+    as int16 without saturating. Integer frames always fit (0-255 once
+    scaled); float frames (EXR, float TIFF) are checked by their range,
+    which bounds the top level and every detail coefficient.
+    """
+    if img.dtype.kind != "f":
+        return True
+    lo = float(np.min(img)) * scale
+    hi = float(np.max(img)) * scale
+    return max(abs(lo), abs(hi), hi - lo) <= PYRAMID_INT16_RANGE
+
+
+@nb.njit(
+    nb.void(nb.float32[::1], nb.int16[::1], nb.float32),
+    fastmath=True, parallel=True, cache=True,
+)
+def _quantize_kernel(src, dst, scale):
+    for i in nb.prange(src.shape[0]):
+        v = np.rint(src[i] * scale)
+        dst[i] = min(max(v, -32768.0), 32767.0)
+
+
+def quantize_level(level):
+    """float32 level -> int16 fixed point (saturating)."""
+    level = np.ascontiguousarray(level, dtype=np.float32)
+    out = np.empty(level.shape, dtype=np.int16)
+    _quantize_kernel(level.reshape(-1), out.reshape(-1), np.float32(PYRAMID_INT16_SCALE))
+    return out
+
+
+def quantize_pyramid(laplacian_pyr):
+    return [quantize_level(level) for level in laplacian_pyr]
+
+
+def dequantize_pyramid(laplacian_pyr):
+    inv_scale = np.float32(1.0 / PYRAMID_INT16_SCALE)
+    return [level.astype(np.float32) * inv_scale for level in laplacian_pyr]
+
+
+@nb.njit(
+    [nb.void(level, nb.float32[:, ::1], nb.boolean, nb.float32) for level in _LEVEL_TYPES],
+    fastmath=True, parallel=True, cache=True,
+)
+def _level_gray_kernel(level, out, planar, inv_scale):
+    for y in nb.prange(out.shape[0]):
+        row = out[y]
+        for x in range(out.shape[1]):
+            if planar:
+                b = np.float32(level[0, y, x])
+                g = np.float32(level[1, y, x])
+                r = np.float32(level[2, y, x])
+            else:
+                b = np.float32(level[y, x, 0])
+                g = np.float32(level[y, x, 1])
+                r = np.float32(level[y, x, 2])
+            row[x] = (0.114 * b + 0.587 * g + 0.299 * r) * inv_scale
+
+
+def quantized_level_gray(level, planar=False):
+    """Gray plane (0-255 units) of an int16 fixed-point BGR level."""
+    n_channels = level.shape[0] if planar else level.shape[2]
+    if n_channels == 1:
+        plane = level[0] if planar else level[:, :, 0]
+        return plane.astype(np.float32) * np.float32(1.0 / PYRAMID_INT16_SCALE)
+    hw = level.shape[1:] if planar else level.shape[:2]
+    out = np.empty(hw, dtype=np.float32)
+    _level_gray_kernel(level, out, planar, np.float32(1.0 / PYRAMID_INT16_SCALE))
+    return out
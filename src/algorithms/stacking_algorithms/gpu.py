@@ -121,8 +121,23 @@ def _cupy_gaussian_pyramid(img_gpu, num_levels):
     return pyr
 
 
-def _cupy_laplacian_pyramid(img_gpu, num_levels):
-    """Laplacian pyramid entirely on GPU. Returns list of CuPy arrays."""
+def _cupy_to_float32(img_gpu, scale=1.0):
+    """Promote a native-dtype frame to float32 (0-255) on the device."""
+    if img_gpu.dtype == cp.float32 and scale == 1.0:
+        return img_gpu
+    out = img_gpu.astype(cp.float32)
+    if scale != 1.0:
+        out *= cp.float32(scale)
+    return out
+
+
+def _cupy_laplacian_pyramid(img_gpu, num_levels, scale=1.0):
+    """
+    Laplacian pyramid entirely on GPU. Returns list of CuPy arrays.
+    img_gpu may hold a native uint8/uint16 frame (uploaded at its decoded
+    size); it is promoted to float32 times scale on the device.
+    """
+    img_gpu = _cupy_to_float32(img_gpu, scale)
     gauss = _cupy_gaussian_pyramid(img_gpu, num_levels)
     lap_pyr = [gauss[-1]]  # lowpass residual
     for i in range(num_levels, 0, -1):
@@ -195,7 +210,7 @@ def _cupy_fuse_pyramid_pair(pyr1, pyr2, kernel_size,
     All computation stays on GPU — no host transfers between steps.
     Supports contrast_threshold and feather_radius for soft blending.
     """
-    threshold_index = len(pyr1) - 1
+    threshold_index = max(1, len(pyr1) - 1)
     new_pyr = []
     current_focusmap = None
 
@@ -353,7 +368,7 @@ def _cupy_fuse_n_way_batch(images_np, num_levels, kernel_size, progress_callback
     # Upload all images and build pyramids on GPU
     pyramids = []
     for idx, img in enumerate(images_np):
-        img_gpu = cp.asarray(img if img.dtype == np.float32 else img.astype(np.float32))
+        img_gpu = cp.asarray(img if img.dtype in (np.uint8, np.float32) else img.astype(np.float32))
         pyr = _cupy_laplacian_pyramid(img_gpu, num_levels)
         pyramids.append(pyr)
         del img_gpu  # free the raw image (pyramid holds the data now)
@@ -449,11 +464,21 @@ def fuse_levels_fast(pyr_level1, pyr_level2, focusmap):
 # Pyramid operations
 # ══════════════════════════════════════════════
 
-def gaussian_pyramid(img, num_levels):
+def _to_float32(img, scale=1.0):
+    """Native-dtype frame -> float32 (0-255), converted and scaled in one pass."""
+    if img.dtype == np.float32 and scale == 1.0:
+        return img
+    out = img.astype(np.float32, order="C")
+    if scale != 1.0:
+        out *= np.float32(scale)
+    return out
+
+
+def gaussian_pyramid(img, num_levels, scale=1.0):
     """Calculate Gaussian pyramid."""
     if HAS_CV_CUDA:
-        return _gaussian_pyramid_cuda(img, num_levels)
-    lower = img if img.dtype == np.float32 else img.astype(np.float32)
+        return _gaussian_pyramid_cuda(img, num_levels, scale)
+    lower = _to_float32(img, scale)
     pyr = [lower]
     for _ in range(num_levels):
         lower = cv2.pyrDown(lower)
@@ -461,10 +486,10 @@ def gaussian_pyramid(img, num_levels):
     return pyr
 
 
-def _gaussian_pyramid_cuda(img, num_levels):
+def _gaussian_pyramid_cuda(img, num_levels, scale=1.0):
     """Gaussian pyramid using OpenCV CUDA."""
     gpu_mat = cv2.cuda_GpuMat()
-    gpu_mat.upload(img.astype(np.float32))
+    gpu_mat.upload(_to_float32(img, scale))
     gpu_mats = [gpu_mat]
     for _ in range(num_levels):
         gpu_mat = cv2.cuda.pyrDown(gpu_mat)
@@ -472,16 +497,16 @@ def _gaussian_pyramid_cuda(img, num_levels):
     return [g.download().astype(np.float32) for g in gpu_mats]
 
 
-def generate_laplacian_pyramid(img, num_levels):
-    """Generate Laplacian pyramid."""
+def generate_laplacian_pyramid(img, num_levels, scale=1.0):
+    """Generate Laplacian pyramid. img may be native uint8/uint16 (times scale)."""
     if HAS_CV_CUDA_PYRUP:
-        return _generate_laplacian_pyramid_cuda(img, num_levels)
-    return _generate_laplacian_pyramid_cpu(img, num_levels)
+        return _generate_laplacian_pyramid_cuda(img, num_levels, scale)
+    return _generate_laplacian_pyramid_cpu(img, num_levels, scale)
 
 
-def _generate_laplacian_pyramid_cuda(img, num_levels):
+def _generate_laplacian_pyramid_cuda(img, num_levels, scale=1.0):
     gpu_mat = cv2.cuda_GpuMat()
-    gpu_mat.upload(img.astype(np.float32))
+    gpu_mat.upload(_to_float32(img, scale))
     gpu_gauss = [gpu_mat]
     for _ in range(num_levels):
         gpu_mat = cv2.cuda.pyrDown(gpu_mat)
@@ -495,8 +520,8 @@ def _generate_laplacian_pyramid_cuda(img, num_levels):
     return lap_pyr
 
 
-def _generate_laplacian_pyramid_cpu(img, num_levels):
-    gauss = gaussian_pyramid(img, num_levels)
+def _generate_laplacian_pyramid_cpu(img, num_levels, scale=1.0):
+    gauss = gaussian_pyramid(img, num_levels, scale)
     lap_pyr = [gauss[-1]]
     for i in range(num_levels, 0, -1):
         size = (gauss[i - 1].shape[1], gauss[i - 1].shape[0])
@@ -586,7 +611,7 @@ def _fuse_cupy(pyr1, pyr2, kernel_size):
 
 def _fuse_cpu_vectorized(pyr1, pyr2, kernel_size):
     """Fuse using CPU vectorized ops (Tier 3 fallback)."""
-    threshold_index = len(pyr1) - 1
+    threshold_index = max(1, len(pyr1) - 1)
     new_pyr = []
     current_focusmap = None
 
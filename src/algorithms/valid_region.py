@@ -0,0 +1,104 @@
+"""
+    Valid-region geometry for auto-crop.
+    Every aligned frame is produced by warping its source with a 2x3
+    inverse-map matrix; an output pixel only holds real data when it
+    samples inside the source. The footprint of a frame is therefore a
+    convex quadrilateral, and the part of the stack that is valid in
+    every frame is the intersection of those footprints.
+
+    Regions are described per output row as an inclusive [left, right]
+    span of valid x positions (right < left means the row is empty).
+"""
+import numpy as np
+
+_EPS = 1e-6
+
+
+def new_spans(shape):
+    """Spans covering the whole (h, w) frame."""
+    h, w = shape[:2]
+    return np.zeros(h, dtype=np.float64), np.full(h, w - 1, dtype=np.float64)
+
+
+def intersect_footprint(spans, matrix, shape):
+    """
+    Narrow spans (in place) to the footprint of one warped frame.
+    matrix maps output (x, y) to source coordinates (cv2.WARP_INVERSE_MAP
+    convention). A pixel is valid when its bilinear sample lies entirely
+    inside the source: 0 <= sx <= w - 1 and 0 <= sy <= h - 1.
+    """
+    left, right = spans
+    h, w = shape[:2]
+    ys = np.arange(len(left), dtype=np.float64)
+    for row, limit in ((0, w - 1), (1, h - 1)):
+        a = float(matrix[row][0])
+        b = float(matrix[row][1]) * ys + float(matrix[row][2])
+        if abs(a) < 1e-12:
+            # Constraint does not depend on x: the row is all in or all out
+            outside = (b < -_EPS) | (b > limit + _EPS)
+            right[outside] = -1.0
+            continue
+        lo = -b / a
+        hi = (limit - b) / a
+        np.maximum(left, np.minimum(lo, hi), out=left)
+        np.minimum(right, np.maximum(lo, hi), out=right)
+    return spans
+
+
+def integer_spans(spans):
+    """Round float spans inward to whole pixels."""
+    left, right = spans
+    return (np.ceil(left - _EPS).astype(np.int64),
+            np.floor(right + _EPS).astype(np.int64))
+
+
+def bounding_box(spans):
+    """Bounding box (x0, y0, x1, y1), exclusive ends, of the valid region."""
+    left, right = integer_spans(spans)
+    rows = np.nonzero(right >= left)[0]
+    if len(rows) == 0:
+        return None
+    return (int(left[rows].min()), int(rows[0]),
+            int(right[rows].max()) + 1, int(rows[-1]) + 1)
+
+
+def largest_rectangle(spans):
+    """
+    Largest axis-aligned rectangle (x0, y0, x1, y1), exclusive ends,
+    inside the valid region. Returns None if the region is empty.
+
+    For a fixed top row the best rectangle of every height follows from
+    running max/min of the row spans, so each candidate top row costs one
+    vectorized pass. Only rows where the span widens (or that follow an
+    empty row) can be optimal tops: otherwise extending the rectangle one
+    row up never loses width.
+    """
+    left, right = integer_spans(spans)
+    h = len(left)
+    valid = right >= left
+    if not valid.any():
+        return None
+
+    prev_valid = np.concatenate(([False], valid[:-1]))
+    widens = np.zeros(h, dtype=bool)
+    widens[1:] = (left[1:] < left[:-1]) | (right[1:] > right[:-1])
+    candidates = np.nonzero(valid & (~prev_valid | widens))[0]
+
+    best_area = 0
+    best = None
+    for y0 in candidates:
+        run_left = np.maximum.accumulate(left[y0:])
+        run_right = np.minimum.accumulate(right[y0:])
+        widths = run_right - run_left + 1
+        # Stop at the first row that empties the rectangle
+        empty = np.nonzero(widths <= 0)[0]
+        if len(empty):
+            widths = widths[:empty[0]]
+        if len(widths) == 0:
+            continue
+        areas = widths * np.arange(1, len(widths) + 1)
+        k = int(np.argmax(areas))
+        if areas[k] > best_area:
+            best_area = int(areas[k])
+            best = (int(run_left[k]), int(y0), int(run_right[k]) + 1, int(y0) + k + 1)
+    return best
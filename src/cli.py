@@ -5,27 +5,31 @@
     Usage:
         python -m src.cli --input images/*.jpg --output result.tif
         python -m src.cli --input img1.jpg img2.jpg img3.jpg --output stacked.png --align
+        capture_tool | python -m src.cli --input - --output stacked.tif --align
 """
 import os
 os.environ.setdefault('OPENCV_IO_ENABLE_OPENEXR', '1')
 
 import argparse
 import glob
+import stat
 import sys
 import time
 
-import cv2
-import numpy as np
-
 # Allow imports from top-level folder
 currentdir = os.path.dirname(os.path.realpath(__file__))
 parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
 
-from src.config import AlgorithmConfig, AppConfig, auto_detect_params
+from src.config import AlgorithmConfig, AppConfig, ALIGNMENT_OUTLIER_POLICIES
 import src.settings as settings
 from src.algorithms.API import LaplacianPyramid
+from src.algorithms import auto_tune
 from src.ImageLoadingHandler import ImageLoadingHandler
+import src.frame_sources as frame_sources
+import src.ImageSavingHandler as ImageSavingHandler
+
+QUALITY_REPORT_FACTOR = 4  # Quality report sharpness is measured on 1/4-scale decodes
 
 
 def parse_args():
@@ -37,12 +41,15 @@ def parse_args():
         "--input", "-i",
         nargs="+",
         required=True,
-        help="Input image files or glob patterns",
+        help="Input image files or glob patterns (a multi-page TIFF or video stands for all its frames), "
+             "or '-' / a named pipe to stack frames streamed as PNG, JPEG or raw frames",
     )
     parser.add_argument(
         "--output", "-o",
+        nargs="+",
         required=True,
-        help="Output file path (supports .jpg, .png, .tif)",
+        help="Output file path(s) (supports .jpg, .png, .tif, .exr); several outputs are "
+             "encoded in parallel from one result",
     )
     parser.add_argument(
         "--align",
@@ -86,6 +93,19 @@ def parse_args():
         default=False,
         help="Enable rotation + scale alignment (focus breathing correction)",
     )
+    parser.add_argument(
+        "--min-confidence",
+        type=float,
+        default=0.0,
+        help="Treat frames whose alignment confidence is below this as outliers "
+             "(0-1, default: 0 = off)",
+    )
+    parser.add_argument(
+        "--outlier-policy",
+        choices=ALIGNMENT_OUTLIER_POLICIES,
+        default="realign",
+        help="Outlier handling: realign with ECC then drop, drop, or keep (default: realign)",
+    )
     parser.add_argument(
         "--gpu",
         action="store_true",
@@ -114,13 +134,43 @@ def parse_args():
         "--auto",
         action="store_true",
         default=False,
-        help="Auto-detect optimal parameters based on image size",
+        help="Auto-tune parameters from the image size and sampled frames' content",
     )
     parser.add_argument(
         "--auto-crop",
         action="store_true",
         default=False,
-        help="Auto-crop black edges from alignment shifts",
+        help="Crop to the region covered by every aligned frame (removes black edges)",
+    )
+    parser.add_argument(
+        "--tone-map",
+        type=float,
+        default=0.3,
+        help="Laplacian tone-map strength, 0 = off, 1 = full (default: 0.3)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Frames loaded/aligned ahead of fusion in parallel (default: 0 = auto)",
+    )
+    parser.add_argument(
+        "--read-ahead",
+        type=int,
+        default=256,
+        help="MB of input files read ahead of decoding, 0 = off (default: 256)",
+    )
+    parser.add_argument(
+        "--raw-workers",
+        type=int,
+        default=0,
+        help="Processes developing RAW frames in parallel, 1 = in-process (default: 0 = one per core)",
+    )
+    parser.add_argument(
+        "--hierarchical",
+        action="store_true",
+        default=False,
+        help="Skip fine-level blocks where the fused result was clearly sharper one level coarser (faster)",
     )
     parser.add_argument(
         "--bit-depth",
@@ -129,6 +179,38 @@ def parse_args():
         default=8,
         help="Output bit depth: 8 (default) or 16. 16-bit supported for PNG and TIFF.",
     )
+    parser.add_argument(
+        "--compression",
+        type=int,
+        choices=range(10),
+        default=4,
+        metavar="0-9",
+        help="PNG/TIFF compression level (default: 4)",
+    )
+    parser.add_argument(
+        "--tiff-codec",
+        choices=ImageSavingHandler.TIFF_CODECS,
+        default="deflate",
+        help="TIFF compression; zstd needs the zstandard package (default: deflate)",
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        default=0,
+        help="Write tiled TIFF with square tiles of this size, a multiple of 16 (default: 0 = strips)",
+    )
+    parser.add_argument(
+        "--bigtiff",
+        action="store_true",
+        default=False,
+        help="Always write BigTIFF (default: only when the image could exceed 4 GB)",
+    )
+    parser.add_argument(
+        "--write-threads",
+        type=int,
+        default=0,
+        help="Threads compressing PNG/TIFF output (default: 0 = one per core)",
+    )
     return parser.parse_args()
 
 
@@ -146,6 +228,20 @@ def expand_input_paths(patterns):
     return sorted(set(paths))
 
 
+def open_input_stream(inputs):
+    """Binary stream of frames for '-' (stdin) or a single named pipe, else None."""
+    if len(inputs) != 1:
+        return None
+    if inputs[0] == "-":
+        return sys.stdin.buffer
+    try:
+        if stat.S_ISFIFO(os.stat(inputs[0]).st_mode):
+            return open(inputs[0], "rb")
+    except OSError:
+        pass
+    return None
+
+
 class ProgressTracker:
     """CLI progress display with bar, ETA, and speed."""
     def __init__(self):
@@ -174,37 +270,68 @@ class ProgressTracker:
             print(f"\n  Completed in {elapsed:.1f}s (avg {avg_time:.2f}s/image)", file=sys.stderr)
 
 
+class StreamProgressTracker:
+    """CLI progress for streamed input, whose frame count is not known."""
+    def __init__(self):
+        self.start_time = time.time()
+        self.frames = 0
+
+    def __call__(self, current, total, time_taken):
+        self.frames = current
+        print(f"\r  Received {current} frames, {time_taken:.1f}s/img   ", end="", file=sys.stderr)
+
+    def finish(self):
+        print(f"\n  Completed {self.frames} frames in {time.time() - self.start_time:.1f}s",
+              file=sys.stderr)
+
+
 def main():
     args = parse_args()
 
     # Initialize settings for backward compatibility
     settings.init()
 
-    # Expand input paths
-    input_paths = expand_input_paths(args.input)
-    if len(input_paths) < 2:
-        print(f"Error: Need at least 2 images, got {len(input_paths)}", file=sys.stderr)
-        sys.exit(1)
+    # Frames piped in are stacked as they arrive; nothing is known up front
+    input_stream = open_input_stream(args.input)
+    if input_stream is not None:
+        input_paths = []
+        if args.auto:
+            print("Warning: --auto needs the frames up front; ignored for streamed input",
+                  file=sys.stderr)
+            args.auto = False
+    else:
+        # Expand input paths; containers become one entry per frame
+        input_paths = frame_sources.expand_paths(expand_input_paths(args.input))
+        if len(input_paths) < 2:
+            print(f"Error: Need at least 2 images, got {len(input_paths)}", file=sys.stderr)
+            sys.exit(1)
 
     print(f"ChimpStackr CLI - Focus Stacking")
-    print(f"  Input: {len(input_paths)} images")
-    print(f"  Output: {args.output}")
+    if input_stream is not None:
+        print(f"  Input: frames streamed from {'stdin' if args.input[0] == '-' else args.input[0]}")
+    else:
+        print(f"  Input: {len(input_paths)} images")
+    print(f"  Output: {', '.join(args.output)}")
     print(f"  Mode: {'Align + Stack' if args.align else 'Stack only'}")
     # Auto-detect parameters from first image if requested
     kernel_size = args.kernel_size
     pyramid_levels = args.pyramid_levels
     scale_factor = args.scale_factor
 
+    tuned = {}
     if args.auto:
-        loader = ImageLoadingHandler()
-        sample = loader.read_image_from_path(input_paths[0])
-        if sample is not None:
-            auto = auto_detect_params(sample.shape, len(input_paths))
+        # Measured from a few sampled frames (noise, shift, detail scale)
+        auto = auto_tune.tune_params(input_paths)
+        if auto is not None:
             kernel_size = auto["fusion_kernel_size"]
             pyramid_levels = auto["pyramid_num_levels"]
             scale_factor = auto["alignment_scale_factor"]
+            tuned = {key: auto[key] for key in ("feather_radius", "contrast_threshold")}
             print(f"  Auto-detected: kernel={kernel_size}, levels={pyramid_levels}, scale={scale_factor}")
-            del sample
+            if "measurements" in auto:
+                m = auto["measurements"]
+                print(f"  Measured: noise={m['noise_sigma']:.2f}, "
+                      f"max shift={m['max_shift']:.1f}px")
 
     print(f"  Method: {args.method}")
     print(f"  Kernel size: {kernel_size}, Pyramid levels: {pyramid_levels}")
@@ -223,91 +350,139 @@ def main():
         selected_gpu_id=args.gpu_id,
         alignment_reference=args.alignment_ref,
         align_rotation_scale=args.rotation_scale,
+        alignment_min_confidence=args.min_confidence,
+        alignment_outlier_policy=args.outlier_policy,
+        auto_crop=args.auto_crop and args.align,
+        tone_map_strength=args.tone_map,
+        pipeline_workers=args.workers,
+        read_ahead_mb=args.read_ahead,
+        raw_decode_workers=args.raw_workers,
+        hierarchical_fusion=args.hierarchical,
+        **tuned,
     )
 
     algo = LaplacianPyramid(config=config)
     algo.update_image_paths(input_paths)
 
-    # Quality report on inputs
-    if args.quality_report:
-        loader = ImageLoadingHandler()
-        print("\n  Input image sharpness:")
+    # Quality report on inputs (all sharpness figures at the same reduced scale)
+    loader = ImageLoadingHandler()
+    if args.quality_report and input_stream is None:
+        print(f"\n  Input image sharpness (1/{QUALITY_REPORT_FACTOR} scale):")
         for path in input_paths:
-            img = loader.read_image_from_path(path)
+            img = loader.read_reduced(path, QUALITY_REPORT_FACTOR)
             if img is not None:
                 sharpness = ImageLoadingHandler.compute_sharpness(img)
                 print(f"    {os.path.basename(path)}: {sharpness:.1f}")
 
+    # Output formats: EXR is always 32-bit float, JPEG only supports 8-bit
+    outputs = [(path, ImageSavingHandler.output_bit_depth(path, args.bit_depth))
+               for path in args.output]
+    for path, bit_depth in outputs:
+        if bit_depth == 8 and args.bit_depth == 16:
+            print(f"Warning: JPEG does not support 16-bit. Saving {path} as 8-bit.", file=sys.stderr)
+
+    writer_options = dict(
+        workers=args.write_threads,
+        codec=args.tiff_codec,
+        tile_size=args.tile_size,
+        bigtiff=True if args.bigtiff else None,
+    )
+    try:
+        if any(os.path.splitext(path)[1].lower() in (".tif", ".tiff") for path, _ in outputs):
+            # Reject bad TIFF options before stacking rather than after
+            ImageSavingHandler.check_tiff_options(args.tiff_codec, args.tile_size)
+        if len(outputs) == 1:
+            # A single PNG/TIFF is written strip by strip during reconstruction
+            algo.stream_output_to(outputs[0][0], outputs[0][1], args.compression, **writer_options)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    # Header-only check that the frames fit together, before any decoding
+    errors, warnings = algo.validate_frames(align=args.align) if input_stream is None else ([], [])
+    for message in warnings:
+        print(f"Warning: {message}", file=sys.stderr)
+    if errors:
+        print("Error: Frames differ in size and cannot be stacked without --align:\n  "
+              + "\n  ".join(errors), file=sys.stderr)
+        sys.exit(1)
+
     # Run stacking
     print()
-    progress = ProgressTracker()
     total_start = time.time()
 
-    if args.align:
-        algo.align_and_stack_images(progress_callback=progress)
+    if input_stream is not None:
+        progress = StreamProgressTracker()
+        frames = frame_sources.FrameStream(input_stream, decode=loader.decode_native)
+        try:
+            algo.stack_stream(frames, align=args.align, progress_callback=progress)
+        except (ValueError, EOFError) as e:
+            print(f"\nError: {e}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            frames.close()
+        progress.finish()
+    elif args.align:
+        algo.align_and_stack_images(progress_callback=ProgressTracker())
     else:
-        algo.stack_images(progress_callback=progress)
+        algo.stack_images(progress_callback=ProgressTracker())
 
     total_elapsed = time.time() - total_start
 
-    if algo.output_image is None:
-        print("Error: Stacking failed or was cancelled", file=sys.stderr)
-        sys.exit(1)
+    if algo.rejected_frames:
+        print(f"  Dropped {len(algo.rejected_frames)} low-confidence frame(s): "
+              + ", ".join(os.path.basename(p) for p in algo.rejected_frames))
 
-    # Auto-crop if requested
-    if args.auto_crop and args.align:
-        bounds = algo.auto_crop_output()
-        if bounds:
-            top, bottom, left, right = bounds
-            print(f"  Auto-cropped: {top}px top, {bottom}px bottom, {left}px left, {right}px right")
-
-    # Save output
-    ext = os.path.splitext(args.output)[1].lower()
-    bit_depth = args.bit_depth
-
-    # EXR always uses 32-bit float
-    if ext == ".exr":
-        bit_depth = 32
-
-    # JPG only supports 8-bit
-    if bit_depth == 16 and ext in (".jpg", ".jpeg"):
-        print("Warning: JPEG does not support 16-bit. Saving as 8-bit.", file=sys.stderr)
-        bit_depth = 8
-
-    if bit_depth == 32:
-        # EXR: 32-bit float in 0-1 range
-        result = np.clip(algo.output_image, 0, 255).astype(np.float32) / 255.0
-        depth_str = "32-bit float"
-    elif bit_depth == 16:
-        # Scale 0-255 float32 -> 0-65535 uint16
-        result = np.clip(algo.output_image, 0, 255) * 257.0
-        result = np.around(result).astype(np.uint16)
-        depth_str = "16-bit"
-    else:
-        result = np.clip(np.around(algo.output_image), 0, 255).astype(np.uint8)
-        depth_str = "8-bit"
-
-    # Determine compression params
-    params = None
-    if ext in (".jpg", ".jpeg"):
-        params = [cv2.IMWRITE_JPEG_QUALITY, args.quality]
-    elif ext == ".png":
-        params = [cv2.IMWRITE_PNG_COMPRESSION, 4]
-
-    success = cv2.imwrite(args.output, result, params)
-    if not success:
-        print(f"Error: Failed to write output to {args.output}", file=sys.stderr)
+    if algo.output_image is None and algo.output_path is None:
+        print("Error: Stacking failed or was cancelled", file=sys.stderr)
         sys.exit(1)
 
-    file_size = os.path.getsize(args.output)
-    print(f"  Output saved: {args.output} ({depth_str}, {file_size / 1024:.0f} KB)")
+    # Auto-crop (config.auto_crop) was applied by the stacking run
+    if algo.crop_bounds:
+        top, bottom, left, right = algo.crop_bounds
+        print(f"  Auto-cropped: {top}px top, {bottom}px bottom, {left}px left, {right}px right")
+
+    # Save outputs (already written if it was streamed)
+    result = None
+    if algo.output_path is None:
+        result = algo.output_image
+        if len(outputs) == 1:
+            path, bit_depth = outputs[0]
+            try:
+                ImageSavingHandler.save_image(path, result, bit_depth, args.quality,
+                                              args.compression, **writer_options)
+            except (OSError, ValueError) as e:
+                print(f"Error: Failed to write output to {path}: {e}", file=sys.stderr)
+                sys.exit(1)
+        else:
+            # Quantised once per bit depth, all formats encoded in parallel
+            failed = [
+                (path, error) for path, error in ImageSavingHandler.export_batch(
+                    result, outputs, args.quality, args.compression, **writer_options)
+                if error is not None
+            ]
+            for path, error in failed:
+                print(f"Error: Failed to write output to {path}: {error}", file=sys.stderr)
+            if failed:
+                sys.exit(1)
+
+    for path, bit_depth in outputs:
+        depth_str = {32: "32-bit float", 16: "16-bit", 8: "8-bit"}[bit_depth]
+        print(f"  Output saved: {path} ({depth_str}, {os.path.getsize(path) / 1024:.0f} KB)")
     print(f"  Total time: {total_elapsed:.2f}s")
-    print(f"  Output shape: {result.shape}")
-
-    # Quality report on output
+    if algo.pipeline_stats is not None:
+        stats = algo.pipeline_stats
+        print(f"  Pipeline: {stats.workers} workers, stalled {stats.stall_time:.2f}s "
+              f"waiting for frames")
+    if result is not None:
+        print(f"  Output shape: {result.shape}")
+
+    # Quality report on output, read back like the inputs
     if args.quality_report:
-        sharpness = ImageLoadingHandler.compute_sharpness(result)
-        print(f"  Output sharpness: {sharpness:.1f}")
+        img = loader.read_reduced(outputs[0][0], QUALITY_REPORT_FACTOR)
+        if img is not None:
+            sharpness = ImageLoadingHandler.compute_sharpness(img)
+            print(f"  Output sharpness (1/{QUALITY_REPORT_FACTOR} scale): {sharpness:.1f}")
 
 
 if __name__ == "__main__":
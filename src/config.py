@@ -23,8 +23,21 @@ SUPPORTED_RAW_FORMATS = [
 ]
 
 
+# Video containers read frame by frame (OpenCV VideoCapture)
+SUPPORTED_VIDEO_FORMATS = ["avi", "mp4", "mov", "mkv", "m4v", "mpg", "mpeg", "wmv"]
+
+
 STACKING_METHODS = ["laplacian", "weighted_average", "depth_map", "exposure_fusion"]
 
+# What to do with frames whose alignment confidence is below the threshold
+ALIGNMENT_OUTLIER_POLICIES = ["realign", "drop", "keep"]
+
+# Memory layout of Laplacian pyramid levels: (H, W, C) or (C, H, W)
+PYRAMID_LAYOUTS = ["interleaved", "planar"]
+
+# Laplacian pyramid coefficient storage (int16 is fixed point, 1/128 step)
+PYRAMID_DTYPES = ["float32", "int16"]
+
 
 def auto_detect_params(image_shape, num_images):
     """
@@ -91,6 +104,17 @@ class AlgorithmConfig:
     contrast_threshold: float = 0.0  # Laplacian: min contrast to switch (0 = off)
     feather_radius: int = 2  # Laplacian: blur radius for soft focusmap edges (0 = hard)
     depthmap_smoothing: int = 5  # Depth map: smoothing radius for focus map (higher = smoother)
+    alignment_min_confidence: float = 0.0  # Frames correlating below this once aligned are outliers (0 = off)
+    alignment_outlier_policy: str = "realign"  # "realign" (retry with ECC, else drop), "drop", "keep"
+    auto_crop: bool = False  # Crop to the region valid in every aligned frame; fusion skips the rest
+    pyramid_layout: str = "interleaved"  # Laplacian: "interleaved" (H, W, C) or "planar" (C, H, W), CPU only
+    pyramid_dtype: str = "float32"  # Laplacian: "float32" or "int16" (half the pyramid memory), CPU only
+    tone_map_strength: float = 0.3  # Laplacian: float base-luminance tone map after reconstruction (0 = off)
+    pipeline_workers: int = 0  # Laplacian CPU: frames aligned/pyramided in flight (0 = auto from cores, memory, stage times)
+    pipeline_memory_mb: int = 0  # Memory budget for in-flight frames (0 = half of free memory)
+    read_ahead_mb: int = 256  # Frame files read ahead of decoding on an I/O thread (0 = off)
+    raw_decode_workers: int = 0  # RAW frames developed ahead in worker processes (0 = one per core, 1 = in-process)
+    hierarchical_fusion: bool = False  # Laplacian CPU: skip fine-level blocks where the fused result was clearly sharper one level coarser
 
 
 @dataclass
@@ -0,0 +1,453 @@
+"""
+    Frames stored inside one container file: multi-page TIFF z-stacks and
+    video files (e.g. uncompressed AVI from a microscope rig).
+    Instead of exploding a container into one file per frame, every frame
+    is addressed by a FrameRef, a path-like string "<container>#<index>"
+    that carries its container and index. FrameRefs go wherever image
+    paths go (LaplacianPyramid.image_paths, the ImageLoadingHandler
+    loaders, probe), and frames are decoded lazily, one at a time, with
+    random access by index.
+
+    Frames can also arrive as a stream (FrameStream): encoded images or
+    raw frames concatenated on stdin or a named pipe, read in order and
+    never written to disk.
+"""
+import os
+import queue
+import struct
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from src.config import SUPPORTED_VIDEO_FORMATS
+
+try:
+    import tifffile
+    HAS_TIFFFILE = True
+except ImportError:
+    HAS_TIFFFILE = False
+
+logger = logging.getLogger(__name__)
+
+MULTIPAGE_FORMATS = ("tif", "tiff")
+_MAX_OPEN_SOURCES = 8
+
+
+class FrameRef(str):
+    """Frame index of a container, usable as an image path."""
+
+    def __new__(cls, container, index, width=4):
+        ref = super().__new__(cls, f"{container}#{index:0{width}d}")
+        ref.container = container
+        ref.index = index
+        return ref
+
+    def __reduce__(self):
+        return FrameRef, (self.container, self.index, len(self) - len(self.container) - 1)
+
+
+def parse_frame_ref(path):
+    """
+    FrameRef for path, also when it arrives as a plain string (e.g. from
+    the command line or a Qt signal). None for ordinary file paths.
+    """
+    if isinstance(path, FrameRef):
+        return path
+    container, sep, index = path.rpartition("#")
+    if not sep or not index.isdigit() or os.path.exists(path) or not os.path.isfile(container):
+        return None
+    return FrameRef(container, int(index), len(index))
+
+
+class FrameSource(ABC):
+    """
+    Random access to the frames of one container file. Reads are
+    serialised with close(); a closed source reopens on its next read,
+    so a shared source can be closed while other threads still use it.
+    """
+
+    kind = None
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._open()
+        self._is_open = True
+
+    @abstractmethod
+    def __len__(self):
+        ...
+
+    @abstractmethod
+    def _open(self):
+        """Open the container (again, after close)."""
+
+    @abstractmethod
+    def _read(self, index):
+        """Frame index of the open container (BGR or gray, native dtype); None on failure."""
+
+    @abstractmethod
+    def _close(self):
+        """Release the open container."""
+
+    def read(self, index):
+        """Frame index as decoded (BGR or gray, native dtype); None on failure."""
+        if not 0 <= index < len(self):
+            return None
+        with self._lock:
+            if not self._is_open:
+                self._open()
+                self._is_open = True
+            return self._read(index)
+
+    def close(self):
+        with self._lock:
+            if self._is_open:
+                self._close()
+                self._is_open = False
+
+    def refs(self):
+        width = max(4, len(str(len(self) - 1)))
+        return [FrameRef(self.path, i, width) for i in range(len(self))]
+
+
+class MultiPageTiff(FrameSource):
+    """
+    Pages of a TIFF. With tifffile the file stays open and pages are read
+    directly; otherwise OpenCV decodes one page per call.
+    """
+
+    kind = "tiff"
+
+    def _open(self):
+        self._tif = tifffile.TiffFile(self.path) if HAS_TIFFFILE else None
+        self._count = len(self._tif.pages) if self._tif is not None else cv2.imcount(self.path)
+
+    def __len__(self):
+        return self._count
+
+    def _read(self, index):
+        if self._tif is not None:
+            img = self._tif.pages[index].asarray()
+            if img.ndim == 3 and img.shape[2] in (3, 4):
+                img = cv2.cvtColor(img, cv2.COLOR_RGBA2BGR if img.shape[2] == 4 else cv2.COLOR_RGB2BGR)
+            return img
+        ok, pages = cv2.imreadmulti(self.path, start=index, count=1, flags=cv2.IMREAD_UNCHANGED)
+        return pages[0] if ok and pages else None
+
+    def _close(self):
+        if self._tif is not None:
+            self._tif.close()
+
+
+class VideoFrames(FrameSource):
+    """
+    Frames of a video through OpenCV. Reads in frame order continue the
+    stream; anything else seeks first. One capture is shared, so reads
+    are serialised.
+    """
+
+    kind = "video"
+
+    def _open(self):
+        self._capture = cv2.VideoCapture(self.path)
+        if not self._capture.isOpened():
+            raise OSError(f"Cannot open video: {self.path}")
+        self._count = int(self._capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.width = int(self._capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self._capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self._next = 0
+
+    def __len__(self):
+        return self._count
+
+    def _read(self, index):
+        if index != self._next:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ok, frame = self._capture.read()
+        self._next = index + 1 if ok else -1
+        return frame if ok else None
+
+    def _close(self):
+        self._capture.release()
+
+
+def open_frame_source(path):
+    """FrameSource for a video or a TIFF of more than one page, else None."""
+    ext = os.path.splitext(path)[1][1:].lower()
+    try:
+        if ext in SUPPORTED_VIDEO_FORMATS:
+            return VideoFrames(path)
+        if ext in MULTIPAGE_FORMATS:
+            source = MultiPageTiff(path)
+            if len(source) > 1:
+                return source
+            source.close()
+    except Exception as e:
+        logger.error("Failed to open frames of %s: %s", path, e)
+    return None
+
+
+_open_sources = OrderedDict()  # (abspath, mtime_ns) -> FrameSource, least recently used first
+_sources_lock = threading.Lock()
+
+
+def frame_source(container):
+    """
+    Shared open FrameSource of container (kept open across frame reads).
+    Beyond _MAX_OPEN_SOURCES the least recently used source is closed;
+    it reopens if a reader still holding it reads again.
+    """
+    try:
+        key = (os.path.abspath(container), os.stat(container).st_mtime_ns)
+    except OSError:
+        return None
+    with _sources_lock:
+        source = _open_sources.get(key)
+        if source is not None:
+            _open_sources.move_to_end(key)
+            return source
+        source = open_frame_source(container)
+        if source is None:
+            return None
+        if len(_open_sources) >= _MAX_OPEN_SOURCES:
+            _, oldest = _open_sources.popitem(last=False)
+            oldest.close()
+        _open_sources[key] = source
+        return source
+
+
+def _may_hold_frames(path):
+    """
+    False for paths that are certainly single images. TIFFs are told
+    apart by their cached header probe, so single-page ones are never
+    opened as a MultiPageTiff; headers the probe cannot parse (e.g.
+    BigTIFF) are left to open_frame_source.
+    """
+    ext = os.path.splitext(path)[1][1:].lower()
+    if ext in SUPPORTED_VIDEO_FORMATS:
+        return True
+    if ext not in MULTIPAGE_FORMATS:
+        return False
+    from src.ImageLoadingHandler import ImageLoadingHandler  # Imports this module
+    meta = ImageLoadingHandler().probe(path)
+    return meta is None or meta.multipage
+
+
+def expand_paths(paths):
+    """paths with every container replaced by FrameRefs to its frames."""
+    expanded = []
+    for path in paths:
+        source = None
+        if not isinstance(path, FrameRef) and _may_hold_frames(path):
+            source = frame_source(path)
+        if source is not None:
+            expanded.extend(source.refs())
+        else:
+            expanded.append(path)
+    return expanded
+
+
+# ─── Streamed frames ───
+#
+# A stream is frames back to back, each one either an encoded PNG or JPEG
+# file, or a raw frame: RAW_FRAME_MAGIC, then little-endian uint32 width,
+# height and channels and a uint32 bytes per sample (1 or 2), then the
+# interleaved BGR (or gray) samples, little-endian for 16-bit.
+
+RAW_FRAME_MAGIC = b"CSFR"
+_RAW_HEADER = struct.Struct("<4sIIII")
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def write_raw_frame(f, img):
+    """Write img (uint8/uint16, BGR or gray) to f as one raw stream frame."""
+    if img.dtype not in (np.uint8, np.uint16):
+        raise ValueError(f"Raw frames are uint8 or uint16, not {img.dtype}")
+    channels = img.shape[2] if img.ndim == 3 else 1
+    f.write(_RAW_HEADER.pack(RAW_FRAME_MAGIC, img.shape[1], img.shape[0],
+                             channels, img.dtype.itemsize))
+    f.write(np.ascontiguousarray(img, dtype=img.dtype.newbyteorder("<")).tobytes())
+
+
+class _PeekReader:
+    """
+    Lookahead over any binary stream, without taking ownership of it.
+    Reads return what is available (one read1() at most), so a live pipe
+    never blocks for bytes beyond the frame being parsed.
+    """
+
+    def __init__(self, f):
+        self._read_some = getattr(f, "read1", f.read)
+        self._buffer = b""
+
+    def peek(self, n):
+        if not self._buffer:
+            self._buffer = self._read_some(n)
+        return self._buffer
+
+    def read(self, n):
+        if not self._buffer:
+            return self._read_some(n)
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+
+def _read_exact(f, n):
+    data = f.read(n)
+    while len(data) < n:
+        more = f.read(n - len(data))
+        if not more:
+            raise EOFError(f"Stream ended inside a frame ({len(data)} of {n} bytes)")
+        data += more
+    return data
+
+
+def _read_png(f, head):
+    parts = [head, _read_exact(f, len(_PNG_SIGNATURE) - len(head))]
+    while True:
+        chunk_head = _read_exact(f, 8)
+        length, kind = struct.unpack(">I4s", chunk_head)
+        parts += [chunk_head, _read_exact(f, length + 4)]  # Data + CRC
+        if kind == b"IEND":
+            return b"".join(parts)
+
+
+def _scan_entropy(f, parts):
+    """
+    Consume entropy-coded data up to the next marker (stuffed FF00 and
+    restart markers are data). Returns the marker code; its FF and code
+    bytes are already in parts.
+    """
+    while True:
+        chunk = f.peek(1 << 16)
+        if not chunk:
+            raise EOFError("Stream ended inside JPEG scan data")
+        i = chunk.find(b"\xff")
+        if i < 0:
+            parts.append(f.read(len(chunk)))
+            continue
+        parts.append(f.read(i + 1))
+        code = _read_exact(f, 1)
+        while code == b"\xff":  # Fill bytes
+            parts.append(code)
+            code = _read_exact(f, 1)
+        parts.append(code)
+        if code[0] != 0 and not 0xD0 <= code[0] <= 0xD7:
+            return code[0]
+
+
+def _read_jpeg(f, head):
+    """
+    One JPEG: marker segments up to each scan, the scan's entropy data
+    up to the marker that follows it (progressive files have several
+    scans), until EOI.
+    """
+    parts = [head]
+    marker = None
+    while True:
+        if marker is None:
+            code = _read_exact(f, 2)
+            if code[0] != 0xFF:
+                raise ValueError("Corrupt JPEG in stream: expected a marker")
+            parts.append(code)
+            marker = code[1]
+        if marker == 0xD9:  # EOI
+            return b"".join(parts)
+        if marker == 0xFF or marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            marker = None  # No length field
+            continue
+        length_bytes = _read_exact(f, 2)
+        parts += [length_bytes, _read_exact(f, struct.unpack(">H", length_bytes)[0] - 2)]
+        marker = _scan_entropy(f, parts) if marker == 0xDA else None
+
+
+class FrameStream:
+    """
+    Iterate the frames of a binary stream (sys.stdin.buffer, an open
+    FIFO, ...) in arrival order. A reader thread parses up to read_ahead
+    frames ahead, so decoding overlaps the producer writing the next
+    one. Raw frames are returned as sent; encoded frames go through
+    decode(bytes) (e.g. ImageLoadingHandler.decode_native), default
+    cv2.imdecode. Ends at the end of the stream; a truncated or
+    unrecognised frame raises from the iteration.
+    """
+
+    def __init__(self, fileobj, decode=None, read_ahead=2):
+        self._file = _PeekReader(fileobj)
+        self._decode = decode or (lambda buf: cv2.imdecode(
+            np.frombuffer(buf, dtype=np.uint8), cv2.IMREAD_UNCHANGED))
+        self._queue = queue.Queue(maxsize=max(1, read_ahead))
+        self._stop = threading.Event()
+        self.count = 0  # Frames handed out so far
+        self._thread = threading.Thread(target=self._reader, name="frame-stream", daemon=True)
+        self._thread.start()
+
+    def _read_frame(self):
+        head = self._file.read(2)
+        if not head:
+            return None
+        if len(head) < 2:
+            head += _read_exact(self._file, 2 - len(head))
+        if head == RAW_FRAME_MAGIC[:2]:
+            header = head + _read_exact(self._file, _RAW_HEADER.size - 2)
+            magic, width, height, channels, itemsize = _RAW_HEADER.unpack(header)
+            if magic != RAW_FRAME_MAGIC or itemsize not in (1, 2) or channels not in (1, 3, 4):
+                raise ValueError("Corrupt raw frame header in stream")
+            dtype = np.dtype("<u2") if itemsize == 2 else np.dtype(np.uint8)
+            data = _read_exact(self._file, width * height * channels * itemsize)
+            img = np.frombuffer(data, dtype=dtype).reshape(
+                (height, width, channels) if channels > 1 else (height, width))
+            return img.astype(dtype.newbyteorder("="))  # Writable, native byte order
+        if head == _PNG_SIGNATURE[:2]:
+            buf = _read_png(self._file, head)
+        elif head == b"\xff\xd8":
+            buf = _read_jpeg(self._file, head)
+        else:
+            raise ValueError(f"Unrecognised frame in stream (starts with {head!r})")
+        img = self._decode(buf)
+        if img is None:
+            raise ValueError("Frame in stream does not decode")
+        return img
+
+    def _reader(self):
+        try:
+            while not self._stop.is_set():
+                img = self._read_frame()
+                self._put(img)
+                if img is None:
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._stop.is_set():
+            raise StopIteration
+        item = self._queue.get()
+        if item is None:
+            self._stop.set()
+            raise StopIteration
+        if isinstance(item, Exception):
+            self._stop.set()
+            raise item
+        self.count += 1
+        return item
+
+    def close(self):
+        """Stop reading ahead (the stream itself is left open)."""
+        self._stop.set()
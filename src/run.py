@@ -154,6 +154,8 @@ def main():
             gray = np.zeros((4, 4), dtype=np.float32)
             CPU.compute_focusmap(gray, gray, 2)
             CPU.fuse_pyramid_levels_using_focusmap(pyr[0], pyr[0].copy(), np.zeros((2, 3), dtype=np.uint8))
+            CPU.fuse_pyramid_levels_into(pyr[0], pyr[0].copy(), np.zeros((2, 3), dtype=np.uint8))
+            CPU.feather_fuse_into(pyr[0], pyr[0].copy(), np.zeros((2, 3), dtype=np.uint8), 2)
         except Exception:
             pass
 
@@ -164,4 +166,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # RAW decode worker processes re-launch the frozen executable
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
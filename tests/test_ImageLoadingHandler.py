@@ -10,7 +10,7 @@ sys.path.insert(0, parentdir)
 import numpy as np
 import pytest
 
-from src.ImageLoadingHandler import ImageLoadingHandler
+from src.ImageLoadingHandler import ImageLoadingHandler, LumaPyramid
 import src.settings as settings
 
 settings.init()
@@ -106,6 +106,15 @@ def test_float32_loading():
     assert img.min() >= 0.0
 
 
+def test_native_loading_keeps_dtype():
+    """Native loading should skip float promotion but still return BGR."""
+    img = loader.read_image_native("tests/low_res_images/DSC_0356.jpg")
+    assert img.dtype == np.uint8
+    assert img.shape == (500, 750, 3)
+    as_float = loader.read_image_as_float32("tests/low_res_images/DSC_0356.jpg")
+    np.testing.assert_array_equal(img.astype(np.float32), as_float)
+
+
 def test_float32_loading_nonexistent():
     """Float32 loading of nonexistent file should return None."""
     img = loader.read_image_as_float32("tests/nonexistent.jpg")
@@ -138,3 +147,312 @@ def test_is_supported_format():
     assert not loader.is_supported("photo.txt")
     assert not loader.is_supported("photo.pdf")
     assert not loader.is_supported(".DS_Store")
+
+
+def test_luma_pyramid_levels():
+    """Luma pyramid levels are lazy pyrDowns; scaled reads match the requested size."""
+    import cv2
+    img = np.random.randint(0, 65535, (300, 500, 3), dtype=np.uint16)
+    luma = LumaPyramid.from_image(img)
+    assert luma.full.dtype == np.float32 and luma.full.max() <= 255.0
+    assert len(luma.levels) == 1  # nothing built until asked
+    assert np.allclose(luma.level(1), cv2.pyrDown(luma.full))
+    small = luma.at_max_dim(120)
+    assert small.shape == (72, 120)
+    assert luma.at_scale(1.0) is luma.full
+    assert luma.level(99).shape == luma.levels[-1].shape
+
+
+@pytest.mark.parametrize("ext", ["jpg", "png", "tif"])
+@pytest.mark.parametrize("orientation", range(1, 9))
+def test_exif_orientation_from_buffer(tmp_path, ext, orientation):
+    """Orientation parsed from the file bytes is applied like PIL's exif_transpose."""
+    from PIL import Image, ImageOps
+    rng = np.random.default_rng(orientation)
+    rgb = rng.integers(0, 255, (24, 40, 3), dtype=np.uint8)
+    rgb = np.repeat(np.repeat(rgb, 8, axis=0), 8, axis=1)  # Blocky: survives JPEG
+    path = str(tmp_path / f"oriented.{ext}")
+    pil_img = Image.fromarray(rgb)
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    pil_img.save(path, exif=exif, **({"quality": 98} if ext == "jpg" else {}))
+    with Image.open(path) as saved:
+        expected = np.asarray(ImageOps.exif_transpose(saved))[:, :, ::-1]
+
+    img = loader.read_image_from_path(path)
+    assert img.flags.c_contiguous
+    assert img.shape == expected.shape
+    as_float = loader.read_image_as_float32(path)
+    np.testing.assert_array_equal(as_float, img.astype(np.float32))
+    np.testing.assert_allclose(img, expected, atol=2)
+
+
+def test_prefetch_reader_bounded_read_ahead(tmp_path):
+    """The I/O thread stops at the read-ahead budget and resumes as frames are taken."""
+    from src.ImageLoadingHandler import PrefetchReader
+    paths = []
+    for i in range(6):
+        path = tmp_path / f"{i}.bin"
+        path.write_bytes(bytes([i]) * 1000)
+        paths.append(str(path))
+    with PrefetchReader(paths, read_ahead_bytes=2500) as reader:
+        for i, path in enumerate(paths):
+            buf = reader.take(path)
+            assert buf is not None and buf.size == 1000 and (buf == i).all()
+            reader.release(buf)
+            assert reader.buffered_bytes <= 2500
+        assert reader.take(paths[0]) is None  # Already taken
+        assert reader.take("tests/unscheduled.jpg") is None
+    assert reader.peak_bytes <= 2500
+
+
+def test_prefetched_loading_matches_direct():
+    """Frames loaded while a prefetch is active are identical to direct loads."""
+    image_dir = "tests/low_res_images"
+    paths = [os.path.join(image_dir, name) for name in sorted(os.listdir(image_dir))]
+    direct = [loader.read_image_as_float32(p) for p in paths]
+    prefetching = ImageLoadingHandler()
+    with prefetching.prefetch(paths, read_ahead_bytes=200_000) as reader:
+        assert reader is not None
+        for path, expected in zip(paths, direct):
+            np.testing.assert_array_equal(prefetching.read_image_as_float32(path), expected)
+    assert prefetching._prefetch is None
+
+
+@pytest.mark.parametrize("factor", [1, 2, 3, 4, 8])
+def test_read_reduced_matches_downscaled_full(factor):
+    """Reduced decodes are ceil(size / factor) and look like the downscaled full image."""
+    import cv2
+    path = "tests/low_res_images/DSC_0356.jpg"
+    full = loader.read_image_from_path(path)
+    img = loader.read_reduced(path, factor)
+    assert img.dtype == np.uint8
+    assert max(img.shape[:2]) == -(-max(full.shape[:2]) // factor)
+    expected = cv2.resize(full, img.shape[1::-1], interpolation=cv2.INTER_AREA)
+    assert np.abs(img.astype(np.float32) - expected).mean() < 3.0
+
+
+def test_read_reduced_orientation_and_errors(tmp_path):
+    """EXIF orientation is applied to reduced decodes; missing files give None."""
+    from PIL import Image
+    path = str(tmp_path / "rotated.png")
+    pil_img = Image.fromarray(np.zeros((40, 80, 3), dtype=np.uint8))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    pil_img.save(path, exif=exif)
+    assert loader.read_reduced(path, 2).shape == (40, 20, 3)
+    assert loader.read_reduced("tests/nonexistent.jpg", 2) is None
+    assert loader.read_reduced("tests/test_ImageLoadingHandler.py", 2) is None
+
+
+@pytest.mark.parametrize("ext,bit_depth", [("jpg", 8), ("png", 8), ("png", 16), ("tif", 16)])
+def test_probe_matches_decoded_image(tmp_path, ext, bit_depth):
+    """Header-only metadata agrees with the decoded frame and is cached."""
+    import cv2
+    dtype = np.uint16 if bit_depth == 16 else np.uint8
+    path = str(tmp_path / f"frame.{ext}")
+    cv2.imwrite(path, np.zeros((30, 50, 3), dtype=dtype))
+    meta = loader.probe(path)
+    assert (meta.width, meta.height, meta.channels, meta.bit_depth) == (50, 30, 3, bit_depth)
+    assert meta.shape == loader.read_image_native(path).shape[:2]
+    assert loader.probe(path) is meta
+
+
+def test_probe_orientation_and_timestamp(tmp_path):
+    from datetime import datetime
+    from PIL import Image
+    path = str(tmp_path / "rotated.jpg")
+    exif = Image.Exif()
+    exif[0x0112] = 8
+    exif[0x0132] = "2024:05:06 07:08:09"
+    Image.fromarray(np.zeros((40, 80, 3), dtype=np.uint8)).save(path, exif=exif)
+    meta = loader.probe(path)
+    assert meta.orientation == 8
+    assert meta.shape == (80, 40) == loader.read_image_from_path(path).shape[:2]
+    assert meta.timestamp == datetime(2024, 5, 6, 7, 8, 9)
+    assert loader.probe("tests/nonexistent.jpg") is None
+
+
+def _write_dng(path, cfa):
+    """Minimal uncompressed RGGB DNG (16-bit CFA, identity colour matrix)."""
+    import struct
+    h, w = cfa.shape
+    data = cfa.astype("<u2").tobytes()
+    entries = [  # (tag, type, values); SRATIONAL values as numerator/denominator pairs
+        (254, 4, [0]), (256, 4, [w]), (257, 4, [h]), (258, 3, [16]), (259, 3, [1]),
+        (262, 3, [32803]), (273, 4, [0]), (277, 3, [1]), (278, 4, [h]), (279, 4, [len(data)]),
+        (284, 3, [1]), (33421, 3, [2, 2]), (33422, 1, [0, 1, 1, 2]),
+        (50706, 1, [1, 4, 0, 0]), (50708, 2, list(b"Test\x00")),
+        (50721, 10, [1, 1, 0, 1, 0, 1, 0, 1, 1, 1, 0, 1, 0, 1, 0, 1, 1, 1]),
+    ]
+    formats = {1: "B", 2: "B", 3: "H", 4: "I", 10: "i"}
+    extra = bytearray()
+    base = 8 + 2 + 12 * len(entries) + 4
+    ifd = bytearray(struct.pack("<H", len(entries)))
+    packed = []
+    for tag, type_, values in entries:
+        raw = struct.pack(f"<{len(values)}{formats[type_]}", *values)
+        if len(raw) > 4:
+            offset = base + len(extra)
+            extra += raw + b"\x00" * (len(raw) % 2)
+            raw = struct.pack("<I", offset)
+        packed.append((tag, type_, len(values) // (2 if type_ == 10 else 1), raw))
+    for tag, type_, count, raw in packed:
+        if tag == 273:
+            raw = struct.pack("<I", base + len(extra))
+        ifd += struct.pack("<HHI", tag, type_, count) + raw.ljust(4, b"\x00")
+    with open(path, "wb") as f:
+        f.write(b"II*\x00" + struct.pack("<I", 8) + ifd + struct.pack("<I", 0) + extra + data)
+
+
+def test_raw_decode_pool_matches_in_process(tmp_path):
+    """RAW frames developed in worker processes equal in-process decodes."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(4):
+        path = str(tmp_path / f"frame_{i}.dng")
+        _write_dng(path, rng.integers(0, 65535, (64, 96), dtype=np.uint16))
+        paths.append(path)
+    direct = [loader.read_image_native(p) for p in paths]
+    assert direct[0].dtype == np.uint16 and direct[0].shape == (64, 96, 3)
+
+    pooled = ImageLoadingHandler()
+    with pooled.raw_decode_pool(paths + ["tests/low_res_images/DSC_0356.jpg"], workers=2) as pool:
+        assert pool is not None and paths[0] in pool
+        assert "tests/low_res_images/DSC_0356.jpg" not in pool
+        for path, expected in zip(paths[:3], direct):
+            np.testing.assert_array_equal(pooled.read_image_native(path), expected)
+        assert pool.take(paths[0]) is None  # Already taken
+        # paths[3] is left unclaimed: closing the pool frees its block
+    assert pooled._raw_pool is None
+    np.testing.assert_array_equal(pooled.read_image_native(paths[3]), direct[3])
+
+
+def test_raw_decode_pool_not_started_for_one_worker(tmp_path):
+    path = str(tmp_path / "frame.dng")
+    _write_dng(path, np.full((32, 32), 1000, dtype=np.uint16))
+    with loader.raw_decode_pool([path, path], workers=0) as pool:
+        assert pool is None  # A single RAW file decodes in-process
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+def test_multipage_tiff_frames(tmp_path, dtype):
+    """Pages of a multi-page TIFF load by index, in any order, with per-page headers."""
+    import cv2
+    from src.frame_sources import expand_paths, FrameRef
+    rng = np.random.default_rng(3)
+    pages = [rng.integers(0, np.iinfo(dtype).max, (24, 32, 3), dtype=dtype) for _ in range(5)]
+    path = str(tmp_path / "stack.tif")
+    assert cv2.imwritemulti(path, pages)
+    refs = expand_paths([path, "tests/low_res_images/DSC_0356.jpg"])
+    assert len(refs) == 6 and refs[-1] == "tests/low_res_images/DSC_0356.jpg"
+    assert all(isinstance(r, FrameRef) for r in refs[:5])
+    for i in (3, 0, 4, 1):
+        np.testing.assert_array_equal(loader.read_image_native(refs[i]), pages[i])
+        meta = loader.probe(refs[i])
+        assert (meta.width, meta.height, meta.bit_depth) == (32, 24, 8 * np.dtype(dtype).itemsize)
+    # A plain string reference (e.g. from the command line) resolves too
+    np.testing.assert_array_equal(loader.read_image_native(str(refs[2])), pages[2])
+    assert loader.is_supported(str(refs[2]))
+    assert loader.read_image_native(path + "#0009") is None
+    assert loader.read_reduced(refs[1], 2).shape == (12, 16, 3)
+
+
+def test_expand_paths_opens_only_multipage_tiffs(tmp_path, monkeypatch):
+    """Single-page TIFFs are told apart by their header probe, never opened as containers."""
+    import cv2
+    import src.frame_sources as frame_sources
+    img = np.zeros((24, 32, 3), dtype=np.uint8)
+    single = str(tmp_path / "single.tif")
+    multi = str(tmp_path / "multi.tif")
+    cv2.imwrite(single, img)
+    assert cv2.imwritemulti(multi, [img, img + 1, img + 2])
+    assert not loader.probe(single).multipage and loader.probe(multi).multipage
+    opened = []
+    open_frame_source = frame_sources.open_frame_source
+    monkeypatch.setattr(frame_sources, "open_frame_source",
+                        lambda path: opened.append(path) or open_frame_source(path))
+    refs = frame_sources.expand_paths([single, multi])
+    assert refs[0] == single and len(refs) == 4
+    assert opened == [multi]
+
+
+def test_video_frames_random_access(tmp_path):
+    """Video frames read in order and by seeking give the same pixels."""
+    import cv2
+    from src.frame_sources import expand_paths
+    path = str(tmp_path / "stack.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"FFV1"), 10, (32, 24))
+    if not writer.isOpened():
+        pytest.skip("No lossless video encoder available")
+    rng = np.random.default_rng(4)
+    frames = [rng.integers(0, 255, (24, 32, 3), dtype=np.uint8) for _ in range(6)]
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    refs = expand_paths([path])
+    assert len(refs) == 6
+    for i in (0, 1, 2, 5, 3, 4):
+        np.testing.assert_array_equal(loader.read_image_native(refs[i]), frames[i])
+    meta = loader.probe(refs[0])
+    assert (meta.width, meta.height, meta.bit_depth) == (32, 24, 8)
+
+
+def test_frame_stream_parses_mixed_frames():
+    """PNG, progressive and restart-marker JPEG, and raw frames split apart in order."""
+    import io
+    import cv2
+    from src.frame_sources import FrameStream, write_raw_frame
+    rng = np.random.default_rng(4)
+    img = cv2.GaussianBlur(rng.integers(0, 255, (48, 40, 3), dtype=np.uint8), (5, 5), 0)
+    wide = (img.astype(np.uint16) * 257)
+    buf = io.BytesIO()
+    buf.write(cv2.imencode(".png", img)[1].tobytes())
+    jpegs = [cv2.imencode(".jpg", img, [flag, 1])[1]
+             for flag in (cv2.IMWRITE_JPEG_PROGRESSIVE, cv2.IMWRITE_JPEG_RST_INTERVAL)]
+    for jpeg in jpegs:
+        buf.write(jpeg.tobytes())
+    write_raw_frame(buf, wide)
+    write_raw_frame(buf, img[:, :, 0])
+    buf.write(cv2.imencode(".png", wide)[1].tobytes())
+    buf.seek(0)
+
+    loader = ImageLoadingHandler()
+    frames = list(FrameStream(buf, decode=loader.decode_native))
+    assert len(frames) == 6
+    np.testing.assert_array_equal(frames[0], img)
+    for frame, jpeg in zip(frames[1:3], jpegs):
+        np.testing.assert_array_equal(frame, cv2.imdecode(jpeg, cv2.IMREAD_COLOR))
+    np.testing.assert_array_equal(frames[3], wide)
+    np.testing.assert_array_equal(frames[4], img[:, :, 0])
+    assert frames[5].dtype == np.uint16
+    np.testing.assert_array_equal(frames[5], wide)
+
+    truncated = io.BytesIO(buf.getvalue()[:-10])
+    with pytest.raises(EOFError):
+        list(FrameStream(truncated))
+
+
+def test_frame_source_cache_evicts_least_recently_used(tmp_path):
+    """Evicted sources are closed one at a time and reopen for readers still holding them."""
+    import cv2
+    import src.frame_sources as frame_sources
+    page = np.zeros((8, 8, 3), dtype=np.uint8)
+    paths = []
+    for i in range(frame_sources._MAX_OPEN_SOURCES + 2):
+        path = str(tmp_path / f"stack_{i}.tif")
+        assert cv2.imwritemulti(path, [page + i, page + 100 + i])
+        paths.append(path)
+    first = frame_sources.frame_source(paths[0])
+    sources = [frame_sources.frame_source(path) for path in paths[1:]]
+    assert frame_sources.frame_source(paths[-1]) is sources[-1]
+    assert frame_sources.frame_source(paths[0]) is not first  # Evicted
+    assert frame_sources.frame_source(paths[3]) is sources[2]  # Still cached
+    np.testing.assert_array_equal(first.read(1), page + 100)  # Reopened on demand
+
+    class Incomplete(frame_sources.FrameSource):
+        def __len__(self):
+            return 0
+
+    with pytest.raises(TypeError):
+        Incomplete(paths[0])
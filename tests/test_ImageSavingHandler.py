@@ -0,0 +1,121 @@
+"""
+Test strip-wise PNG/TIFF writing.
+"""
+import os, sys
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+import cv2
+import numpy as np
+import pytest
+
+import src.ImageSavingHandler as ImageSavingHandler
+
+
+@pytest.mark.parametrize("ext", ["png", "tif"])
+@pytest.mark.parametrize("bit_depth", [8, 16])
+@pytest.mark.parametrize("channels", [1, 3])
+def test_strip_writer_round_trip(tmp_path, ext, bit_depth, channels):
+    """Rows written in uneven strips read back losslessly with OpenCV."""
+    rng = np.random.default_rng(bit_depth + channels)
+    dtype = np.uint16 if bit_depth == 16 else np.uint8
+    img = rng.integers(0, np.iinfo(dtype).max, (150, 97, channels), dtype=dtype)
+    path = str(tmp_path / f"out.{ext}")
+    with ImageSavingHandler.open_strip_writer(path, 97, 150, channels, bit_depth) as writer:
+        bounds = [0, 1, 64, 100, 150]
+        for y0, y1 in zip(bounds, bounds[1:]):
+            writer.write_rows(img[y0:y1] if channels == 3 else img[y0:y1, :, 0])
+    back = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    assert back.dtype == dtype
+    np.testing.assert_array_equal(back.reshape(img.shape), img)
+
+
+def test_incomplete_image_is_removed(tmp_path):
+    """A writer that fails part way leaves no truncated file behind."""
+    path = str(tmp_path / "out.png")
+    with pytest.raises(ValueError):
+        with ImageSavingHandler.open_strip_writer(path, 10, 10) as writer:
+            writer.write_rows(np.zeros((4, 10, 3), dtype=np.uint8))
+            writer.write_rows(np.zeros((7, 10, 3), dtype=np.uint8))  # Too many rows
+    assert not os.path.exists(path)
+
+
+def test_convert_to_bit_depth():
+    img = np.array([[-5.0, 0.4, 127.5, 300.0]], dtype=np.float32)
+    np.testing.assert_array_equal(
+        ImageSavingHandler.convert_to_bit_depth(img.copy(), 8), [[0, 0, 128, 255]])
+    np.testing.assert_array_equal(
+        ImageSavingHandler.convert_to_bit_depth(img.copy(), 16), [[0, 103, 32768, 65535]])
+
+
+@pytest.mark.parametrize("tile_size,bigtiff", [(0, True), (64, False), (64, True)])
+@pytest.mark.parametrize("bit_depth", [8, 16])
+def test_tiled_and_bigtiff_round_trip(tmp_path, tile_size, bigtiff, bit_depth):
+    """Tiled TIFFs (edge tiles padded) and BigTIFFs read back losslessly."""
+    rng = np.random.default_rng(bit_depth + tile_size)
+    dtype = np.uint16 if bit_depth == 16 else np.uint8
+    img = rng.integers(0, np.iinfo(dtype).max, (150, 97, 3), dtype=dtype)
+    path = str(tmp_path / "out.tif")
+    with ImageSavingHandler.open_strip_writer(path, 97, 150, 3, bit_depth, workers=3,
+                                              tile_size=tile_size, bigtiff=bigtiff) as writer:
+        for y0 in range(0, 150, 40):
+            writer.write_rows(img[y0:y0 + 40])
+    with open(path, "rb") as f:
+        assert f.read(4) == (b"II+\x00" if bigtiff else b"II*\x00")
+    np.testing.assert_array_equal(cv2.imread(path, cv2.IMREAD_UNCHANGED), img)
+
+
+def test_threaded_png_matches_single_thread(tmp_path):
+    """PNG blocks deflated on several threads decode to the same image."""
+    img = cv2.GaussianBlur(np.random.default_rng(7).integers(0, 255, (300, 200, 3), dtype=np.uint8),
+                           (0, 0), 2)
+    for workers in (1, 4):
+        path = str(tmp_path / f"out_{workers}.png")
+        with ImageSavingHandler.open_strip_writer(path, 200, 300, workers=workers) as writer:
+            for y0 in range(0, 300, 32):
+                writer.write_rows(img[y0:y0 + 32])
+        np.testing.assert_array_equal(cv2.imread(path, cv2.IMREAD_UNCHANGED), img)
+
+
+@pytest.mark.parametrize("ext,bit_depth", [("png", 16), ("tif", 8), ("jpg", 8), ("hdr", 32)])
+def test_save_image_async(tmp_path, ext, bit_depth):
+    img = np.random.default_rng(1).uniform(0, 255, (40, 30, 3)).astype(np.float32)
+    path = str(tmp_path / f"out.{ext}")
+    assert ImageSavingHandler.save_image_async(path, img, bit_depth).result() == path
+    back = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if bit_depth == 32:
+        np.testing.assert_allclose(back * 255.0, img, atol=2.0)  # RGBE shares one exponent per pixel
+    elif ext != "jpg":
+        np.testing.assert_array_equal(back, ImageSavingHandler.convert_to_bit_depth(img.copy(), bit_depth))
+    else:
+        assert back.shape == img.shape
+
+
+def test_zstd_requires_zstandard(tmp_path):
+    path = str(tmp_path / "out.tif")
+    if ImageSavingHandler.HAS_ZSTD:
+        pytest.skip("zstandard is installed")
+    with pytest.raises(ValueError):
+        ImageSavingHandler.open_strip_writer(path, 10, 10, codec="zstd")
+    assert not os.path.exists(path)
+
+
+def test_export_batch(tmp_path):
+    """Every target is written at its format's bit depth; a failed target does not stop the rest."""
+    img = np.random.default_rng(2).uniform(0, 255, (60, 50, 3)).astype(np.float32)
+    targets = [(str(tmp_path / name), 16) for name in ("out.jpg", "out.png", "out.tif", "out.hdr")]
+    targets.append((str(tmp_path / "missing" / "out.png"), 16))
+    progress = []
+    results = ImageSavingHandler.export_batch(
+        img, targets, workers=3, progress_callback=lambda done, total, t: progress.append((done, total)))
+
+    assert [path for path, _ in results] == [path for path, _ in targets]
+    assert [error is None for _, error in results] == [True, True, True, True, False]
+    assert sorted(progress) == [(i, 5) for i in range(1, 6)]
+    expected = ImageSavingHandler.convert_to_bit_depth(img.copy(), 16)
+    for path, _ in targets[1:3]:
+        np.testing.assert_array_equal(cv2.imread(path, cv2.IMREAD_UNCHANGED), expected)
+    assert cv2.imread(targets[0][0], cv2.IMREAD_UNCHANGED).dtype == np.uint8
+    assert cv2.imread(targets[3][0], cv2.IMREAD_UNCHANGED).dtype == np.float32
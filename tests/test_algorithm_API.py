@@ -17,9 +17,11 @@ settings.init()
 
 from src.algorithms import Algorithm
 from src.algorithms.API import LaplacianPyramid
+from src.algorithms import valid_region, pipeline
 from src.algorithms.stacking_algorithms import cpu as CPU
 from src.config import AlgorithmConfig
 from src.ImageLoadingHandler import ImageLoadingHandler
+import src.ImageSavingHandler as ImageSavingHandler
 
 
 # -- Fixtures --
@@ -253,6 +255,18 @@ class TestLaplacianPyramidAPI:
 # -- Edge Cases --
 
 class TestEdgeCases:
+    def test_mismatched_frames_rejected_before_stacking(self, test_image_paths, tmp_path):
+        """Frame sizes are checked from headers; only alignment can absorb a mismatch."""
+        small = str(tmp_path / "small.png")
+        cv2.imwrite(small, np.zeros((100, 150, 3), dtype=np.uint8))
+        algo = LaplacianPyramid(config=AlgorithmConfig(fusion_kernel_size=6, pyramid_num_levels=4))
+        algo.update_image_paths(test_image_paths[:2] + [small])
+        errors, warnings = algo.validate_frames(align=False)
+        assert errors and all("small.png" in message for message in errors)
+        assert algo.validate_frames(align=True) == ([], errors)
+        with pytest.raises(ValueError):
+            algo.stack_images()
+
     def test_single_image_stack(self):
         """Stacking a single image should not crash (but also won't produce output via the loop)."""
         config = AlgorithmConfig(fusion_kernel_size=6, pyramid_num_levels=4)
@@ -326,6 +340,29 @@ class TestConfig:
         assert config2.stacking_method == "depth_map"
         assert config2.align_rotation_scale is True
 
+    def test_auto_tune_from_content(self, tmp_path):
+        """Frames differing only in fine detail need fewer levels than the size rule."""
+        from src.algorithms import auto_tune
+        from src.config import auto_detect_params
+        rng = np.random.default_rng(0)
+        h, w = 1024, 1536
+        scene = cv2.resize(rng.random((8, 12)).astype(np.float32) * 200, (w, h),
+                           interpolation=cv2.INTER_CUBIC)
+        texture = rng.random((h, w)).astype(np.float32) * 40
+        paths = []
+        for i, sigma in enumerate([0.5, 1.5, 3.0]):
+            frame = np.clip(scene + cv2.GaussianBlur(texture, (0, 0), sigma), 0, 255)
+            path = str(tmp_path / f"frame_{i}.png")
+            cv2.imwrite(path, cv2.cvtColor(frame.astype(np.uint8), cv2.COLOR_GRAY2BGR))
+            paths.append(path)
+
+        params = auto_tune.tune_params(paths)
+        size_based = auto_detect_params((h, w), len(paths))
+        assert params["pyramid_num_levels"] < size_based["pyramid_num_levels"]
+        assert params["measurements"]["max_shift"] < 0.5
+        assert params["alignment_scale_factor"] <= 4
+        assert set(size_based) <= set(params)
+
 
 # -- Weighted Average Tests --
 
@@ -435,6 +472,262 @@ class TestFloat32Pipeline:
         assert lp.output_image is not None
         assert lp.output_image.dtype == np.float32
 
+    @pytest.mark.parametrize("planar", [False, True])
+    def test_native_frames_build_same_pyramid(self, test_images, planar):
+        """uint8 / uint16 frames are promoted inside the pyramid build."""
+        algo = Algorithm()
+        algo.planar_pyramids = planar
+        img8 = test_images[0]
+        img16 = img8.astype(np.uint16) * 257
+        expected = algo.generate_laplacian_pyramid(img8.astype(np.float32), 4)
+        for native in (img8, img16):
+            pyr = algo.generate_laplacian_pyramid(native, 4)
+            for level, ref in zip(pyr, expected):
+                assert level.dtype == np.float32
+                np.testing.assert_allclose(level, ref, atol=1e-3)
+
+    def test_native_16bit_stack_matches_8bit(self, test_images, tmp_path):
+        """The same frames stored as 8- and 16-bit PNGs stack identically."""
+        config = AlgorithmConfig(fusion_kernel_size=6, pyramid_num_levels=4)
+        outputs = []
+        for dtype in (np.uint8, np.uint16):
+            paths = []
+            for i, img in enumerate(test_images[:3]):
+                path = str(tmp_path / f"frame_{dtype.__name__}_{i}.png")
+                cv2.imwrite(path, img.astype(dtype) * (257 if dtype == np.uint16 else 1))
+                paths.append(path)
+            lp = LaplacianPyramid(config=config)
+            lp.update_image_paths(paths)
+            lp.stack_images()
+            outputs.append(lp.output_image)
+        np.testing.assert_allclose(outputs[1], outputs[0], atol=1e-2)
+
+    def test_multipage_tiff_stacks_like_separate_files(self, test_images, tmp_path):
+        """A z-stack in one multi-page TIFF stacks like the same frames as files."""
+        container = str(tmp_path / "zstack.tif")
+        assert cv2.imwritemulti(container, test_images[:4])
+        paths = []
+        for i, img in enumerate(test_images[:4]):
+            path = str(tmp_path / f"frame_{i}.png")
+            cv2.imwrite(path, img)
+            paths.append(path)
+        config = AlgorithmConfig(fusion_kernel_size=6, pyramid_num_levels=4)
+        outputs = []
+        for inputs in ([container], paths):
+            lp = LaplacianPyramid(config=config)
+            lp.update_image_paths(inputs)
+            assert len(lp.image_paths) == 4
+            lp.align_and_stack_images()
+            outputs.append(lp.output_image)
+        np.testing.assert_array_equal(outputs[0], outputs[1])
+
+    @pytest.mark.parametrize("method,align,levels", [
+        ("laplacian", False, 4), ("laplacian", True, 4), ("laplacian", True, 0),
+        ("weighted_average", True, 4), ("depth_map", False, 4),
+        ("exposure_fusion", True, 4), ("exposure_fusion", False, 4),
+    ])
+    def test_streamed_frames_stack_like_files(self, test_images, tmp_path, method, align, levels):
+        """Raw and PNG frames read from a pipe stack like the same frames as files."""
+        import io
+        from src.frame_sources import FrameStream, write_raw_frame
+        buf = io.BytesIO()
+        paths = []
+        for i, img in enumerate(test_images[:4]):
+            path = str(tmp_path / f"frame_{i}.png")
+            cv2.imwrite(path, img)
+            paths.append(path)
+            if i % 2:
+                write_raw_frame(buf, img)
+            else:
+                buf.write(cv2.imencode(".png", img)[1].tobytes())
+        buf.seek(0)
+        config = AlgorithmConfig(stacking_method=method, fusion_kernel_size=6,
+                                 pyramid_num_levels=levels)
+        files = LaplacianPyramid(config=config)
+        files.update_image_paths(paths)
+        files.align_and_stack_images() if align else files.stack_images()
+
+        streamed = LaplacianPyramid(config=config)
+        progress = []
+        streamed.stack_stream(FrameStream(buf), align=align,
+                              progress_callback=lambda cur, total, t: progress.append((cur, total)))
+        np.testing.assert_array_equal(streamed.output_image, files.output_image)
+        assert progress[-1] == (4, 4)
+
+    def test_streamed_reference_not_fused_in_place(self, test_images):
+        """With 0 levels the fused pyramid must not alias the alignment reference."""
+        config = AlgorithmConfig(fusion_kernel_size=6, pyramid_num_levels=0)
+        lp = LaplacianPyramid(config=config)
+        load_and_align = lp._load_and_align
+        refs = []
+
+        def spy(ref_image, img, **kwargs):
+            refs.append(ref_image.copy())
+            return load_and_align(ref_image, img, **kwargs)
+
+        lp._load_and_align = spy
+        lp.stack_stream(iter(test_images[:4]), align=True)
+        assert len(refs) == 3
+        for ref in refs[1:]:
+            np.testing.assert_array_equal(ref, refs[0])
+
+    def test_empty_stream_raises(self):
+        import io
+        from src.frame_sources import FrameStream
+        with pytest.raises(ValueError):
+            LaplacianPyramid().stack_stream(FrameStream(io.BytesIO()))
+
+
+# -- Fused Warp Tests --
+
+class TestFusedWarp:
+    def test_matches_cv2_warp(self, test_images):
+        """Fused warp should match cvtColor(warpAffine(astype(float32)))."""
+        img = test_images[0]
+        matrix = np.float64([[0.999, 0.02, 3.3], [-0.02, 0.999, -2.7]])
+        out, gray = CPU.warp_to_float32(img, matrix)
+        expected = cv2.warpAffine(
+            img.astype(np.float32), matrix, (img.shape[1], img.shape[0]),
+            flags=cv2.INTER_LINEAR + cv2.WARP_INVERSE_MAP,
+        )
+        assert out.dtype == np.float32
+        assert np.abs(out - expected).max() < 0.05
+        expected_gray = cv2.cvtColor(expected, cv2.COLOR_BGR2GRAY)
+        assert np.abs(gray - expected_gray).max() < 0.05
+
+    def test_uint16_scaled_into_buffer(self):
+        """uint16 input should land in the 0-255 range, in the given buffer."""
+        img = np.full((20, 30, 3), 65535, dtype=np.uint16)
+        buf = np.empty((20, 30, 3), dtype=np.float32)
+        out, _ = CPU.warp_to_float32(
+            img, np.eye(2, 3), scale=ImageLoadingHandler.dtype_scale(img.dtype), out=buf,
+        )
+        assert out is buf
+        np.testing.assert_allclose(out, 255.0, rtol=1e-5)
+
+    @pytest.mark.parametrize("method", ["laplacian", "weighted_average"])
+    def test_warp_buffers_reused_across_frames(self, test_image_paths, monkeypatch, method):
+        """Aligned frames and their gray planes are warped into the same buffers."""
+        warp = CPU.warp_to_float32
+        images, grays = [], []  # Held, so a freed buffer's id cannot come back
+
+        def spy(*args, **kwargs):
+            out, gray = warp(*args, **kwargs)
+            images.append(out)
+            grays.append(gray)
+            return out, gray
+
+        monkeypatch.setattr(CPU, "warp_to_float32", spy)
+        lp = LaplacianPyramid(config=AlgorithmConfig(
+            stacking_method=method, fusion_kernel_size=6, pyramid_num_levels=4,
+            pipeline_workers=1,
+        ))
+        lp.update_image_paths(test_image_paths[:4])
+        lp.align_and_stack_images()
+        assert len(images) == 3
+        assert all(out is images[0] for out in images)
+        assert all(gray is grays[0] for gray in grays)
+
+    def test_align_from_path_returns_gray(self, algo, test_image_paths):
+        """Aligning a path should decode natively and emit the aligned gray."""
+        ref = algo.load_image(test_image_paths[0])
+        aligned, gray = algo.align_image_pair(ref, test_image_paths[1], return_gray=True)
+        assert aligned.dtype == np.float32
+        assert aligned.shape == ref.shape
+        np.testing.assert_allclose(
+            gray, cv2.cvtColor(aligned, cv2.COLOR_BGR2GRAY), atol=0.05,
+        )
+
+
+# -- Alignment Confidence / Outlier Tests --
+
+@pytest.fixture
+def stack_with_noise_frame(test_image_paths, tmp_path):
+    """Three real frames plus one frame of pure noise (a 'misfire')."""
+    import shutil
+    paths = []
+    for p in test_image_paths[:3]:
+        paths.append(str(tmp_path / os.path.basename(p)))
+        shutil.copy(p, paths[-1])
+    noise = np.random.RandomState(0).randint(0, 255, (500, 750, 3), dtype=np.uint8)
+    noise_path = str(tmp_path / "DSC_9999.jpg")
+    cv2.imwrite(noise_path, noise)
+    return paths + [noise_path], noise_path
+
+
+class TestAlignmentConfidence:
+    def test_align_frame_reports_confidence(self, algo, test_image_paths):
+        ref = algo.load_image(test_image_paths[0])
+        result = algo.align_frame(ref, test_image_paths[1])
+        assert result.method == "translation"
+        assert result.confidence > 0.5
+        assert result.image.shape == ref.shape
+        assert algo.alignment_shifts == []  # align_frame records nothing
+
+    def test_rst_reports_confidence(self, algo, test_image_paths):
+        ref = algo.load_image(test_image_paths[0])
+        result = algo.align_frame(ref, test_image_paths[1], use_rst=True)
+        assert result.method == "rst"
+        assert 0.5 < result.confidence <= 1.0
+
+    def test_confidence_is_consistent_across_methods(self, algo, stack_with_noise_frame):
+        """One threshold accepts or rejects the same frame under both methods."""
+        paths, noise_path = stack_with_noise_frame
+        ref = algo.load_image(paths[0])
+        for path in paths[1:]:
+            translation = algo.align_frame(ref, path).confidence
+            rst = algo.align_frame(ref, path, use_rst=True).confidence
+            assert abs(translation - rst) < 0.05
+            for threshold in (0.3, 0.5, 0.9):
+                assert (translation >= threshold) == (rst >= threshold) == (path != noise_path)
+
+    @pytest.mark.parametrize("policy", ["drop", "realign"])
+    def test_outlier_frame_is_dropped(self, stack_with_noise_frame, policy):
+        paths, noise_path = stack_with_noise_frame
+        config = AlgorithmConfig(
+            pyramid_num_levels=4, alignment_min_confidence=0.5,
+            alignment_outlier_policy=policy,
+        )
+        lp = LaplacianPyramid(config=config)
+        lp.update_image_paths(paths)
+        lp.align_and_stack_images()
+        assert lp.output_image is not None
+        assert lp.rejected_frames == [noise_path]
+        assert len(lp.Algorithm.alignment_shifts) == 2
+
+    def test_keep_policy_keeps_outlier(self, stack_with_noise_frame):
+        paths, _ = stack_with_noise_frame
+        config = AlgorithmConfig(
+            stacking_method="depth_map", alignment_min_confidence=0.5,
+            alignment_outlier_policy="keep",
+        )
+        lp = LaplacianPyramid(config=config)
+        lp.update_image_paths(paths)
+        lp.align_and_stack_images()
+        assert lp.output_image is not None
+        assert lp.rejected_frames == []
+
+    def test_concurrent_alignment_records_by_frame(self, test_image_paths):
+        """Workers finishing out of order still attribute transforms to the right frame."""
+        from concurrent.futures import ThreadPoolExecutor
+        paths = test_image_paths[:5]
+        serial = Algorithm()
+        ref = serial.load_image(paths[0])
+        expected = {i: serial.align_frame(ref, paths[i]).shift for i in range(1, len(paths))}
+
+        shared = Algorithm()
+
+        def work(i):
+            shared.record_alignment(shared.align_frame(ref, paths[i]), i)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(work, reversed(range(1, len(paths)))))
+        records = shared.alignment_records()
+        assert [i for i, _ in records] == [1, 2, 3, 4]
+        for i, t in records:
+            assert np.allclose(t.shift, expected[i])
+            assert t.matrix.shape == (2, 3)
+
 
 # -- Rotation + Scale Alignment Tests --
 
@@ -493,6 +786,249 @@ class TestLaplacianEnhancements:
         # 50/50 blend should give ~150
         assert abs(result[10, 10, 0] - 150.0) < 1.0
 
+    @pytest.mark.parametrize("radius", [1, 2, 4])
+    def test_feather_fuse_kernel_matches_reference(self, radius):
+        """Single-pass feather+blend equals feather_focusmap + soft blend."""
+        rng = np.random.default_rng(radius)
+        img1 = (rng.random((45, 70, 3)) * 255).astype(np.float32)
+        img2 = (rng.random((45, 70, 3)) * 255).astype(np.float32)
+        # Dense map (saturated windows) and sparse map (max pass needed)
+        for fm in [(rng.random((45, 70)) > 0.3).astype(np.uint8),
+                   (rng.random((45, 70)) > 0.97).astype(np.uint8)]:
+            expected = CPU.fuse_pyramid_levels_soft(
+                img1, img2, CPU.feather_focusmap(fm, radius))
+            fused = img1.copy()
+            CPU.feather_fuse_into(fused, img2, fm, radius)
+            np.testing.assert_allclose(fused, expected, atol=1e-3)
+        # Window views of a larger level are fused in place too
+        big = np.zeros((60, 90, 3), dtype=np.float32)
+        big[5:50, 10:80] = img1
+        CPU.feather_fuse_into(big[5:50, 10:80], img2, fm, radius)
+        np.testing.assert_allclose(big[5:50, 10:80], expected, atol=1e-3)
+        assert not big[:5].any()
+
+    @pytest.mark.parametrize("feather", [0, 2])
+    def test_in_place_fusion_matches_pairwise(self, algo, test_images, feather):
+        """fuse_pyramid_into gives the pairwise result without new level buffers."""
+        pyr1 = algo.generate_laplacian_pyramid(test_images[0].astype(np.float32), 4)
+        pyr2 = algo.generate_laplacian_pyramid(test_images[1].astype(np.float32), 4)
+        expected = algo.focus_fuse_pyramid_pair(pyr1, pyr2, 6, feather_radius=feather)
+        buffers = [level.ctypes.data for level in pyr1]
+        fused = algo.fuse_pyramid_into(pyr1, pyr2, 6, feather_radius=feather)
+        assert [level.ctypes.data for level in fused] == buffers
+        for got, want in zip(fused, expected):
+            np.testing.assert_allclose(got, want, atol=1e-3)
+
+    @pytest.mark.parametrize("feather,roi", [(0, None), (2, None), (2, (10, 8, 60, 50))])
+    def test_carried_gray_matches_recomputed(self, algo, test_images, feather, roi):
+        """The fused gray carried across frames equals a fresh conversion."""
+        pyrs = [algo.generate_laplacian_pyramid(im.astype(np.float32), 4)
+                for im in test_images[:4]]
+        expected = [level.copy() for level in pyrs[0]]
+        fused = [level.copy() for level in pyrs[0]]
+        fused_gray = []
+        for pyr in pyrs[1:]:
+            algo.fuse_pyramid_into(expected, pyr, 6, 0.0, feather, roi)
+            algo.fuse_pyramid_into(fused, pyr, 6, 0.0, feather, roi, fused_gray)
+        assert len(fused_gray) == len(fused) - 1
+        for level, gray in zip(fused, fused_gray):
+            np.testing.assert_allclose(gray, algo._level_gray(level), atol=1e-3)
+        for got, want in zip(fused, expected):
+            np.testing.assert_allclose(got, want, atol=1e-2)
+
+    @pytest.mark.parametrize("feather,roi", [(0, None), (2, None), (2, (40, 30, 300, 220))])
+    def test_hierarchical_fusion_skips_defocused_blocks(self, feather, roi):
+        """Blocks a frame lost one level coarser are skipped; the rest fuse as usual."""
+        rng = np.random.default_rng(7)
+        sharp = cv2.GaussianBlur(rng.uniform(0, 255, (256, 384, 3)).astype(np.float32), (0, 0), 1.0)
+        blurred = cv2.GaussianBlur(sharp, (0, 0), 6.0)
+        frames = [blurred.copy() for _ in range(3)]
+        frames[0][:, :128] = sharp[:, :128]
+        frames[1][:, 128:256] = sharp[:, 128:256]
+        frames[2][:, 256:] = sharp[:, 256:]
+
+        results = []
+        for hierarchical in (False, True):
+            algo = Algorithm()
+            algo.hierarchical_fusion = hierarchical
+            pyrs = [algo.generate_laplacian_pyramid(f, 5) for f in frames]
+            fused, fused_gray = pyrs[0], []
+            for pyr in pyrs[1:]:
+                algo.fuse_pyramid_into(fused, pyr, 6, 0.0, feather, roi, fused_gray)
+            results.append(algo.reconstruct_pyramid(fused))
+            for level, gray in zip(fused, fused_gray):
+                np.testing.assert_allclose(gray, algo._level_gray(level), atol=1e-3)
+        assert algo.skipped_fraction > 0.2
+        diff = np.abs(results[0] - results[1])
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            diff = diff[y0:y1, x0:x1]
+        assert diff.mean() < 0.5
+
+    @pytest.mark.parametrize("feather", [0, 2])
+    def test_hierarchical_fusion_matches_full_on_real_frames(self, test_images, feather):
+        """On a real focus stack, skipping never moves the result visibly away from full fusion."""
+        results = []
+        for hierarchical in (False, True):
+            algo = Algorithm()
+            algo.hierarchical_fusion = hierarchical
+            pyrs = [algo.generate_laplacian_pyramid(im, 6) for im in test_images]
+            fused, fused_gray = pyrs[0], []
+            for pyr in pyrs[1:]:
+                algo.fuse_pyramid_into(fused, pyr, 6, 0.0, feather, None, fused_gray)
+            results.append(algo.reconstruct_pyramid(fused))
+        diff = np.abs(results[0] - results[1])
+        mse = float(np.mean(diff * diff))
+        assert diff.max() <= 2.0
+        assert mse == 0 or 10 * np.log10(255.0 ** 2 / mse) > 50
+
+    @pytest.mark.parametrize("feather,threshold", [(0, 0.0), (2, 0.0), (2, 2.0)])
+    def test_planar_layout_matches_interleaved(self, test_images, feather, threshold):
+        """Planar (C, H, W) pyramids fuse to the same levels as interleaved ones."""
+        imgs = [im.astype(np.float32) for im in test_images[:2]]
+        interleaved = Algorithm()
+        planar = Algorithm()
+        planar.planar_pyramids = True
+        p1, p2 = (planar.generate_laplacian_pyramid(im, 4) for im in imgs)
+        assert p1[-1].shape == (3,) + imgs[0].shape[:2]
+        i1, i2 = (interleaved.generate_laplacian_pyramid(im, 4) for im in imgs)
+        fused_i = interleaved.focus_fuse_pyramid_pair(i1, i2, 6, threshold, feather)
+        fused_p = planar.fuse_pyramid_into(p1, p2, 6, threshold, feather)
+        for lp_level, li_level in zip(fused_p, fused_i):
+            np.testing.assert_allclose(lp_level.transpose(1, 2, 0), li_level, atol=1e-2)
+        np.testing.assert_allclose(
+            planar.reconstruct_pyramid(fused_p), interleaved.reconstruct_pyramid(fused_i),
+            atol=0.05,
+        )
+
+    @pytest.mark.parametrize("layout,feather", [("interleaved", 0), ("interleaved", 2),
+                                                ("planar", 2)])
+    def test_int16_pyramid_psnr(self, test_image_paths, layout, feather):
+        """int16 fixed-point pyramids stay within 50 dB PSNR of float32 ones."""
+        results = []
+        for dtype in ("float32", "int16"):
+            lp = LaplacianPyramid(config=AlgorithmConfig(
+                fusion_kernel_size=6, pyramid_num_levels=4, feather_radius=feather,
+                pyramid_layout=layout, pyramid_dtype=dtype,
+            ))
+            lp.update_image_paths(test_image_paths[:3])
+            lp.stack_images()
+            results.append(np.clip(lp.output_image, 0, 255))
+        mse = np.mean((results[0].astype(np.float64) - results[1]) ** 2)
+        assert 10 * np.log10(255.0 ** 2 / max(mse, 1e-12)) > 50
+
+    def test_int16_pyramid_falls_back_for_hdr(self, test_images):
+        """Float frames beyond the int16 range switch the stack to float32, unclipped."""
+        low = test_images[0].astype(np.float32)
+        hdr = test_images[1].astype(np.float32) * 4.0  # Up to 1020
+        assert CPU.fits_int16(test_images[1]) and CPU.fits_int16(low)
+        assert not CPU.fits_int16(hdr)
+        results = []
+        for quantized in (False, True):
+            algo = Algorithm()
+            algo.quantized_pyramids = quantized
+            fused = algo.generate_laplacian_pyramid(low, 4)
+            assert fused[0].dtype == (np.int16 if quantized else np.float32)
+            new = algo.generate_laplacian_pyramid(hdr, 4)
+            assert new[0].dtype == np.float32 and algo.int16_overflow == quantized
+            fused = algo.fuse_pyramid_into(fused, new, 6, feather_radius=2, fused_gray=[])
+            assert fused[0].dtype == np.float32
+            results.append(algo.reconstruct_pyramid(fused))
+        assert results[0].max() > 255
+        np.testing.assert_allclose(results[1], results[0], atol=0.05)
+
+    def test_quantized_level_round_trip(self):
+        """Coefficients are stored with a 1/128 step and saturate at int16 range."""
+        level = np.array([[[0.3, -254.9, 255.99]], [[1000.0, -1000.0, 1 / 128]]],
+                         dtype=np.float32)
+        q = CPU.quantize_level(level)
+        assert q.dtype == np.int16
+        back = CPU.dequantize_pyramid([q])[0]
+        np.testing.assert_allclose(back[0], level[0], atol=0.5 / 128)
+        assert back[1, 0, 0] == 32767 / 128 and back[1, 0, 1] == -256.0
+        assert q[1, 0, 2] == 1
+
+    def test_tone_map_luminance_only(self, test_images):
+        """Tone map adds one smooth offset to all channels and keeps float precision."""
+        img = test_images[0].astype(np.float32) + 0.25
+        untouched = img.copy()
+        assert CPU.local_tone_map(untouched, 0.0) is untouched
+        np.testing.assert_array_equal(untouched, img)
+
+        mapped = CPU.local_tone_map(img.copy(), 0.5)
+        delta = mapped - img
+        np.testing.assert_allclose(delta[:, :, 0], delta[:, :, 1], atol=1e-3)
+        np.testing.assert_allclose(delta[:, :, 0], delta[:, :, 2], atol=1e-3)
+        assert np.abs(np.diff(delta[:, :, 0], axis=1)).max() < 1.0  # No added detail
+        assert mapped.std() < img.std()  # Global range compressed
+        assert not np.allclose(mapped, np.round(mapped))  # Not quantized to 8 bits
+
+    def test_tone_map_strips_match_whole(self, test_images):
+        """Strip-wise application (for streamed output) equals the whole-image pass."""
+        img = test_images[1].astype(np.float32)
+        base = CPU.tone_map_base(img)
+        whole = CPU.apply_tone_map(img.copy(), base, 0.4)
+        strips = img.copy()
+        for y0 in range(0, img.shape[0], 77):
+            CPU.apply_tone_map(strips[y0:y0 + 77], base, 0.4, y0, img.shape)
+        np.testing.assert_allclose(strips, whole, atol=1e-3)
+
+    @pytest.mark.parametrize("levels", [0, 1, 4])
+    def test_strip_reconstruction_matches_full(self, test_images, levels):
+        """Strips of StripReconstruction tile reconstruct_pyramid exactly."""
+        img = test_images[2][:123, :77].astype(np.float32)  # Odd sizes
+        pyr = CPU.generate_laplacian_pyramid(img, levels)
+        recon = CPU.StripReconstruction(pyr)
+        strips = np.concatenate([rows for _, rows in recon.strips(strip_rows=17)])
+        np.testing.assert_array_equal(strips, CPU.reconstruct_pyramid(pyr))
+
+    @pytest.mark.parametrize("ext,layout", [("png", "interleaved"), ("tif", "planar")])
+    def test_streamed_output_matches_in_memory(self, test_image_paths, tmp_path,
+                                               ext, layout):
+        """stream_output_to writes the (cropped) result without output_image."""
+        config = AlgorithmConfig(fusion_kernel_size=6, pyramid_num_levels=4,
+                                 pyramid_layout=layout, auto_crop=True)
+        lp = LaplacianPyramid(config=config)
+        lp.update_image_paths(test_image_paths[:3])
+        lp.align_and_stack_images()
+        expected = np.clip(np.around(lp.output_image), 0, 255).astype(np.uint8)
+        expected16 = ImageSavingHandler.convert_to_bit_depth(lp.output_image, 16)
+
+        path = str(tmp_path / f"stacked.{ext}")
+        assert lp.stream_output_to(path)
+        lp.align_and_stack_images()
+        assert lp.output_image is None and lp.output_path == path
+        written = cv2.imread(path)
+        assert written.shape == expected.shape
+        # Same tone-map base in both paths: only float rounding may differ
+        assert np.abs(written.astype(np.int16) - expected).max() <= 1
+
+        path16 = str(tmp_path / f"stacked16.{ext}")
+        assert lp.stream_output_to(path16, bit_depth=16)
+        lp.align_and_stack_images()
+        written16 = cv2.imread(path16, cv2.IMREAD_UNCHANGED)
+        assert written16.dtype == np.uint16
+        assert np.abs(written16.astype(np.int32) - expected16).max() <= 1
+        assert not lp.stream_output_to(str(tmp_path / "stacked.jpg"))
+
+    def test_gpu_tone_map_base_matches_cpu(self, test_images, monkeypatch, tmp_path):
+        """The CuPy path takes the same base from host copies of the coarse levels."""
+        import src.algorithms.API as API
+        img = test_images[0].astype(np.float32)
+        pyr = CPU.generate_laplacian_pyramid(img, 5)
+        lp = LaplacianPyramid(config=AlgorithmConfig(tone_map_strength=0.4))
+        copied = []
+        base = lp._tone_map_base(pyr, to_host=lambda level: copied.append(level) or level.copy())
+        np.testing.assert_array_equal(base, lp._tone_map_base(pyr))
+        assert len(copied) == CPU.tone_map_levels(pyr) < len(pyr)
+
+        # Streamed output always runs the CPU pipeline
+        monkeypatch.setattr(API, "_HAS_CUPY", True)
+        lp.config.use_gpu = True
+        assert lp._can_use_cupy_path()
+        assert lp.stream_output_to(str(tmp_path / "stacked.png"))
+        assert not lp._can_use_cupy_path()
+
     def test_laplacian_with_threshold_and_feather(self, test_image_paths):
         """Full pipeline with contrast threshold and feathering."""
         config = AlgorithmConfig(
@@ -583,6 +1119,20 @@ class TestAutoCrop:
         bounds = lp.get_crop_bounds()
         assert bounds is None  # no shifts → nothing to crop
 
+    def test_planar_stack_through_api(self, test_image_paths):
+        """pyramid_layout="planar" produces the interleaved result via the API."""
+        results = []
+        for layout in ("interleaved", "planar"):
+            lp = LaplacianPyramid(config=AlgorithmConfig(
+                fusion_kernel_size=6, pyramid_num_levels=4, pyramid_layout=layout,
+                auto_crop=True,
+            ))
+            lp.update_image_paths(test_image_paths[:3])
+            lp.align_and_stack_images()
+            results.append(lp.output_image)
+        assert results[0].shape == results[1].shape
+        assert np.percentile(np.abs(results[0] - results[1]), 99) < 1.0
+
     def test_auto_crop_output(self, test_image_paths):
         """auto_crop_output should reduce image dimensions."""
         config = AlgorithmConfig(fusion_kernel_size=6, pyramid_num_levels=4)
@@ -598,6 +1148,55 @@ class TestAutoCrop:
             assert lp.output_image.shape[0] <= original_shape[0]
             assert lp.output_image.shape[1] <= original_shape[1]
 
+    def test_translation_crop_is_exact(self):
+        """Pure shifts crop exactly the rows/columns some frame leaves black."""
+        shape = (100, 200)
+        spans = valid_region.new_spans(shape)
+        for dx, dy in [(3.0, -2.0), (-5.5, 4.0)]:
+            valid_region.intersect_footprint(
+                spans, np.float64([[1, 0, -dx], [0, 1, -dy]]), shape)
+        # x valid for dx=3 from 3, for dx=-5.5 up to 199-5.5
+        assert valid_region.largest_rectangle(spans) == (3, 4, 194, 98)
+
+    def test_rotated_crop_stays_inside_every_footprint(self):
+        """Every corner of the crop samples inside each rotated source frame."""
+        shape = (120, 160)
+        h, w = shape
+        matrices = [
+            cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0) for angle in (-3, 2, 5)
+        ]
+        spans = valid_region.new_spans(shape)
+        for m in matrices:
+            valid_region.intersect_footprint(spans, m, shape)
+        x0, y0, x1, y1 = valid_region.largest_rectangle(spans)
+        for m in matrices:
+            for cx, cy in [(x0, y0), (x1 - 1, y0), (x0, y1 - 1), (x1 - 1, y1 - 1)]:
+                sx, sy = m @ np.float64([cx, cy, 1])
+                assert -1e-6 <= sx <= w - 1 + 1e-6
+                assert -1e-6 <= sy <= h - 1 + 1e-6
+        # Far tighter than cropping by the worst corner displacement on all sides
+        assert (x1 - x0) * (y1 - y0) > 0.6 * h * w
+
+    def test_auto_crop_config_matches_post_crop(self, test_image_paths):
+        """Fusing only the valid region gives the same crop as fusing everything."""
+        full = LaplacianPyramid(config=AlgorithmConfig(fusion_kernel_size=6, pyramid_num_levels=4))
+        full.update_image_paths(test_image_paths[:4])
+        full.align_and_stack_images()
+        bounds = full.auto_crop_output()
+
+        cropped = LaplacianPyramid(config=AlgorithmConfig(
+            fusion_kernel_size=6, pyramid_num_levels=4, auto_crop=True))
+        cropped.update_image_paths(test_image_paths[:4])
+        cropped.align_and_stack_images()
+        assert cropped.crop_bounds == bounds
+        assert cropped.output_image.shape == full.output_image.shape
+        # Cropping again is a no-op and reports no new crop
+        assert cropped.auto_crop_output() is None
+        assert cropped.crop_bounds == bounds
+        assert cropped.output_image.shape == full.output_image.shape
+        diff = np.abs(cropped.output_image - full.output_image)
+        assert np.percentile(diff, 99) < 1.0
+
 
 # -- Pause/Cancel Tests --
 
@@ -669,6 +1268,62 @@ class TestMemorySafety:
         # Should be a different result
         assert not np.array_equal(first_output, lp.output_image)
 
+    def test_frame_pipeline_bounded_by_memory(self):
+        """In-flight jobs never exceed the memory cap; results arrive in order."""
+        import threading, time
+        lock = threading.Lock()
+        running = [0, 0]  # current, peak
+
+        def job(index):
+            with lock:
+                running[0] += 1
+                running[1] = max(running[1], running[0])
+            time.sleep(0.01 * (index % 3))
+            with lock:
+                running[0] -= 1
+            return index * 10
+
+        frames = pipeline.FramePipeline(job, 12, frame_bytes=100, workers=4,
+                                        memory_budget=300)
+        assert frames.max_in_flight == 2  # budget for 3 frames, one is being fused
+        with frames:
+            got = [(i, r) for i, r in frames]
+        assert got == [(i, i * 10) for i in range(1, 12)]
+        assert running[1] <= 2
+        assert frames.stats.frames == 11
+        assert frames.stats.stall_time >= 0
+
+    def test_pipeline_stats_reported(self, test_image_paths):
+        """The Laplacian CPU path reports worker count and stall time."""
+        config = AlgorithmConfig(fusion_kernel_size=6, pyramid_num_levels=4,
+                                 pipeline_workers=3)
+        lp = LaplacianPyramid(config=config)
+        lp.update_image_paths(test_image_paths[:4])
+        lp.stack_images()
+        assert lp.output_image is not None
+        assert lp.pipeline_stats.workers == 3
+        assert lp.pipeline_stats.frames == 3
+
+    def test_raw_stack_with_decode_workers(self, tmp_path):
+        """RAW frames developed in worker processes stack like in-process ones."""
+        from test_ImageLoadingHandler import _write_dng
+        rng = np.random.default_rng(1)
+        paths = []
+        for i in range(3):
+            path = str(tmp_path / f"frame_{i}.dng")
+            _write_dng(path, rng.integers(0, 65535, (64, 96), dtype=np.uint16))
+            paths.append(path)
+        outputs = []
+        for workers in (1, 2):
+            config = AlgorithmConfig(fusion_kernel_size=4, pyramid_num_levels=3,
+                                     raw_decode_workers=workers)
+            lp = LaplacianPyramid(config=config)
+            lp.update_image_paths(paths)
+            lp.stack_images()
+            assert lp.Algorithm.ImageLoadingHandler._raw_pool is None
+            outputs.append(lp.output_image)
+        np.testing.assert_array_equal(outputs[1], outputs[0])
+
 
 # -- GPU Fallback Tests --
 
@@ -1,7 +1,7 @@
 """
 Test the CLI interface.
 """
-import os, sys, subprocess, tempfile
+import os, sys, glob, subprocess, tempfile
 
 currentdir = os.path.dirname(os.path.realpath(__file__))
 parentdir = os.path.dirname(currentdir)
@@ -246,3 +246,35 @@ class TestCLI:
         finally:
             if os.path.exists(output_path):
                 os.unlink(output_path)
+
+    def test_cli_stdin_stream(self, tmp_path):
+        """Frames piped on stdin stack like the same files given as paths."""
+        paths = sorted(glob.glob(os.path.join(parentdir, "tests/low_res_images/*.jpg")))
+        stream = b"".join(open(path, "rb").read() for path in paths)
+        outputs = []
+        for name, inputs, stdin in (("files.png", ["tests/low_res_images/*.jpg"], None),
+                                    ("stream.png", ["-"], stream)):
+            output_path = str(tmp_path / name)
+            result = subprocess.run(
+                [sys.executable, "-m", "src.cli", "--input", *inputs,
+                 "--output", output_path, "--align", "--pyramid-levels", "4"],
+                input=stdin, capture_output=True, cwd=parentdir, timeout=120,
+            )
+            assert result.returncode == 0, f"CLI failed: {result.stderr.decode()}"
+            outputs.append(cv2.imread(output_path))
+        assert outputs[1].shape == (500, 750, 3)
+        np.testing.assert_array_equal(outputs[0], outputs[1])
+
+    def test_cli_multiple_outputs(self, tmp_path):
+        """Several --output targets are all written from one stacking run."""
+        outputs = [str(tmp_path / f"stacked.{ext}") for ext in ("jpg", "png", "tif")]
+        result = subprocess.run(
+            [sys.executable, "-m", "src.cli", "--input", "tests/low_res_images/*.jpg",
+             "--output", *outputs, "--bit-depth", "16", "--pyramid-levels", "4"],
+            capture_output=True, text=True, cwd=parentdir, timeout=120,
+        )
+        assert result.returncode == 0, f"CLI failed: {result.stderr}"
+        images = [cv2.imread(path, cv2.IMREAD_UNCHANGED) for path in outputs]
+        assert [img.dtype for img in images] == [np.uint8, np.uint16, np.uint16]
+        np.testing.assert_array_equal(images[1], images[2])
+        assert result.stdout.count("Output saved") == 3